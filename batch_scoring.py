@@ -0,0 +1,180 @@
+from functools import lru_cache
+from typing import List, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from models import UserAnswer, Profile
+from item_bank import CompiledItemBank, get_compiled_item_bank
+from percentiles import current_norms
+from scoring_engine import CompiledScores, assemble_compiled_profile, score_answers_compiled
+
+
+class BatchScores(NamedTuple):
+    """Scores for N respondents. Columns are aligned with bank.subtypes / bank.instincts."""
+    subtype_raw: np.ndarray       # (N, subtypes) int32
+    instinct_mean: np.ndarray     # (N, instincts) float64, rounded to 2 dp
+    instinct_range: np.ndarray    # (N, instincts) int32
+    instinct_std_dev: np.ndarray  # (N, instincts) float64, rounded to 2 dp
+    driver: np.ndarray            # (N,) instinct index, -1 if no candidates
+    creation: np.ndarray          # (N,) subtype index, -1 if no Creation subtypes are defined
+    growth_edge: np.ndarray       # (N,) instinct index, -1 if no candidates
+
+    def row(self, i: int) -> CompiledScores:
+        """Row i in the scalar engine's CompiledScores form."""
+        return CompiledScores(
+            subtype_raw=self.subtype_raw[i].tolist(),
+            instinct_mean=self.instinct_mean[i].tolist(),
+            instinct_range=self.instinct_range[i].tolist(),
+            instinct_std_dev=self.instinct_std_dev[i].tolist(),
+            driver=int(self.driver[i]),
+            creation=int(self.creation[i]),
+            growth_edge=int(self.growth_edge[i])
+        )
+
+
+class _BatchTables:
+    """Code -> subtype lookup arrays for one compiled item bank."""
+
+    def __init__(self, bank: CompiledItemBank):
+        width = bank.max_code + 1
+        num_slots = len(bank.slots)
+        # Flattened (slot, code) -> subtype index, with one extra "no endorsement" column at the end
+        self.width = width
+        self.subtype_of = np.full(num_slots * width, bank.num_subtypes, dtype=np.int32)
+        self.is_creation_item = np.zeros(num_slots * width, dtype=bool)
+        for key, (subtype_idx, is_creation_item) in bank.endorsement_table.items():
+            slot_idx, code = bank.answer_codes[key]
+            self.subtype_of[slot_idx * width + code] = subtype_idx
+            self.is_creation_item[slot_idx * width + code] = is_creation_item
+        self.slot_offsets = (np.arange(num_slots, dtype=np.int32) * width)[np.newaxis, :]
+        self.creation_columns = np.asarray(bank.creation_subtype_indices, dtype=np.intp)
+        tiebreak_rank = [bank.creation_tiebreak_rank[i] for i in bank.creation_subtype_indices]
+        self.creation_rank = np.asarray(tiebreak_rank, dtype=np.int32)
+        self.driver_columns = np.asarray(bank.driver_instinct_indices, dtype=np.intp)
+        self.growth_edge_columns = np.asarray(bank.growth_edge_instinct_indices, dtype=np.intp)
+
+
+@lru_cache(maxsize=8)
+def _tables_for(bank: CompiledItemBank) -> _BatchTables:
+    return _BatchTables(bank)
+
+
+def encode_answer_matrix(answer_lists: Iterable[List[UserAnswer]], bank: Optional[CompiledItemBank] = None) -> np.ndarray:
+    """Encodes answer lists into an N x slots uint8 code matrix (see CompiledItemBank.slot_options)."""
+    bank = bank or get_compiled_item_bank()
+    rows = [bytes(bank.encode_answers(answers)) for answers in answer_lists]
+    if not rows:
+        return np.zeros((0, len(bank.slots)), dtype=np.uint8)
+    return np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), len(bank.slots))
+
+
+def _first_best(values: np.ndarray, mask: np.ndarray, fill) -> np.ndarray:
+    """Column position of the first maximum of `values` within `mask`, per row."""
+    return np.argmax(np.where(mask, values, fill), axis=1)
+
+
+def score_answers_batch(codes: np.ndarray, bank: Optional[CompiledItemBank] = None) -> BatchScores:
+    """Scores an N x slots uint8 code matrix. Each row matches the scalar engine on the same answers."""
+    bank = bank or get_compiled_item_bank()
+    tables = _tables_for(bank)
+    codes = np.asarray(codes, dtype=np.uint8)
+    if codes.ndim != 2 or codes.shape[1] != len(bank.slots):
+        raise ValueError(f"Expected an N x {len(bank.slots)} code matrix, got shape {codes.shape}")
+    if codes.size and int(codes.max()) > bank.max_code:
+        raise ValueError(f"Answer codes must be between 0 and {bank.max_code}")
+    n = codes.shape[0]
+    num_subtypes = bank.num_subtypes
+
+    # 1. Endorsements: (slot, code) -> subtype column, then one bincount over the whole batch.
+    flat = codes.astype(np.int32) + tables.slot_offsets
+    subtype_cols = tables.subtype_of[flat]
+    row_offsets = (np.arange(n, dtype=np.int64) * (num_subtypes + 1))[:, np.newaxis]
+    cells = (subtype_cols + row_offsets).ravel()
+    subtype_raw = np.bincount(cells, minlength=n * (num_subtypes + 1))
+    subtype_raw = subtype_raw.reshape(n, num_subtypes + 1)[:, :num_subtypes].astype(np.int32)
+    creation_cells = cells[tables.is_creation_item[flat].ravel()]
+    creation_item_counts = np.bincount(creation_cells, minlength=n * (num_subtypes + 1))
+    creation_item_counts = creation_item_counts.reshape(n, num_subtypes + 1)[:, :num_subtypes]
+
+    # 2. Instinct metrics. Accumulated column by column in the same order as the scalar engine,
+    # so float results (and therefore every tie-break) are bit-identical.
+    num_instincts = len(bank.instincts)
+    instinct_mean = np.zeros((n, num_instincts))
+    instinct_range = np.zeros((n, num_instincts), dtype=np.int32)
+    instinct_std_dev = np.zeros((n, num_instincts))
+    for j, (start, end) in enumerate(bank.instinct_subtype_slices):
+        if start == end:
+            continue
+        block = subtype_raw[:, start:end]
+        mean_score = block.sum(axis=1) / (end - start)
+        instinct_mean[:, j] = np.round(mean_score, 2)
+        instinct_range[:, j] = block.max(axis=1) - block.min(axis=1)
+        if end - start > 1:
+            squares = np.zeros(n)
+            for col in range(start, end):
+                squares = squares + (subtype_raw[:, col] - mean_score) ** 2
+            instinct_std_dev[:, j] = np.round(np.sqrt(squares / (end - start - 1)), 2)
+
+    # 3. Driver: Strength + Range, tie-break larger Range, first candidate wins a full tie
+    driver = np.full(n, -1, dtype=np.int32)
+    if tables.driver_columns.size:
+        adjusted = instinct_mean[:, tables.driver_columns] + instinct_range[:, tables.driver_columns]
+        at_max = adjusted == adjusted.max(axis=1, keepdims=True)
+        best = _first_best(instinct_range[:, tables.driver_columns], at_max, -1)
+        driver = tables.driver_columns[best].astype(np.int32)
+
+    # 4. Creation: highest raw, then more endorsed items, then CREATION_SUBTYPE_TIEBREAK_ORDER
+    creation = np.full(n, -1, dtype=np.int32)
+    if tables.creation_columns.size:
+        raw = subtype_raw[:, tables.creation_columns]
+        tied = raw == raw.max(axis=1, keepdims=True)
+        endorsed = np.where(tied, creation_item_counts[:, tables.creation_columns], -1)
+        tied &= endorsed == endorsed.max(axis=1, keepdims=True)
+        rank = np.where(tied, tables.creation_rank, np.iinfo(np.int32).max)
+        creation = tables.creation_columns[np.argmin(rank, axis=1)].astype(np.int32)
+
+    # 5. Growth Edge: lowest Strength, tie-break highest std-dev, first candidate wins a full tie
+    growth_edge = np.full(n, -1, dtype=np.int32)
+    if tables.growth_edge_columns.size:
+        strength = instinct_mean[:, tables.growth_edge_columns]
+        at_min = strength == strength.min(axis=1, keepdims=True)
+        best = _first_best(instinct_std_dev[:, tables.growth_edge_columns], at_min, -np.inf)
+        growth_edge = tables.growth_edge_columns[best].astype(np.int32)
+
+    return BatchScores(
+        subtype_raw=subtype_raw,
+        instinct_mean=instinct_mean,
+        instinct_range=instinct_range,
+        instinct_std_dev=instinct_std_dev,
+        driver=driver,
+        creation=creation,
+        growth_edge=growth_edge
+    )
+
+
+def batch_row_profile(scores: BatchScores, i: int, bank: Optional[CompiledItemBank] = None) -> Profile:
+    """Assembles the API Profile for row i of a batch."""
+    bank = bank or get_compiled_item_bank()
+    return assemble_compiled_profile(scores.row(i), bank, current_norms(bank))
+
+
+def score_answer_lists(answer_lists: List[List[UserAnswer]], bank: Optional[CompiledItemBank] = None) -> List[Profile]:
+    """Scores many answer lists through the batch engine and returns their Profiles.
+
+    Lists that answer the same slot more than once can't be represented in a code matrix,
+    so they go through the scalar engine instead to keep results identical.
+    """
+    bank = bank or get_compiled_item_bank()
+    profiles: List[Optional[Profile]] = [None] * len(answer_lists)
+    batch_positions: List[int] = []
+    for i, answers in enumerate(answer_lists):
+        if len({answer.slot for answer in answers}) == len(answers):
+            batch_positions.append(i)
+        else:
+            profiles[i] = score_answers_compiled(answers, bank)
+    if batch_positions:
+        codes = encode_answer_matrix((answer_lists[i] for i in batch_positions), bank)
+        scores = score_answers_batch(codes, bank)
+        for row, i in enumerate(batch_positions):
+            profiles[i] = batch_row_profile(scores, row, bank)
+    return profiles
@@ -0,0 +1,202 @@
+"""Micro-benchmarks for the scoring hot path and data loading.
+
+    python bench.py --output bench.json                  # measure and save results
+    python bench.py --compare bench.json                 # measure and flag regressions vs a baseline
+    python bench.py --compare bench.json --threshold 0.2 --only score_answers
+
+Stage benchmarks cover both the reference functions (calculate_*, determine_*, assemble_final_profile)
+and the compiled stages the request path runs (tally_endorsements, compute_instinct_metrics,
+compute_compiled_scores, assemble_compiled_profile); score_answers times the whole compiled path.
+
+Inputs are synthetic submissions drawn from ALL_ITEM_METADATA with a realistic (agree-leaning,
+unimodal) Likert distribution and uniform scenario picks, seeded so every run times the same
+answers. Each benchmark reports the best and median per-call time over several repeats; the
+comparison uses the best time, which is the least sensitive to noise from other processes.
+Exits with status 1 when any benchmark is slower than the baseline by more than --threshold.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import data_loader
+from data_loader import ALL_ITEM_METADATA
+from models import UserAnswer
+from config import LIKERT_SCORE_MAP, CREATION_INSTINCT_NAME
+from scoring_engine import (
+    calculate_subtype_endorsements,
+    get_raw_subtype_totals,
+    calculate_instinct_metrics,
+    determine_creation_instinct,
+    calculate_full_profile_data,
+    assemble_final_profile,
+    score_answers,
+    tally_endorsements,
+    compute_instinct_metrics,
+    compute_compiled_scores,
+    assemble_compiled_profile,
+)
+from item_bank import get_compiled_item_bank
+from percentiles import current_norms
+
+# Share of respondents picking each Likert option (Strongly Disagree ... Strongly Agree)
+LIKERT_WEIGHTS = (0.07, 0.16, 0.24, 0.33, 0.20)
+DEFAULT_SAMPLES = 200
+DEFAULT_THRESHOLD = 0.15
+
+
+def realistic_answers(rng: random.Random) -> List[UserAnswer]:
+    """One full submission: every slot answered, Likert weighted by LIKERT_WEIGHTS."""
+    likert_options = list(LIKERT_SCORE_MAP)
+    answers = []
+    for meta in ALL_ITEM_METADATA:
+        if meta.answer_type == "Scenario" and meta.scenario_map:
+            answer = rng.choice(sorted(meta.scenario_map))
+        else:
+            answer = rng.choices(likert_options, LIKERT_WEIGHTS)[0]
+        answers.append(UserAnswer(slot=meta.slot, answer=answer))
+    return answers
+
+
+def _creation_is_tied(answers: List[UserAnswer]) -> bool:
+    totals = get_raw_subtype_totals(calculate_subtype_endorsements(answers))
+    creation = [totals.get(s, 0) for s in data_loader.INSTINCT_TO_SUBTYPES_MAP.get(CREATION_INSTINCT_NAME, [])]
+    return bool(creation) and creation.count(max(creation)) > 1
+
+
+def make_inputs(samples: int, seed: int) -> Tuple[List[List[UserAnswer]], List[List[UserAnswer]]]:
+    """(submissions, submissions whose Creation Instinct goes through the tie-break)."""
+    rng = random.Random(seed)
+    submissions = [realistic_answers(rng) for _ in range(samples)]
+    tied = [answers for answers in submissions if _creation_is_tied(answers)]
+    while len(tied) < min(samples, 20):
+        answers = realistic_answers(rng)
+        if _creation_is_tied(answers):
+            tied.append(answers)
+    return submissions, tied
+
+
+def _reload_data() -> None:
+    # Drop every loader cache so the CSV/TSV/JSON files are read and parsed again
+    for loader in (data_loader.load_scenario_mapping, data_loader.load_assessment_questions,
+                   data_loader.load_flowprint_labels, data_loader.load_subtype_glossary,
+                   data_loader.get_instinct_to_subtypes_map):
+        loader.cache_clear()
+    data_loader.load_assessment_questions()
+    data_loader.load_flowprint_labels()
+    data_loader.get_instinct_to_subtypes_map()
+
+
+def build_benchmarks(samples: int, seed: int) -> Dict[str, Tuple[Callable[[], object], int]]:
+    """name -> (callable timing one pass over its inputs, calls per pass)."""
+    submissions, tied = make_inputs(samples, seed)
+    endorsements = [calculate_subtype_endorsements(a) for a in submissions]
+    totals = [get_raw_subtype_totals(e) for e in endorsements]
+    tied_totals = [get_raw_subtype_totals(calculate_subtype_endorsements(a)) for a in tied]
+    results = [calculate_full_profile_data(a) for a in submissions]
+    # The compiled stages are what the request path runs; the reference functions above are the spec
+    bank = get_compiled_item_bank()
+    norms = current_norms(bank)
+    tallies = [tally_endorsements(a, bank) for a in submissions]
+    compiled = [compute_compiled_scores(raw, creation_counts, bank) for raw, creation_counts in tallies]
+
+    def each(fn: Callable, inputs: List) -> Callable[[], None]:
+        def run() -> None:
+            for args in inputs:
+                fn(*args)
+        return run
+
+    return {
+        "calculate_subtype_endorsements": (each(calculate_subtype_endorsements, [(a,) for a in submissions]), len(submissions)),
+        "calculate_instinct_metrics": (each(calculate_instinct_metrics, [(t,) for t in totals]), len(totals)),
+        "determine_creation_instinct": (each(determine_creation_instinct, list(zip(totals, submissions))), len(submissions)),
+        "determine_creation_instinct_tie": (each(determine_creation_instinct, list(zip(tied_totals, tied))), len(tied)),
+        "assemble_final_profile": (each(assemble_final_profile, [(r,) for r in results]), len(results)),
+        "tally_endorsements": (each(tally_endorsements, [(a, bank) for a in submissions]), len(submissions)),
+        "compute_instinct_metrics": (each(compute_instinct_metrics, [(raw, bank) for raw, _ in tallies]), len(tallies)),
+        "compute_compiled_scores": (each(compute_compiled_scores, [(raw, counts, bank) for raw, counts in tallies]), len(tallies)),
+        "assemble_compiled_profile": (each(assemble_compiled_profile, [(c, bank, norms) for c in compiled]), len(compiled)),
+        "score_answers": (each(score_answers, [(a,) for a in submissions]), len(submissions)),
+        "data_loader_startup": (_reload_data, 1),
+    }
+
+
+def run_benchmarks(samples: int = DEFAULT_SAMPLES, seed: int = 1, repeat: int = 7,
+                   only: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    """Times each benchmark; returns name -> {best_us, median_us, calls} (per-call microseconds)."""
+    results: Dict[str, Dict[str, float]] = {}
+    for name, (run, calls) in build_benchmarks(samples, seed).items():
+        if only and name not in only:
+            continue
+        run() # warm up caches and lazily compiled tables
+        timer = timeit.Timer(run)
+        number, _ = timer.autorange() # enough passes for >= 0.2s per repeat
+        times = sorted(t / number / calls * 1e6 for t in timer.repeat(repeat=repeat, number=number))
+        results[name] = {"best_us": round(times[0], 3), "median_us": round(times[len(times) // 2], 3), "calls": calls}
+    return results
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[Dict[str, object]]:
+    """Per-benchmark best-time ratio vs the baseline; `regression` is set beyond +threshold."""
+    rows = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append({"name": name, "best_us": result["best_us"], "baseline_us": None, "change": None, "regression": False})
+            continue
+        change = result["best_us"] / base["best_us"] - 1
+        rows.append({"name": name, "best_us": result["best_us"], "baseline_us": base["best_us"],
+                     "change": round(change, 4), "regression": change > threshold})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for scoring and data loading.")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--compare", type=Path, help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown before flagging (0.15 = 15%%)")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="synthetic submissions per benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--only", action="append", help="run only this benchmark (repeatable)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.samples, args.seed, args.repeat, args.only)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "samples": args.samples,
+        "seed": args.seed,
+        "benchmarks": results,
+    }
+    status = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["benchmarks"]
+        report["comparison"] = compare(results, baseline, args.threshold)
+        for row in report["comparison"]:
+            change = "new" if row["change"] is None else f"{row['change']:+.1%}"
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<34} {row['best_us']:>12.2f}us  {change:>8}{flag}", file=sys.stderr)
+        status = 1 if any(row["regression"] for row in report["comparison"]) else 0
+    else:
+        for name, result in results.items():
+            print(f"{name:<34} {result['best_us']:>12.2f}us  (median {result['median_us']:.2f}us)", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,98 @@ DATA_PATH = _current_dir / 'data'
 # TTL for cached profiles in seconds (default: 24 hours)
 PROFILE_TTL_SECONDS = int(os.environ.get("NUMI_PROFILE_TTL_SECONDS", 86400))
 
+# In-memory profile cache bounds (per worker) and how often expired entries are swept
+PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get("NUMI_PROFILE_CACHE_MAX_ENTRIES", 100_000))
+PROFILE_CACHE_MAX_BYTES = int(os.environ.get("NUMI_PROFILE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+PROFILE_CACHE_SWEEP_SECONDS = float(os.environ.get("NUMI_PROFILE_CACHE_SWEEP_SECONDS", 60))
+
+# Profile store backend: "memory" (per-process dict, handy for tests) or "sqlite" (shared by all workers on the host)
+PROFILE_STORE_BACKEND = os.environ.get("NUMI_PROFILE_STORE", "memory")
+PROFILE_STORE_SQLITE_PATH = Path(os.environ.get("NUMI_PROFILE_STORE_SQLITE_PATH", _current_dir / "profiles.sqlite3"))
+# Expired SQLite rows are deleted in batches of this size, at most every PROFILE_EXPIRY_SWEEP_SECONDS
+PROFILE_EXPIRY_BATCH_SIZE = int(os.environ.get("NUMI_PROFILE_EXPIRY_BATCH_SIZE", 1000))
+PROFILE_EXPIRY_SWEEP_SECONDS = float(os.environ.get("NUMI_PROFILE_EXPIRY_SWEEP_SECONDS", 60))
+# stats() recounts the live SQLite rows at most every PROFILE_STORE_COUNT_SECONDS (metrics call it every few seconds)
+PROFILE_STORE_COUNT_SECONDS = float(os.environ.get("NUMI_PROFILE_STORE_COUNT_SECONDS", 60))
+
+# Write-behind: acknowledge saves once buffered and flush them to the store in batches every
+# PROFILE_WRITE_BEHIND_FLUSH_SECONDS; past MAX_PENDING buffered saves, writers flush inline
+PROFILE_WRITE_BEHIND = os.environ.get("NUMI_PROFILE_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+PROFILE_WRITE_BEHIND_FLUSH_SECONDS = float(os.environ.get("NUMI_PROFILE_WRITE_BEHIND_FLUSH_SECONDS", 0.05))
+PROFILE_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("NUMI_PROFILE_WRITE_BEHIND_BATCH_SIZE", 500))
+PROFILE_WRITE_BEHIND_MAX_PENDING = int(os.environ.get("NUMI_PROFILE_WRITE_BEHIND_MAX_PENDING", 10_000))
+# Stores keep compiled-scorer profiles as compact score records and assemble the JSON on read
+# (see profile_codec.py); each worker memoizes this many assembled profiles
+PROFILE_ASSEMBLY_CACHE_SIZE = int(os.environ.get("NUMI_PROFILE_ASSEMBLY_CACHE_SIZE", 10_000))
+
+# Incremental assessment sessions (see session_store.py): same backends as profiles. A session
+# expires SESSION_TTL_SECONDS after its last saved answer; the memory backend keeps at most MAX_ENTRIES
+SESSION_STORE_BACKEND = os.environ.get("NUMI_SESSION_STORE", PROFILE_STORE_BACKEND)
+SESSION_STORE_SQLITE_PATH = Path(os.environ.get("NUMI_SESSION_STORE_SQLITE_PATH", PROFILE_STORE_SQLITE_PATH))
+SESSION_TTL_SECONDS = int(os.environ.get("NUMI_SESSION_TTL_SECONDS", 7 * 86400))
+SESSION_MAX_ENTRIES = int(os.environ.get("NUMI_SESSION_MAX_ENTRIES", 100_000))
+
+# Append-only archive of raw item-level responses (see response_archive.py); off unless a directory is
+# set. Each segment file holds SEGMENT_RECORDS submissions; queued submissions are written every
+# FLUSH_SECONDS, or inline once MAX_PENDING are queued
+RESPONSE_ARCHIVE_DIR = os.environ.get("NUMI_RESPONSE_ARCHIVE_DIR") or None
+RESPONSE_ARCHIVE_SEGMENT_RECORDS = int(os.environ.get("NUMI_RESPONSE_ARCHIVE_SEGMENT_RECORDS", 65536))
+RESPONSE_ARCHIVE_FLUSH_SECONDS = float(os.environ.get("NUMI_RESPONSE_ARCHIVE_FLUSH_SECONDS", 1))
+RESPONSE_ARCHIVE_MAX_PENDING = int(os.environ.get("NUMI_RESPONSE_ARCHIVE_MAX_PENDING", 10_000))
+
+# Cache-Control for GET /v1/instinct-map/{user_id}; lets a CDN cache share-link fetches briefly and revalidate by ETag
+PROFILE_CACHE_CONTROL = os.environ.get("NUMI_PROFILE_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=300")
+
+# Repeat submits (same Idempotency-Key, or same user_id + answers) within this window replay the first response
+IDEMPOTENCY_WINDOW_SECONDS = float(os.environ.get("NUMI_IDEMPOTENCY_WINDOW_SECONDS", 600))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get("NUMI_IDEMPOTENCY_MAX_ENTRIES", 10_000))
+
+# Where /submit scoring runs: "thread" (pool in each worker process) or "process" (pool of scoring
+# processes per worker, for parallelism past the GIL), with how many workers
+SCORING_EXECUTOR = os.environ.get("NUMI_SCORING_EXECUTOR", "thread")
+SCORING_WORKERS = int(os.environ.get("NUMI_SCORING_WORKERS", 2))
+# Submits allowed to wait for a scoring worker; beyond that they get a 503 with this Retry-After
+SCORING_QUEUE_MAX = int(os.environ.get("NUMI_SCORING_QUEUE_MAX", 64))
+SCORING_RETRY_AFTER_SECONDS = int(os.environ.get("NUMI_SCORING_RETRY_AFTER_SECONDS", 1))
+
+# Directory where each process drops metrics snapshots so /metrics can aggregate across gunicorn
+# workers (unset: /metrics reports only the worker that serves it), and how often they're written
+METRICS_DIR = os.environ.get("NUMI_METRICS_DIR") or None
+METRICS_FLUSH_SECONDS = float(os.environ.get("NUMI_METRICS_FLUSH_SECONDS", 5))
+# Bearer token a Prometheus scraper may send to /metrics instead of the API key (unset: API key only)
+METRICS_TOKEN = os.environ.get("NUMI_METRICS_TOKEN") or None
+
+# Request profiling: submits carrying `X-Profile-Request: <token>` are always profiled (ignored when
+# unset); SAMPLE_RATE profiles that share of all submits. Each worker keeps the last BUFFER_SIZE profiles.
+PROFILING_TOKEN = os.environ.get("NUMI_PROFILING_TOKEN") or None
+PROFILING_SAMPLE_RATE = float(os.environ.get("NUMI_PROFILING_SAMPLE_RATE", 0))
+PROFILING_BUFFER_SIZE = int(os.environ.get("NUMI_PROFILING_BUFFER_SIZE", 50))
+PROFILING_MAX_FUNCTIONS = int(os.environ.get("NUMI_PROFILING_MAX_FUNCTIONS", 200))
+
+# Shadow scoring (see shadow_scoring.py): a JSON file of candidate scoring rules to compare with the live
+# rules on a SAMPLE_RATE share of /submit traffic (off when unset). Work waits in a queue of QUEUE_MAX
+# (beyond that it is dropped) for one background thread limited to CPU_BUDGET of a core per worker
+SHADOW_RULES_FILE = os.environ.get("NUMI_SHADOW_RULES_FILE") or None
+SHADOW_SAMPLE_RATE = float(os.environ.get("NUMI_SHADOW_SAMPLE_RATE", 1))
+SHADOW_QUEUE_MAX = int(os.environ.get("NUMI_SHADOW_QUEUE_MAX", 1000))
+SHADOW_CPU_BUDGET = float(os.environ.get("NUMI_SHADOW_CPU_BUDGET", 0.1))
+SHADOW_MAX_SAMPLES = int(os.environ.get("NUMI_SHADOW_MAX_SAMPLES", 50))
+
+# Batch submissions: max records per request, and how many are scored/saved per streamed chunk
+MAX_BATCH_SUBMISSIONS = int(os.environ.get("NUMI_MAX_BATCH_SUBMISSIONS", 10000))
+BATCH_SUBMIT_CHUNK_SIZE = int(os.environ.get("NUMI_BATCH_SUBMIT_CHUNK_SIZE", 500))
+
+
+# Population norms (subtype / instinct strength distributions) written by norms.py
+NORMS_FILE = Path(os.environ.get("NUMI_NORMS_FILE", _current_dir / "norms.json"))
+# Percentiles and clashes stay off until the norms cover this many completions (scoring spec §7)
+NORMS_MIN_COUNT = int(os.environ.get("NUMI_NORMS_MIN_COUNT", 1000))
+# How often a worker checks the norms file for a new version
+NORMS_RELOAD_INTERVAL_SECONDS = float(os.environ.get("NUMI_NORMS_RELOAD_INTERVAL_SECONDS", 30))
+# |z| gap between two subtypes of the same instinct that counts as an "instinct clash" (scoring spec §9)
+CLASH_Z_THRESHOLD = 1.5
+# Cronbach's alpha below this flags an instinct's Likert items in the reliability report (scoring spec §8)
+RELIABILITY_ALPHA_THRESHOLD = 0.70
 
 # --- Data File Paths ---
 # Use the / operator from pathlib to join the base data path with filenames
@@ -19,6 +111,20 @@ ASSESSMENT_QUESTIONS_FILE = DATA_PATH / "assessment_questions.csv"
 SCENARIO_MAPPING_FILE = DATA_PATH / "scenario_mapping.json"
 FLOWPRINT_LABELS_FILE = DATA_PATH / "Flowprint_Labels.tsv"
 SUBTYPE_GLOSSARY_FILE = DATA_PATH / "Subtype_Glossary.csv"
+# Precompiled, checksummed copy of the four files above (built by `python data_snapshot.py build`)
+DATA_SNAPSHOT_FILE = Path(os.environ.get("NUMI_DATA_SNAPSHOT_FILE", DATA_PATH / "data.snapshot"))
+
+# --- Item Bank Versions ---
+# The files above are item-bank version ITEM_BANK_BASE_VERSION; other versions keep the same four
+# files in ITEM_BANKS_PATH/<version>/. A published version is never edited; changes get a new version.
+ITEM_BANK_BASE_VERSION = "v1"
+ITEM_BANKS_PATH = Path(os.environ.get("NUMI_ITEM_BANKS_PATH", DATA_PATH / "item_banks"))
+# Version served when a submission doesn't name one; the CURRENT file in ITEM_BANKS_PATH overrides it
+ITEM_BANK_VERSION = os.environ.get("NUMI_ITEM_BANK_VERSION", ITEM_BANK_BASE_VERSION)
+# Compiled item banks kept per worker (the current version is always kept)
+ITEM_BANK_CACHE_SIZE = int(os.environ.get("NUMI_ITEM_BANK_CACHE_SIZE", 4))
+# How often a worker checks the CURRENT file for a switch of version
+ITEM_BANK_RELOAD_INTERVAL_SECONDS = float(os.environ.get("NUMI_ITEM_BANK_RELOAD_INTERVAL_SECONDS", 5))
 
 # --- Likert Scale Mapping ---
 # Maps user-facing answers to internal numeric scores for Likert-scale questions
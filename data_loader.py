@@ -1,9 +1,12 @@
 import csv
 import json
-from typing import List, Dict, Any, Set
-from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Any, Set, Tuple, Optional
+from functools import lru_cache, wraps
+from time import perf_counter
 
 from models import ItemMeta
+from data_snapshot import load_snapshot
 from config import (
     ASSESSMENT_QUESTIONS_FILE,
     SCENARIO_MAPPING_FILE,
@@ -13,19 +16,34 @@ from config import (
     FLOWPRINT_DRIVER_NAME_SHORTHAND_TO_FULL
 )
 
-@lru_cache(maxsize=None) # Cache results so files are read once
-def load_scenario_mapping() -> Dict[str, Dict[str, str]]:
+def _data_file(default: Path, data_dir: Optional[Path]) -> Path:
+    # Item-bank versions other than the base one keep the same file names in their own directory
+    return default if data_dir is None else Path(data_dir) / default.name
+
+def _base_cached(loader):
+    """Caches a loader's result for the base data (data_dir None) so its files are read once.
+    Other item-bank versions are parsed on every call: the registry compiles each one once and keeps
+    only ITEM_BANK_CACHE_SIZE of them, and a cache here would pin every version ever compiled."""
+    cached = lru_cache(maxsize=None)(loader)
+    @wraps(loader)
+    def load(data_dir: Optional[Path] = None):
+        return cached() if data_dir is None else loader(data_dir)
+    load.cache_clear = cached.cache_clear
+    return load
+
+@_base_cached
+def load_scenario_mapping(data_dir: Optional[Path] = None) -> Dict[str, Dict[str, str]]:
     """Loads the scenario question to subtype mapping."""
-    with open(SCENARIO_MAPPING_FILE, 'r') as f:
+    with open(_data_file(SCENARIO_MAPPING_FILE, data_dir), 'r') as f:
         return json.load(f)
 
-@lru_cache(maxsize=None)
-def load_assessment_questions() -> List[ItemMeta]:
+@_base_cached
+def load_assessment_questions(data_dir: Optional[Path] = None) -> List[ItemMeta]:
     """Loads assessment questions and maps them to ItemMeta objects."""
     questions: List[ItemMeta] = []
-    scenario_mappings = load_scenario_mapping()
+    scenario_mappings = load_scenario_mapping(data_dir)
 
-    with open(ASSESSMENT_QUESTIONS_FILE, 'r', encoding='utf-8-sig') as f:
+    with open(_data_file(ASSESSMENT_QUESTIONS_FILE, data_dir), 'r', encoding='utf-8-sig') as f:
         reader = csv.DictReader(f)
         for row in reader:
             slot = row["Slot"]
@@ -61,13 +79,13 @@ def load_assessment_questions() -> List[ItemMeta]:
             )
     return questions
 
-@lru_cache(maxsize=None)
-def load_flowprint_labels() -> Dict[str, Dict[str, str]]:
+@_base_cached
+def load_flowprint_labels(data_dir: Optional[Path] = None) -> Dict[str, Dict[str, str]]:
     """Loads Flowprint labels: (Creation Instinct, Driver Instinct) -> {label, signature}.
        Converts shorthand driver names from TSV to full canonical names for consistency.
     """
     labels: Dict[str, Dict[str, str]] = {}
-    with open(FLOWPRINT_LABELS_FILE, 'r', encoding='utf-8-sig') as f:
+    with open(_data_file(FLOWPRINT_LABELS_FILE, data_dir), 'r', encoding='utf-8-sig') as f:
         reader = csv.DictReader(f, delimiter='\t')
         for row in reader:
             creation_instinct = row["Creation Instinct"]
@@ -95,11 +113,11 @@ def load_flowprint_labels() -> Dict[str, Dict[str, str]]:
             }
     return labels
 
-@lru_cache(maxsize=None)
-def load_subtype_glossary() -> Dict[str, Dict[str, str]]:
+@_base_cached
+def load_subtype_glossary(data_dir: Optional[Path] = None) -> Dict[str, Dict[str, str]]:
     """Loads subtype definitions: Instinct -> Subtype -> Definition."""
     glossary: Dict[str, Dict[str, str]] = {}
-    with open(SUBTYPE_GLOSSARY_FILE, 'r', encoding='utf-8-sig') as f:
+    with open(_data_file(SUBTYPE_GLOSSARY_FILE, data_dir), 'r', encoding='utf-8-sig') as f:
         reader = csv.DictReader(f)
         for row in reader:
             instinct = row["Instinct"]
@@ -109,10 +127,10 @@ def load_subtype_glossary() -> Dict[str, Dict[str, str]]:
             glossary[instinct][subtype] = row["Definition"]
     return glossary
 
-@lru_cache(maxsize=None)
-def get_instinct_to_subtypes_map() -> Dict[str, List[str]]:
+@_base_cached
+def get_instinct_to_subtypes_map(data_dir: Optional[Path] = None) -> Dict[str, List[str]]:
     """Creates a map of instinct to its list of subtypes (excluding "Reverse" as a subtype itself)."""
-    questions = load_assessment_questions()
+    questions = load_assessment_questions(data_dir)
     instinct_subtypes_map: Dict[str, Set[str]] = {instinct: set() for instinct in ALL_INSTINCTS}
     for q_meta in questions:
         # We don't add "Reverse" as a subtype, it's a scoring modification.
@@ -129,7 +147,7 @@ def get_instinct_to_subtypes_map() -> Dict[str, List[str]]:
         # This avoids issues if a subtype is only mentioned in a reverse question.
         pass # Will be populated using glossary
 
-    glossary_definitions = load_subtype_glossary()
+    glossary_definitions = load_subtype_glossary(data_dir)
     final_map: Dict[str, List[str]] = {instinct: [] for instinct in ALL_INSTINCTS}
     for instinct_name, subtypes_dict in glossary_definitions.items():
         if instinct_name in final_map:
@@ -153,11 +171,28 @@ def get_instinct_to_subtypes_map() -> Dict[str, List[str]]:
     return final_map
 
 
-# Pre-load all data on startup by calling the functions
-ALL_ITEM_METADATA: List[ItemMeta] = load_assessment_questions()
-FLOWPRINT_LABEL_DATA: Dict[str, Dict[str, str]] = load_flowprint_labels()
-SUBTYPE_GLOSSARY_DATA: Dict[str, Dict[str, str]] = load_subtype_glossary()
-INSTINCT_TO_SUBTYPES_MAP: Dict[str, List[str]] = get_instinct_to_subtypes_map()
+def _from_snapshot(data: Dict[str, Any]) -> Tuple[List[ItemMeta], Dict[str, Dict[str, str]], Dict[str, Dict[str, str]], Dict[str, List[str]]]:
+    # The snapshot was built from validated ItemMeta objects, so skip re-validating them
+    items = [ItemMeta.model_construct(**fields) for fields in data["items"]]
+    return items, data["flowprint_labels"], data["subtype_glossary"], data["instinct_to_subtypes"]
+
+
+def _load_all() -> Tuple[List[ItemMeta], Dict[str, Dict[str, str]], Dict[str, Dict[str, str]], Dict[str, List[str]]]:
+    """Uses the precompiled snapshot when it matches the source files, else parses them."""
+    global DATA_SOURCE
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        DATA_SOURCE = "snapshot"
+        return _from_snapshot(snapshot)
+    DATA_SOURCE = "source files"
+    return load_assessment_questions(None), load_flowprint_labels(None), load_subtype_glossary(None), get_instinct_to_subtypes_map(None)
+
+
+# Pre-load all data on startup (see data_snapshot.py for the precompiled fast path)
+_load_started = perf_counter()
+DATA_SOURCE = "source files"
+ALL_ITEM_METADATA, FLOWPRINT_LABEL_DATA, SUBTYPE_GLOSSARY_DATA, INSTINCT_TO_SUBTYPES_MAP = _load_all()
+DATA_LOAD_SECONDS = perf_counter() - _load_started
 
 # For quick lookup
-ITEM_META_DICT: Dict[str, ItemMeta] = {item.slot: item for item in ALL_ITEM_METADATA} 
\ No newline at end of file
+ITEM_META_DICT: Dict[str, ItemMeta] = {item.slot: item for item in ALL_ITEM_METADATA}
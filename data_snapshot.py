@@ -0,0 +1,108 @@
+"""Precompiled snapshot of the assessment data files, for fast worker start-up.
+
+    python data_snapshot.py build      # parse the source files once and write the snapshot
+    python data_snapshot.py check      # is the snapshot present and current?
+
+The snapshot holds everything data_loader derives from assessment_questions.csv,
+scenario_mapping.json, Flowprint_Labels.tsv and Subtype_Glossary.csv, as plain builtins in one
+pickle, tagged with a SHA-256 over the source files. data_loader uses it only when that checksum
+still matches the files on disk, so editing a source file without rebuilding falls back to
+parsing the sources (with a warning) instead of serving stale data. Warnings about the source
+data are printed by the build, not by every worker at start-up.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import (
+    ASSESSMENT_QUESTIONS_FILE,
+    SCENARIO_MAPPING_FILE,
+    FLOWPRINT_LABELS_FILE,
+    SUBTYPE_GLOSSARY_FILE,
+    DATA_SNAPSHOT_FILE
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the snapshot layout or the way data_loader derives it changes
+SNAPSHOT_FORMAT = 1
+
+SOURCE_FILES = (ASSESSMENT_QUESTIONS_FILE, SCENARIO_MAPPING_FILE, FLOWPRINT_LABELS_FILE, SUBTYPE_GLOSSARY_FILE)
+
+
+def source_checksum(files: List[Path] = SOURCE_FILES) -> str:
+    """SHA-256 over the snapshot format and every source file's name and bytes."""
+    digest = hashlib.sha256(f"numi-data-snapshot:{SNAPSHOT_FORMAT}".encode("utf-8"))
+    for path in files:
+        digest.update(b"\0" + Path(path).name.encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_snapshot(path: Path = DATA_SNAPSHOT_FILE, files: List[Path] = SOURCE_FILES) -> Optional[Dict[str, Any]]:
+    """The snapshot's data if it exists and matches the current source files, else None."""
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable data snapshot {path}: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        logger.warning(f"Ignoring data snapshot {path}: unknown format; rebuild with `python data_snapshot.py build`.")
+        return None
+    if snapshot.get("checksum") != source_checksum(files):
+        logger.warning(f"Data snapshot {path} is stale (source files changed); parsing the source files instead. "
+                       "Rebuild with `python data_snapshot.py build`.")
+        return None
+    return snapshot["data"]
+
+
+def build_snapshot(path: Path = DATA_SNAPSHOT_FILE) -> Dict[str, Any]:
+    """Parses the source files through data_loader and writes the snapshot atomically."""
+    import data_loader # deferred: importing data_loader itself reads the (possibly stale) snapshot
+
+    checksum = source_checksum()
+    loaders = (data_loader.load_scenario_mapping, data_loader.load_assessment_questions,
+               data_loader.load_flowprint_labels, data_loader.load_subtype_glossary,
+               data_loader.get_instinct_to_subtypes_map)
+    for loader in loaders:
+        loader.cache_clear() # parse the files now, not whatever was loaded at import
+    data = {
+        "scenario_mapping": data_loader.load_scenario_mapping(),
+        "items": [item.model_dump() for item in data_loader.load_assessment_questions()],
+        "flowprint_labels": data_loader.load_flowprint_labels(),
+        "subtype_glossary": data_loader.load_subtype_glossary(),
+        "instinct_to_subtypes": data_loader.get_instinct_to_subtypes_map(),
+    }
+    snapshot = {"format": SNAPSHOT_FORMAT, "checksum": checksum, "data": data}
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or check the precompiled data snapshot.")
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--path", type=Path, default=DATA_SNAPSHOT_FILE)
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        snapshot = build_snapshot(args.path)
+        print(f"wrote {args.path} ({len(snapshot['data']['items'])} items, checksum {snapshot['checksum'][:12]})", file=sys.stderr)
+        return 0
+    current = load_snapshot(args.path) is not None
+    print(f"{args.path}: {'current' if current else 'missing or stale'}", file=sys.stderr)
+    return 0 if current else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+"""gunicorn hooks (gunicorn reads ./gunicorn.conf.py automatically; worker flags stay on the command line)."""
+import gc
+
+
+def when_ready(server):
+    # With --preload the master has already imported main (and the data snapshot). Build the lazily
+    # initialised state too, then freeze the heap: frozen objects are skipped by the cyclic GC, so
+    # workers don't write to (and un-share) the copy-on-write pages they inherit.
+    if server.cfg.preload_app:
+        import main
+        main.warm_up()
+        gc.freeze()
+        server.log.info(f"Preloaded app: {main.STARTUP_TIMINGS}")
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models import UserAnswer
+from config import IDEMPOTENCY_WINDOW_SECONDS, IDEMPOTENCY_MAX_ENTRIES
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused with a different payload."""
+
+
+def submission_fingerprint(user_id: str, answers: List[UserAnswer], item_bank_version: Optional[str] = None) -> str:
+    """Canonical hash of a submission; answer order doesn't affect scoring, so it doesn't affect the hash."""
+    canonical = json.dumps([user_id, item_bank_version, sorted((a.slot, a.answer) for a in answers)], separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IdempotencyCache:
+    """Per-worker replay cache and single-flight for /submit.
+
+    A completed submission's response bytes are kept for `window` seconds under its key; a repeat
+    within the window gets those bytes back without scoring or saving again. Concurrent
+    duplicates that arrive while the first is still running await the same future, so only
+    one scoring run happens. Failed runs are not cached, so a retry after an error re-executes.
+    """
+
+    def __init__(self, window: float = IDEMPOTENCY_WINDOW_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self._window = window
+        self._max_entries = max_entries
+        # key -> (expiry_time, payload fingerprint, response bytes)
+        self._completed: "OrderedDict[str, Tuple[float, str, bytes]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    @staticmethod
+    def key_for(user_id: str, fingerprint: str, idempotency_key: Optional[str]) -> str:
+        if idempotency_key:
+            return f"key:{user_id}:{idempotency_key}"
+        return f"hash:{fingerprint}"
+
+    def _lookup(self, key: str, fingerprint: str) -> Optional[bytes]:
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        expiry_time, stored_fingerprint, response = entry
+        if time.monotonic() >= expiry_time:
+            del self._completed[key]
+            return None
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict()
+        return response
+
+    async def run(self, key: str, fingerprint: str, compute: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, bool]:
+        """Returns (response bytes, replayed). `compute` only runs if no equivalent result exists or is pending."""
+        if self._window <= 0:
+            return await compute(), False
+        response = self._lookup(key, fingerprint)
+        if response is not None:
+            return response, True
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            pending_fingerprint, future = pending
+            if pending_fingerprint != fingerprint:
+                raise IdempotencyConflict()
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            response = await compute()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception() # mark retrieved so an unawaited failure isn't logged as never-retrieved
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(response)
+        self._completed[key] = (time.monotonic() + self._window, fingerprint, response)
+        self._completed.move_to_end(key)
+        while len(self._completed) > self._max_entries:
+            self._completed.popitem(last=False)
+        return response, False
+
+
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,471 @@
+import argparse
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional, Any, NamedTuple
+
+from models import ItemMeta, UserAnswer
+from data_loader import (
+    ALL_ITEM_METADATA,
+    INSTINCT_TO_SUBTYPES_MAP,
+    FLOWPRINT_LABEL_DATA,
+    load_assessment_questions,
+    load_flowprint_labels,
+    get_instinct_to_subtypes_map
+)
+from config import (
+    LIKERT_SCORE_MAP,
+    CREATION_SUBTYPE_TIEBREAK_ORDER,
+    ALL_INSTINCTS,
+    DRIVER_INSTINCTS_CANDIDATES,
+    CREATION_INSTINCT_NAME,
+    REVERSE_ITEM_MAPPING,
+    ITEM_BANK_BASE_VERSION,
+    ITEM_BANKS_PATH,
+    ITEM_BANK_VERSION,
+    ITEM_BANK_CACHE_SIZE,
+    ITEM_BANK_RELOAD_INTERVAL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringRules(NamedTuple):
+    """The adjustable scoring rules a bank is compiled with; the defaults are the live rules in config.py.
+    Shadow scoring (shadow_scoring.py) compiles candidate banks with some of them changed."""
+    creation_tiebreak_order: Tuple[str, ...] = tuple(CREATION_SUBTYPE_TIEBREAK_ORDER)
+    reverse_item_mapping: Tuple[Tuple[str, str], ...] = tuple(REVERSE_ITEM_MAPPING.items()) # (slot, rewarded subtype)
+    driver_instincts: Tuple[str, ...] = tuple(DRIVER_INSTINCTS_CANDIDATES)
+    growth_edge_instincts: Tuple[str, ...] = tuple(ALL_INSTINCTS)
+
+    def with_overrides(self, overrides: Dict[str, Any]) -> "ScoringRules":
+        """A copy with the given rules replaced; reverse_item_mapping overrides are merged into the live mapping."""
+        unknown = set(overrides) - set(self._fields)
+        if unknown:
+            raise ValueError(f"Unknown scoring rule(s): {', '.join(sorted(unknown))}")
+        changes: Dict[str, Any] = {}
+        for name, value in overrides.items():
+            if name == "reverse_item_mapping":
+                changes[name] = tuple(dict(self.reverse_item_mapping, **value).items())
+            else:
+                changes[name] = tuple(value)
+        return self._replace(**changes)
+
+
+LIVE_RULES = ScoringRules()
+
+
+class CompiledItemBank:
+    """Index tables derived once from the item bank so scoring is a single pass over answers.
+
+    Subtypes are numbered instinct by instinct in INSTINCT_TO_SUBTYPES_MAP order (glossary-sorted),
+    which is also the key order of `get_raw_subtype_totals`, so dicts rebuilt from the counter
+    array come out identical to the reference path.
+
+    `tag` is the item-bank version it was compiled from (see ItemBankRegistry); `version` is the
+    published id of its slot / answer-code layout, which compact submissions quote. `rules` are the
+    scoring rules compiled in (LIVE_RULES except for shadow-scoring candidates).
+    """
+
+    def __init__(
+        self,
+        items: List[ItemMeta],
+        instinct_to_subtypes: Dict[str, List[str]],
+        flowprint_labels: Dict[str, Dict[str, Dict[str, str]]],
+        tag: str = ITEM_BANK_BASE_VERSION,
+        rules: ScoringRules = LIVE_RULES,
+    ):
+        self.tag = tag
+        self.rules = rules
+        self.instincts: Tuple[str, ...] = tuple(instinct_to_subtypes.keys())
+        instinct_pos = {name: i for i, name in enumerate(self.instincts)}
+
+        subtypes: List[str] = []
+        instinct_subtype_indices: List[Tuple[int, ...]] = []
+        for instinct_name in self.instincts:
+            # "Reverse" is a scoring flag, never a scorable subtype (mirrors calculate_instinct_metrics)
+            names = [s for s in instinct_to_subtypes[instinct_name] if s != "Reverse"]
+            start = len(subtypes)
+            subtypes.extend(names)
+            instinct_subtype_indices.append(tuple(range(start, len(subtypes))))
+
+        self.subtypes: Tuple[str, ...] = tuple(subtypes)
+        self.subtype_index: Dict[str, int] = {name: i for i, name in enumerate(self.subtypes)}
+        self.num_subtypes: int = len(self.subtypes)
+        self.instinct_subtype_indices: Tuple[Tuple[int, ...], ...] = tuple(instinct_subtype_indices)
+        # Each instinct's subtypes are contiguous, so its scores are a plain list slice
+        self.instinct_subtype_slices: Tuple[Tuple[int, int], ...] = tuple(
+            (indices[0], indices[-1] + 1) if indices else (0, 0) for indices in instinct_subtype_indices
+        )
+
+        # Driver / Growth Edge candidates as positions into self.instincts, in config order
+        self.driver_instinct_indices: Tuple[int, ...] = tuple(
+            instinct_pos[name] for name in rules.driver_instincts if name in instinct_pos
+        )
+        self.growth_edge_instinct_indices: Tuple[int, ...] = tuple(
+            instinct_pos[name] for name in rules.growth_edge_instincts if name in instinct_pos
+        )
+
+        creation_pos = instinct_pos.get(CREATION_INSTINCT_NAME)
+        self.creation_subtype_indices: Tuple[int, ...] = (
+            instinct_subtype_indices[creation_pos] if creation_pos is not None else ()
+        )
+        creation_set = set(self.creation_subtype_indices)
+        # Lower rank wins the final Creation tie-break; subtypes missing from the order sort last
+        tiebreak_order = rules.creation_tiebreak_order
+        self.creation_tiebreak_rank: Dict[int, int] = {
+            idx: tiebreak_order.index(self.subtypes[idx])
+            if self.subtypes[idx] in tiebreak_order
+            else len(tiebreak_order)
+            for idx in self.creation_subtype_indices
+        }
+
+        # Per-slot answer codes for compact encodings: 0 = unanswered/invalid, Likert 1-5 by score,
+        # Scenario 1..n over the option keys in sorted order ("A" -> 1, "B" -> 2, ...).
+        self.slots: Tuple[str, ...] = tuple(item.slot for item in items)
+        self.slot_index: Dict[str, int] = {slot: i for i, slot in enumerate(self.slots)}
+        # Per slot, for item-level analyses (reliability.py): instinct position (-1 if unknown) and reverse keying
+        self.slot_instincts: Tuple[int, ...] = tuple(instinct_pos.get(item.instinct, -1) for item in items)
+        self.slot_reversed: Tuple[bool, ...] = tuple(bool(item.reverse) for item in items)
+        self.slot_options: Tuple[Tuple[str, ...], ...] = self._slot_options(items)
+        self.max_code: int = max((len(options) for options in self.slot_options), default=0)
+        self.answer_codes: Dict[Tuple[str, str], Tuple[int, int]] = {
+            (slot, answer): (slot_idx, code)
+            for slot_idx, (slot, options) in enumerate(zip(self.slots, self.slot_options))
+            for code, answer in enumerate(options, start=1)
+        }
+
+        # Published identifier of this slot order + code assignment; compact submissions must quote it
+        self.version: str = self.layout_id(items)
+
+        # (slot, answer) -> (subtype index, counts as an endorsed Creation item).
+        # Only answers that award a point to a scorable subtype get an entry; anything else is a no-op.
+        self.endorsement_table: Dict[Tuple[str, str], Tuple[int, bool]] = {}
+        reverse_item_mapping = dict(rules.reverse_item_mapping)
+        for item in items:
+            for answer, subtype in self._endorsed_answers(item, reverse_item_mapping):
+                idx = self.subtype_index.get(subtype)
+                if idx is None:
+                    continue
+                is_creation_item = item.instinct == CREATION_INSTINCT_NAME and idx in creation_set
+                self.endorsement_table[(item.slot, answer)] = (idx, is_creation_item)
+
+        # Same endorsements addressed by position: code_endorsements[slot index][code] -> (subtype index, is Creation item)
+        code_endorsements: List[List[Optional[Tuple[int, bool]]]] = [
+            [None] * (len(options) + 1) for options in self.slot_options
+        ]
+        for key, endorsement in self.endorsement_table.items():
+            slot_idx, code = self.answer_codes[key]
+            code_endorsements[slot_idx][code] = endorsement
+        self.code_endorsements: Tuple[Tuple[Optional[Tuple[int, bool]], ...], ...] = tuple(
+            tuple(row) for row in code_endorsements
+        )
+
+        # (creation subtype index, driver instinct index) -> (headline, signature); missing pairs are absent
+        self.flowprint_table: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        for creation_idx in self.creation_subtype_indices:
+            by_driver = flowprint_labels.get(self.subtypes[creation_idx], {})
+            for instinct_idx, instinct_name in enumerate(self.instincts):
+                info = by_driver.get(instinct_name)
+                if info:
+                    self.flowprint_table[(creation_idx, instinct_idx)] = (
+                        info.get("headline", "Default Headline - Check Flowprint Mapping"),
+                        info.get("signature", "Default Signature - Check Flowprint Mapping"),
+                    )
+
+    @staticmethod
+    def _slot_options(items: List[ItemMeta]) -> Tuple[Tuple[str, ...], ...]:
+        likert_by_score = tuple(sorted(LIKERT_SCORE_MAP, key=LIKERT_SCORE_MAP.__getitem__))
+        return tuple(
+            tuple(sorted(item.scenario_map)) if item.answer_type == "Scenario" and item.scenario_map
+            else likert_by_score if item.answer_type == "Likert"
+            else ()
+            for item in items
+        )
+
+    @classmethod
+    def layout_id(cls, items: List[ItemMeta]) -> str:
+        """Published id of the slot order + answer-code assignment of `items` (a compiled bank's `version`)."""
+        slots = tuple(item.slot for item in items)
+        return hashlib.sha256(
+            json.dumps([slots, cls._slot_options(items)], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:12]
+
+    @staticmethod
+    def _endorsed_answers(item: ItemMeta, reverse_item_mapping: Dict[str, str] = REVERSE_ITEM_MAPPING) -> List[Tuple[str, str]]:
+        """Lists the (answer, rewarded subtype) pairs of an item, per the Section 3 endorsement rules."""
+        endorsed: List[Tuple[str, str]] = []
+        if item.answer_type == "Likert":
+            target = item.subtype
+            if item.reverse:
+                # Reverse items reward the mapped subtype when the user disagrees
+                target = reverse_item_mapping.get(item.slot)
+                if not target:
+                    print(f"Warning: Reverse item {item.slot} not found in REVERSE_ITEM_MAPPING.")
+                    return endorsed
+            for answer, score in LIKERT_SCORE_MAP.items():
+                if (0 < score <= 2) if item.reverse else (score >= 4):
+                    endorsed.append((answer, target))
+        elif item.answer_type == "Scenario" and item.scenario_map:
+            for answer, subtype in item.scenario_map.items():
+                if subtype and subtype != "Neutral": # "Neutral" awards no points
+                    endorsed.append((answer, subtype))
+        return endorsed
+
+    def __reduce__(self):
+        if self.rules is not LIVE_RULES:
+            raise TypeError(f"Item bank {self.tag} compiled with candidate scoring rules can't be pickled")
+        # Pickled as a reference (e.g. when scoring runs in a process pool): the receiving process
+        # uses its own compiled copy of the same version instead of unpickling every table on each call
+        return get_item_bank, (self.tag,)
+
+    def encode_answers(self, user_answers: List[UserAnswer]) -> bytearray:
+        """Encodes answers as one code per slot (see slot_options). Unknown slots and answers stay 0;
+        if a slot is answered more than once the last answer wins."""
+        codes = bytearray(len(self.slots))
+        answer_codes = self.answer_codes
+        for answer in user_answers:
+            hit = answer_codes.get((answer.slot, answer.answer))
+            if hit is not None:
+                codes[hit[0]] = hit[1]
+            elif answer.slot in self.slot_index:
+                codes[self.slot_index[answer.slot]] = 0
+        return codes
+
+    def decode_answers(self, codes: bytes) -> List[UserAnswer]:
+        """Inverse of encode_answers; unanswered slots are omitted."""
+        return [
+            UserAnswer(slot=slot, answer=options[code - 1])
+            for slot, options, code in zip(self.slots, self.slot_options, codes)
+            if 0 < code <= len(options)
+        ]
+
+    def flowprint_for(self, creation_idx: int, driver_idx: int) -> Optional[Tuple[str, str]]:
+        """Returns (headline, signature) for a Creation subtype x Driver instinct pair, if labelled."""
+        return self.flowprint_table.get((creation_idx, driver_idx))
+
+
+class UnknownItemBankVersion(LookupError):
+    """Raised for an item-bank version that isn't published (no such version directory)."""
+
+
+# Version names double as directory names, so they are kept to a safe alphabet
+_VERSION_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{0,63}")
+
+
+class ItemBankRegistry:
+    """Published item-bank versions, each compiled once per worker and kept in a bounded LRU cache.
+
+    Version ITEM_BANK_BASE_VERSION is the data data_loader loaded at import (snapshot included);
+    any other version is the directory of that name under `root`, holding the same four files.
+    The version served to submissions that don't name one comes from `root/CURRENT` (else
+    `default_version`), re-checked every `reload_interval` seconds like the norms file: a switch
+    compiles the new version off the request path and then swaps a single reference, so every
+    request scores against the old or the new bank, never a mix. The current bank is never evicted.
+    """
+
+    def __init__(self, root: Path = ITEM_BANKS_PATH, default_version: str = ITEM_BANK_VERSION,
+                 max_cached: int = ITEM_BANK_CACHE_SIZE, reload_interval: float = ITEM_BANK_RELOAD_INTERVAL_SECONDS):
+        self.root = Path(root)
+        self.pointer_file = self.root / "CURRENT"
+        self.default_version = default_version
+        self.max_cached = max(1, max_cached)
+        self.reload_interval = reload_interval
+        self._banks: "OrderedDict[str, CompiledItemBank]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._current: Optional[CompiledItemBank] = None
+        self._pointer_signature: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._layouts: Dict[str, str] = {} # version -> layout id; published versions never change
+        self.compiled = 0
+        self.evicted = 0
+
+    def versions(self) -> List[str]:
+        """Every published version: the base data plus each well-named directory under root."""
+        found = {ITEM_BANK_BASE_VERSION}
+        if self.root.is_dir():
+            found.update(p.name for p in self.root.iterdir() if p.is_dir() and _VERSION_NAME.fullmatch(p.name))
+        return sorted(found)
+
+    def _compile(self, version: str, rules: ScoringRules = LIVE_RULES) -> CompiledItemBank:
+        if version == ITEM_BANK_BASE_VERSION:
+            return CompiledItemBank(ALL_ITEM_METADATA, INSTINCT_TO_SUBTYPES_MAP, FLOWPRINT_LABEL_DATA, version, rules)
+        data_dir = self.root / version
+        if not _VERSION_NAME.fullmatch(version) or not data_dir.is_dir():
+            raise UnknownItemBankVersion(version)
+        return CompiledItemBank(
+            load_assessment_questions(data_dir), get_instinct_to_subtypes_map(data_dir), load_flowprint_labels(data_dir), version, rules
+        )
+
+    def compile_with_rules(self, version: str, rules: ScoringRules) -> CompiledItemBank:
+        """A published version compiled with other scoring rules; not cached, never served."""
+        return self._compile(version, rules)
+
+    def get(self, version: Optional[str] = None) -> CompiledItemBank:
+        """The compiled bank for `version` (None: the current one). Raises UnknownItemBankVersion."""
+        if version is None:
+            return self.current()
+        with self._lock:
+            bank = self._banks.get(version)
+            if bank is not None:
+                self._banks.move_to_end(version)
+                return bank
+        bank = self._compile(version) # outside the lock; concurrent first uses race to insert below
+        with self._lock:
+            existing = self._banks.get(version)
+            if existing is not None:
+                return existing # keep a single instance per version (batch tables and memoized profiles are keyed by it)
+            self._banks[version] = bank
+            self.compiled += 1
+            pinned = {version, self._current.tag if self._current is not None else None}
+            for cached in list(self._banks):
+                if len(self._banks) <= self.max_cached:
+                    break
+                if cached not in pinned:
+                    del self._banks[cached]
+                    self.evicted += 1
+        return bank
+
+    def resolve(self, identifier: str) -> CompiledItemBank:
+        """A bank by version name, or by the layout id (`bank.version`) of any published version."""
+        current = self.current()
+        if identifier in (current.tag, current.version):
+            return current
+        versions = self.versions()
+        if identifier in versions:
+            return self.get(identifier)
+        # Looked up across every published version (first in version order if some share a layout),
+        # so each worker gives the same answer whatever it happens to have compiled
+        for version in versions:
+            if self._layout_of(version) == identifier:
+                return self.get(version)
+        raise UnknownItemBankVersion(identifier)
+
+    def _layout_of(self, version: str) -> Optional[str]:
+        """Layout id of a published version, from its questions alone (no compile); None if unreadable."""
+        layout = self._layouts.get(version)
+        if layout is None:
+            try:
+                items = ALL_ITEM_METADATA if version == ITEM_BANK_BASE_VERSION else load_assessment_questions(self.root / version)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Could not read item-bank version {version!r}: {e!r}")
+                return None
+            layout = self._layouts[version] = CompiledItemBank.layout_id(items)
+        return layout
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.pointer_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _pointer_version(self) -> str:
+        try:
+            return self.pointer_file.read_text(encoding="utf-8").strip() or self.default_version
+        except OSError:
+            return self.default_version
+
+    def reload(self) -> None:
+        """Reads the CURRENT file now and, if it names another version, compiles and swaps it in."""
+        with self._reload_lock:
+            signature = self._signature()
+            if self._current is not None and signature == self._pointer_signature:
+                return
+            version = self._pointer_version()
+            try:
+                bank = self.get(version)
+            except (UnknownItemBankVersion, OSError, ValueError, KeyError) as e:
+                logger.error(f"Could not load item-bank version {version!r}: {e!r}")
+                if self._current is not None:
+                    self._pointer_signature = signature # keep serving the previous version
+                    return
+                bank = self.get(self.default_version) # nothing to keep serving yet
+            if self._current is not bank:
+                logger.info(f"Serving item-bank version {bank.tag} (layout {bank.version}).")
+            self._current = bank # a single reference assignment, so readers see the old or the new bank
+            self._pointer_signature = signature
+
+    def current(self) -> CompiledItemBank:
+        """The bank served by default. Only the very first call waits for a compile."""
+        bank = self._current
+        if bank is None:
+            self.reload()
+            return self._current
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            if self._signature() != self._pointer_signature and not self._reload_lock.locked():
+                threading.Thread(target=self.reload, name="item-bank-reload", daemon=True).start()
+        return bank
+
+    def activate(self, version: str) -> CompiledItemBank:
+        """Compiles `version` (so a broken version is rejected here) and points CURRENT at it.
+        Every worker picks the switch up within reload_interval."""
+        bank = self.get(version)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.pointer_file.with_name(self.pointer_file.name + ".tmp")
+        tmp_path.write_text(version + "\n", encoding="utf-8")
+        os.replace(tmp_path, self.pointer_file)
+        self.reload()
+        return bank
+
+    def stats(self) -> Dict[str, Any]:
+        current = self.current()
+        with self._lock:
+            cached = list(self._banks)
+        return {
+            "current": current.tag,
+            "current_layout": current.version,
+            "versions": self.versions(),
+            "cached": cached,
+            "max_cached": self.max_cached,
+            "compiled": self.compiled,
+            "evicted": self.evicted,
+        }
+
+
+item_bank_registry = ItemBankRegistry()
+
+
+def get_item_bank(version: Optional[str] = None) -> CompiledItemBank:
+    """The compiled bank for an item-bank version (None: the version currently served)."""
+    return item_bank_registry.get(version)
+
+
+def get_compiled_item_bank() -> CompiledItemBank:
+    """The compiled bank of the item-bank version currently served."""
+    return item_bank_registry.current()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="List item-bank versions or switch the version served by default.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="published versions and the current one")
+    activate = commands.add_parser("activate", help="serve VERSION to submissions that don't name one")
+    activate.add_argument("version")
+    args = parser.parse_args(argv)
+    if args.command == "activate":
+        try:
+            bank = item_bank_registry.activate(args.version)
+        except UnknownItemBankVersion:
+            print(f"unknown item-bank version {args.version!r}; published: {', '.join(item_bank_registry.versions())}", file=sys.stderr)
+            return 1
+        print(f"current item-bank version: {bank.tag} (layout {bank.version})", file=sys.stderr)
+        return 0
+    current = item_bank_registry.current().tag
+    for version in item_bank_registry.versions():
+        print(f"{'*' if version == current else ' '} {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
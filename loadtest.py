@@ -0,0 +1,213 @@
+"""Offline load replay against the API: submits mixed with profile GETs, latency percentiles out.
+
+    python loadtest.py --requests 5000 --concurrency 32                       # in-process (ASGI transport)
+    python loadtest.py --submissions recorded.jsonl --get-ratio 0.5           # replay recorded submit bodies
+    python loadtest.py --start-server --workers 2 --concurrency 64 --output w2.json
+    python loadtest.py --url http://127.0.0.1:8000 --api-key dev-key
+
+Submissions come from a JSONL file of /submit bodies (`{"user_id", "answers"}`, e.g. the input
+of rescore.py) or are generated from the item bank. Each request is a GET of an already
+submitted user_id with probability --get-ratio, otherwise a submit. Past the end of the file, bodies
+are reused with a `-r<n>` suffix on the user_id, so they are scored rather than replayed. In-process runs drive
+`main.app` through httpx's ASGI transport, which measures the app with no network or server in
+between; --start-server launches gunicorn (as deployed) or uvicorn on a local port so worker
+counts can be compared. Nothing leaves the machine.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench import realistic_answers
+
+DEFAULT_API_KEY = "loadtest-key"
+
+
+def load_submissions(path: Optional[Path], count: int, seed: int) -> List[Dict[str, Any]]:
+    """Submit bodies from a JSONL file, or `count` synthetic ones with unique user_ids."""
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    rng = random.Random(seed)
+    return [
+        {"user_id": f"load-{seed}-{i}", "answers": [a.model_dump() for a in realistic_answers(rng)]}
+        for i in range(count)
+    ]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples: Dict[str, List[tuple]], elapsed: float) -> Dict[str, Any]:
+    """samples: endpoint -> [(latency seconds, status or error name)]. Latencies reported in ms."""
+    def describe(entries: List[tuple]) -> Dict[str, Any]:
+        latencies = sorted(latency * 1000 for latency, _ in entries)
+        statuses: Dict[str, int] = defaultdict(int)
+        for _, status in entries:
+            statuses[str(status)] += 1
+        errors = sum(n for status, n in statuses.items() if not (status.isdigit() and int(status) < 400))
+        return {
+            "requests": len(entries),
+            "errors": errors,
+            "error_rate": round(errors / len(entries), 4) if entries else 0.0,
+            "throughput_rps": round(len(entries) / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 50), 3),
+                "p95": round(_percentile(latencies, 95), 3),
+                "p99": round(_percentile(latencies, 99), 3),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+            "statuses": dict(sorted(statuses.items())),
+        }
+
+    report = describe([entry for entries in samples.values() for entry in entries])
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["endpoints"] = {endpoint: describe(entries) for endpoint, entries in sorted(samples.items())}
+    return report
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    submissions: List[Dict[str, Any]],
+    total_requests: int,
+    concurrency: int,
+    get_ratio: float,
+    api_key: str,
+    seed: int,
+) -> Dict[str, Any]:
+    """Issues `total_requests` requests from `concurrency` concurrent clients and summarizes them."""
+    rng = random.Random(seed)
+    headers = {"X-API-Key": api_key}
+    next_submission = iter(range(total_requests))
+    submitted: List[str] = []
+    samples: Dict[str, List[tuple]] = defaultdict(list)
+
+    async def client_loop() -> None:
+        for i in next_submission:
+            if submitted and rng.random() < get_ratio:
+                endpoint = "GET /v1/instinct-map/{user_id}"
+                request = client.get(f"/v1/instinct-map/{rng.choice(submitted)}", headers=headers)
+                body = None
+            else:
+                endpoint = "POST /v1/instinct-map/submit"
+                body = submissions[i % len(submissions)]
+                repeat = i // len(submissions)
+                if repeat:
+                    # A repeat of a recorded body would be replayed from the idempotency cache unscored
+                    body = dict(body, user_id=f"{body['user_id']}-r{repeat}")
+                request = client.post("/v1/instinct-map/submit", json=body, headers=headers)
+            started = time.perf_counter()
+            try:
+                response = await request
+                status: Any = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples[endpoint].append((time.perf_counter() - started, status))
+            if body is not None and status == 200:
+                submitted.append(body["user_id"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(server: str, workers: int, api_key: str, port: int) -> subprocess.Popen:
+    """Starts the app on 127.0.0.1:port (gunicorn + uvicorn workers as deployed, or plain uvicorn)."""
+    if server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker",
+               "main:app", "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "--preload"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers),
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    env = dict(os.environ, API_KEY=api_key)
+    process = subprocess.Popen(cmd, env=env, cwd=Path(__file__).resolve().parent)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} exited with status {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{server} did not come up on port {port} within 30s")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay submits and GETs against the API and report latency.")
+    parser.add_argument("--submissions", type=Path, help="JSONL of /submit bodies (default: synthetic)")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests to issue")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--get-ratio", type=float, default=0.3, help="share of requests that GET a submitted profile")
+    parser.add_argument("--seed", type=int, default=1)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="run against an already running server")
+    target.add_argument("--start-server", action="store_true", help="start a local server for the run")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn", help="with --start-server")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes, with --start-server")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY") or DEFAULT_API_KEY)
+    parser.add_argument("--output", type=Path, help="write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    submissions = load_submissions(args.submissions, args.requests, args.seed)
+    if not submissions:
+        parser.error("no submissions to replay")
+
+    async def run(base_url: str, transport: Optional[httpx.AsyncBaseTransport]) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=60) as client:
+            return await run_load(client, submissions, args.requests, args.concurrency, args.get_ratio, args.api_key, args.seed)
+
+    process = None
+    try:
+        if args.url:
+            target_name = args.url
+            report = asyncio.run(run(args.url, None))
+        elif args.start_server:
+            port = _free_port()
+            process = start_server(args.server, args.workers, args.api_key, port)
+            target_name = f"{args.server} -w {args.workers}"
+            report = asyncio.run(run(f"http://127.0.0.1:{port}", None))
+        else:
+            import main as app_module
+            app_module.API_KEY = args.api_key
+            target_name = "in-process"
+            report = asyncio.run(run("http://loadtest", httpx.ASGITransport(app=app_module.app)))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {"target": target_name, "concurrency": args.concurrency, "get_ratio": args.get_ratio, **report}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,129 @@
-from fastapi import FastAPI, HTTPException, Body, Depends, Security
-from fastapi.security import APIKeyHeader
-from typing import List, Dict
+from time import perf_counter
+_import_started = perf_counter() # start-up timing; see STARTUP_TIMINGS and GET /v1/ops/startup
+
+from fastapi import FastAPI, HTTPException, Body, Depends, Security, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import ValidationError
+from typing import List, Dict, Any, AsyncIterator, Optional, Callable, Tuple, Union
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import hashlib
+import json
 import logging
 import os
+import secrets
 
-from models import UserAnswer, Profile # Pydantic models
-from scoring_engine import score_answers
+from models import UserAnswer, Profile, SubmissionRecord, CompactSubmission # Pydantic models
+import data_loader
+from scoring_engine import score_answers_compiled, score_codes, score_tallies
+from item_bank import CompiledItemBank, item_bank_registry, UnknownItemBankVersion
+from wire_format import compact_decoder_for, CompactAnswersError
 from profile_store import profile_store_instance, ProfileStore
+from profile_codec import profile_assembler
+from session_store import session_store_instance, SessionStore, AssessmentSession
+from response_archive import response_archive
+from shadow_scoring import shadow_scorer
+from idempotency import idempotency_cache, IdempotencyConflict, submission_fingerprint
+from scoring_executor import scoring_executor, ScoringQueueFull
+from profiling import request_profiler, profile_call, score_and_serialize
+from metrics import registry as metrics_registry, RequestMetricsMiddleware, request_started, scoring_stage_seconds
+from config import MAX_BATCH_SUBMISSIONS, BATCH_SUBMIT_CHUNK_SIZE, PROFILE_CACHE_CONTROL, SCORING_RETRY_AFTER_SECONDS, METRICS_TOKEN
 # data_loader and config are implicitly loaded/used by scoring_engine and profile_store
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ready = perf_counter() - _import_started
+    preloaded = os.getpid() != _import_pid # forked from a gunicorn master that imported the app (--preload)
+    STARTUP_TIMINGS.update(ready_seconds=ready, preloaded=preloaded)
+    for phase in ("data_load", "app_import", "warm_up", "ready"):
+        if f"{phase}_seconds" in STARTUP_TIMINGS:
+            startup_seconds.set(STARTUP_TIMINGS[f"{phase}_seconds"], phase=phase)
+    logger.info(f"Worker {os.getpid()} ready {ready * 1000:.0f}ms after app import began "
+                f"(app import {STARTUP_TIMINGS['app_import_seconds'] * 1000:.0f}ms, "
+                f"data from {STARTUP_TIMINGS['data_source']} in {STARTUP_TIMINGS['data_load_seconds'] * 1000:.1f}ms"
+                f"{', preloaded' if preloaded else ''})")
+    yield
+    # Graceful shutdown: let in-flight scoring finish, then flush any buffered profile writes
+    scoring_executor.shutdown()
+    profile_store_instance.close()
+    session_store_instance.close()
+    response_archive.close()
+
 app = FastAPI(
     title="NuMi Instinct Map API",
     version="1.0.0",
-    description="API for submitting NuMi Instinct Assessment answers and retrieving profiles."
+    description="API for submitting NuMi Instinct Assessment answers and retrieving profiles.",
+    lifespan=lifespan
+)
+
+http_request_seconds = metrics_registry.histogram(
+    "numi_http_request_duration_seconds", "Request latency by endpoint.", ["method", "route", "status"]
+)
+profile_lookups_total = metrics_registry.counter(
+    "numi_profile_store_lookups_total", "Profile reads by outcome.", ["result"]
+)
+_store_gauge_mode = "max" if profile_store_instance.shared_across_workers else "livesum"
+profile_store_entries = metrics_registry.gauge("numi_profile_store_entries", "Profiles held by the store.", mode=_store_gauge_mode)
+profile_store_bytes = metrics_registry.gauge("numi_profile_store_bytes", "Approximate bytes held by in-memory profile stores.")
+write_behind_pending = metrics_registry.gauge("numi_profile_write_behind_pending", "Profile writes buffered but not yet flushed.")
+write_behind_total = metrics_registry.counter(
+    "numi_profile_write_behind_total", "Write-behind buffer events (flushed, coalesced, dropped, flush_errors).", ["event"]
+)
+scoring_queue_depth = metrics_registry.gauge("numi_scoring_queue_depth", "Submits waiting for a scoring worker.")
+scoring_in_flight = metrics_registry.gauge("numi_scoring_in_flight", "Submits queued or being scored.")
+scoring_rejected_total = metrics_registry.counter("numi_scoring_rejected_total", "Submits rejected with 503 because the scoring queue was full.")
+startup_seconds = metrics_registry.gauge(
+    "numi_startup_seconds", "Worker start-up time by phase (data_load, app_import, warm_up, ready).", ["phase"], mode="max"
 )
 
+def _collect_runtime_metrics() -> None:
+    """Refreshes gauges (and mirrored counters) from live component state before each snapshot."""
+    executor_stats = scoring_executor.stats()
+    scoring_queue_depth.set(executor_stats["queue_depth"])
+    scoring_in_flight.set(executor_stats["in_flight"])
+    scoring_rejected_total.mirror(executor_stats["rejected"])
+
+    store_stats = profile_store_instance.stats() if hasattr(profile_store_instance, "stats") else {}
+    backing_stats = store_stats.get("backing", {})
+    entries = store_stats.get("entries", backing_stats.get("entries"))
+    if entries is not None:
+        profile_store_entries.set(entries)
+    if "bytes" in store_stats or "bytes" in backing_stats:
+        profile_store_bytes.set(store_stats.get("bytes", backing_stats.get("bytes")))
+    if "pending" in store_stats:
+        write_behind_pending.set(store_stats["pending"])
+        for event in ("flushed", "coalesced", "dropped", "flush_errors"):
+            write_behind_total.mirror(store_stats[event], event=event)
+
+metrics_registry.on_collect(_collect_runtime_metrics)
+
+_request_parse_seconds = scoring_stage_seconds.labels(stage="request_parse")
+_compact_decode_seconds = scoring_stage_seconds.labels(stage="compact_decode")
+_store_write_seconds = scoring_stage_seconds.labels(stage="store_write")
+_serialization_seconds = scoring_stage_seconds.labels(stage="serialization")
+
+def _observe_request_parse() -> None:
+    """Records time from request arrival to handler entry: body read, Pydantic validation, auth."""
+    started = request_started.get()
+    if started is not None:
+        _request_parse_seconds.observe(perf_counter() - started)
+
+_route_paths: Dict[Any, str] = {}
+
+def _route_name(scope: Dict[str, Any]) -> str:
+    """Route template for the endpoint the router matched (bounded label values), or "unmatched"."""
+    if not _route_paths:
+        _route_paths.update({route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")})
+    return _route_paths.get(scope.get("endpoint"), "unmatched")
+
+app.add_middleware(RequestMetricsMiddleware, histogram=http_request_seconds, route_name=_route_name)
+
 API_KEY = os.environ.get("API_KEY") 
 API_KEY_NAME = "X-API-Key"
 
@@ -32,22 +137,48 @@ async def get_api_key(api_key_header: str = Security(api_key_header_auth)):
         )
     return api_key_header
 
+metrics_api_key_auth = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
+metrics_bearer_auth = HTTPBearer(auto_error=False)
+
+async def get_metrics_auth(
+    api_key_header: Optional[str] = Security(metrics_api_key_auth),
+    bearer: Optional[HTTPAuthorizationCredentials] = Security(metrics_bearer_auth)
+):
+    """/metrics accepts the API key, or `Authorization: Bearer <NUMI_METRICS_TOKEN>` for scrapers."""
+    if api_key_header is not None and api_key_header == API_KEY:
+        return
+    if METRICS_TOKEN and bearer is not None and secrets.compare_digest(bearer.credentials, METRICS_TOKEN):
+        return
+    raise HTTPException(
+        status_code=403,
+        detail="Could not validate credentials"
+    )
+
 # Dependency for profile store (allows for easier testing and future replacement)
 async def get_profile_store() -> ProfileStore:
     return profile_store_instance
 
+async def get_session_store() -> SessionStore:
+    return session_store_instance
+
 @app.post("/v1/instinct-map/submit", response_model=Profile)
 async def submit_assessment(
     user_id: str = Body(..., embed=True, description="Unique identifier for the user"), 
     answers: List[UserAnswer] = Body(..., embed=True, description="List of user answers to assessment questions"),
+    item_bank_version: Optional[str] = Body(None, embed=True, description="Item-bank version to score against (default: the current version)"),
     store: ProfileStore = Depends(get_profile_store),
-    api_key: str = Depends(get_api_key)
+    api_key: str = Depends(get_api_key),
+    idempotency_key: Optional[str] = Header(None, description="Optional client key; retries with the same key replay the first response"),
+    x_profile_request: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Accepts a user's 100 answers to the NuMi Instinct Assessment, 
     scores them, and returns the JSON profile. The profile is also cached.
+    Retries (same Idempotency-Key, or the same user_id and answers) within the idempotency
+    window get the original response back without rescoring; it is marked `Idempotent-Replayed: true`.
+    Answers are scored with the rules of `item_bank_version` when given, else the current version.
     """
-    logger.info(f"Received submission for user_id: {user_id} with {len(answers)} answers.")
+    _observe_request_parse()
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id is required.")
     if not answers or len(answers) == 0: # Basic check, could be more specific e.g. == 100
@@ -60,61 +191,535 @@ async def submit_assessment(
     #     logger.warning(f"User {user_id} submitted {len(answers)} answers, expected {num_expected_questions}.")
         # Depending on strictness, could raise HTTPException here
 
+    bank = _item_bank_for(item_bank_version)
+    fingerprint = submission_fingerprint(user_id, answers, bank.tag)
+    return await _score_submission(
+        user_id, fingerprint, idempotency_key, store,
+        (score_answers_compiled, answers, bank), bank, answers,
+        f"Received submission for user_id: {user_id} with {len(answers)} answers.",
+        "/v1/instinct-map/submit", x_profile_request
+    )
+
+def _item_bank_for(version: Optional[str]) -> CompiledItemBank:
+    """The compiled bank a submission names (version name or layout id; None: current), else a 422."""
+    if version is None:
+        return item_bank_registry.current()
+    try:
+        return item_bank_registry.resolve(version)
+    except UnknownItemBankVersion:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown item_bank_version {version!r}; current version is {item_bank_registry.current().tag!r}."
+        )
+
+async def _score_submission(
+    user_id: str,
+    fingerprint: str,
+    idempotency_key: Optional[str],
+    store: ProfileStore,
+    score_call: Tuple[Callable[..., Profile], ...],
+    bank: CompiledItemBank,
+    responses: Union[bytes, List[UserAnswer]],
+    received_message: str,
+    route: str,
+    profile_token: Optional[str],
+) -> Response:
+    """Shared /submit tail: idempotent score + save, answered with the stored profile bytes.
+
+    `score_call` is (function, *args), run on the scoring executor so the event loop stays free;
+    it must be picklable when NUMI_SCORING_EXECUTOR=process. The `responses` (answers or codes
+    for `bank`) are queued for the response archive and shadow scoring once scored. Requests
+    picked by the request profiler run scoring and serialization under cProfile and get an
+    `X-Profile-Id` header.
+    """
+    profile_id: Optional[str] = None
+
+    async def score_and_save() -> bytes:
+        nonlocal profile_id
+        logger.info(received_message)
+        profiling = request_profiler.wanted(profile_token) and request_profiler.begin()
+        try:
+            # Score the answers
+            if profiling:
+                started = perf_counter()
+                (profile_data, profile_json), stats = await scoring_executor.run(profile_call, score_and_serialize, *score_call)
+            else:
+                profile_data = await scoring_executor.run(*score_call)
+            
+            # Save/cache the profile (blocking store I/O goes to the threadpool, not the event loop)
+            saving = perf_counter()
+            await run_in_threadpool(store.save_profile, user_id, profile_data)
+            serializing = perf_counter()
+            _store_write_seconds.observe(serializing - saving)
+            response_archive.append(user_id, bank, responses)
+            shadow_scorer.offer(user_id, bank, responses, profile_data)
+            logger.info(f"Profile calculated and cached for user_id: {user_id}")
+            
+            if profiling:
+                profile_id = request_profiler.record(route, user_id, perf_counter() - started, stats)
+                return profile_json
+            profile_json = profile_data.model_dump_json().encode("utf-8")
+            _serialization_seconds.observe(perf_counter() - serializing)
+            return profile_json
+        except ScoringQueueFull:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing submission for user_id {user_id}: {str(e)}", exc_info=True)
+            # Consider what type of error to return. 
+            # If it's a data validation issue with answers, could be 400 or 422.
+            # If it's an internal server error during scoring, 500.
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the assessment: {str(e)}")
+        finally:
+            if profiling:
+                request_profiler.end()
+
+    key = idempotency_cache.key_for(user_id, fingerprint, idempotency_key)
+    try:
+        profile_json, replayed = await idempotency_cache.run(key, fingerprint, score_and_save)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different submission.")
+    except ScoringQueueFull:
+        logger.warning(f"Scoring queue full; rejecting submission for user_id: {user_id}")
+        raise HTTPException(
+            status_code=503,
+            detail="The scoring service is at capacity; retry shortly.",
+            headers={"Retry-After": str(SCORING_RETRY_AFTER_SECONDS)},
+        )
+    headers = {"Idempotent-Replayed": "true"} if replayed else {}
+    if profile_id is not None:
+        headers["X-Profile-Id"] = profile_id
+    return Response(content=profile_json, media_type="application/json", headers=headers)
+
+@app.get("/v2/instinct-map/item-bank")
+async def get_item_bank(version: Optional[str] = None, api_key: str = Depends(get_api_key)):
+    """
+    Publishes the layout id (`version`) and slot order that v2 compact submissions are keyed to,
+    with the answer each code stands for (code 0 = unanswered), for the current item-bank
+    version or the one named by `?version=`. `tag` is the item-bank version name.
+    """
+    bank = _item_bank_for(version)
+    return {
+        "version": bank.version,
+        "tag": bank.tag,
+        "slots": [{"slot": slot, "codes": {str(code): answer for code, answer in enumerate(options, start=1)}}
+                  for slot, options in zip(bank.slots, bank.slot_options)],
+    }
+
+@app.post("/v2/instinct-map/submit", response_model=Profile)
+async def submit_assessment_compact(
+    submission: CompactSubmission,
+    store: ProfileStore = Depends(get_profile_store),
+    api_key: str = Depends(get_api_key),
+    idempotency_key: Optional[str] = Header(None, description="Optional client key; retries with the same key replay the first response"),
+    x_profile_request: Optional[str] = Header(None, include_in_schema=False)
+):
+    """
+    v2 submit: answers as one code per slot (a digit string or an integer array) for a published
+    item-bank version. The payload is validated in a single pass and every invalid code is
+    reported in one 422 response. Scoring, caching and idempotency match /v1/instinct-map/submit.
+    """
+    _observe_request_parse()
+    if not submission.user_id:
+        raise HTTPException(status_code=400, detail="user_id is required.")
+    bank = _item_bank_for(submission.item_bank_version)
+    decoding = perf_counter()
+    try:
+        codes = compact_decoder_for(bank).decode(submission.answers)
+    except CompactAnswersError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    _compact_decode_seconds.observe(perf_counter() - decoding)
+
+    fingerprint = hashlib.sha256(f"{submission.user_id}\0{bank.tag}\0".encode("utf-8") + codes).hexdigest()
+    return await _score_submission(
+        submission.user_id, fingerprint, idempotency_key, store,
+        (score_codes, codes, bank), bank, codes,
+        f"Received compact submission for user_id: {submission.user_id}.",
+        "/v2/instinct-map/submit", x_profile_request
+    )
+
+def _validate_batch_chunk(chunk: List[Any], chunk_start: int) -> Tuple[Dict[int, Dict[str, Any]], Dict[str, List[tuple]]]:
+    """Error lines for the chunk's invalid records, and its valid ones grouped by item-bank version."""
+    lines: Dict[int, Dict[str, Any]] = {}
+    valid: Dict[str, List[tuple]] = {} # item-bank version -> [(index, SubmissionRecord)]
+    for offset, raw in enumerate(chunk):
+        index = chunk_start + offset
+        user_id = raw.get("user_id") if isinstance(raw, dict) else None
+        try:
+            record = SubmissionRecord.model_validate(raw)
+        except ValidationError as e:
+            lines[index] = {"index": index, "user_id": user_id, "error": e.errors(include_url=False, include_context=False)}
+            continue
+        if not record.user_id:
+            lines[index] = {"index": index, "user_id": user_id, "error": "user_id is required."}
+        elif not record.answers:
+            lines[index] = {"index": index, "user_id": user_id, "error": "Answers list cannot be empty."}
+        else:
+            try:
+                bank = item_bank_registry.resolve(record.item_bank_version) if record.item_bank_version else item_bank_registry.current()
+            except UnknownItemBankVersion:
+                lines[index] = {"index": index, "user_id": user_id, "error": f"Unknown item_bank_version {record.item_bank_version!r}."}
+                continue
+            valid.setdefault(bank.tag, []).append((index, record))
+    return lines, valid
+
+def _save_batch_group(store: ProfileStore, bank: CompiledItemBank, group: List[tuple], profiles: List[Profile]) -> Dict[int, Dict[str, Any]]:
+    """Caches a scored version group in bulk and returns its result lines."""
+    store.save_profiles((record.user_id, profile) for (_, record), profile in zip(group, profiles))
+    response_archive.append_many(bank, [(record.user_id, record.answers) for _, record in group])
+    return {index: {"index": index, "user_id": record.user_id, "profile": profile.model_dump(mode="json")}
+            for (index, record), profile in zip(group, profiles)}
+
+async def _stream_batch_results(records: List[Dict[str, Any]], store: ProfileStore) -> AsyncIterator[str]:
+    """Validates, scores and saves batch records chunk by chunk, yielding one NDJSON line per record.
+
+    Each version group is scored on the scoring executor, so batches share the submit path's
+    admission control. ScoringQueueFull from the first chunk propagates (the endpoint answers
+    503 before streaming starts); later rejected groups get a per-record error line instead.
+    Validation, saving and serialization run in the threadpool.
+    """
+    from batch_scoring import score_answer_lists # NumPy: loaded on first use, or by warm_up()
+    for chunk_start in range(0, len(records), BATCH_SUBMIT_CHUNK_SIZE):
+        chunk = records[chunk_start:chunk_start + BATCH_SUBMIT_CHUNK_SIZE]
+        lines, valid = await run_in_threadpool(_validate_batch_chunk, chunk, chunk_start)
+
+        for version, group in valid.items():
+            try:
+                bank = item_bank_registry.get(version)
+                profiles = await scoring_executor.run(score_answer_lists, [record.answers for _, record in group], bank)
+                lines.update(await run_in_threadpool(_save_batch_group, store, bank, group, profiles))
+            except ScoringQueueFull:
+                if chunk_start == 0:
+                    raise
+                logger.warning(f"Scoring queue full; rejecting batch records {chunk_start}-{chunk_start + len(chunk) - 1}")
+                for index, record in group:
+                    lines[index] = {"index": index, "user_id": record.user_id, "error": "The scoring service is at capacity; retry shortly."}
+            except Exception as e:
+                logger.error(f"Error processing batch records {chunk_start}-{chunk_start + len(chunk) - 1}: {str(e)}", exc_info=True)
+                for index, record in group:
+                    lines[index] = {"index": index, "user_id": record.user_id, "error": f"An unexpected error occurred while processing the assessment: {str(e)}"}
+
+        yield "".join(json.dumps(lines[index]) + "\n" for index in sorted(lines))
+
+async def _prepend(first: str, rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    yield first
+    async for lines in rest:
+        yield lines
+
+@app.post("/v1/instinct-map/submit-batch")
+async def submit_assessment_batch(
+    records: List[Dict[str, Any]] = Body(..., embed=True, description="Submissions shaped like {user_id, answers, item_bank_version?}"),
+    store: ProfileStore = Depends(get_profile_store),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Accepts many `{user_id, answers}` submissions in one request, scores them through the
+    batch engine, caches the profiles in bulk and streams one NDJSON line per record back,
+    in request order: `{"index", "user_id", "profile"}` or `{"index", "user_id", "error"}`.
+    Scoring goes through the same bounded queue as /submit: if it is full when the batch
+    starts, the answer is a 503 with Retry-After; records rejected later in the stream get
+    an error line and can be resubmitted.
+    """
+    logger.info(f"Received batch submission with {len(records)} records.")
+    if not records:
+        raise HTTPException(status_code=400, detail="records list cannot be empty.")
+    if len(records) > MAX_BATCH_SUBMISSIONS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {MAX_BATCH_SUBMISSIONS} records.")
+    results = _stream_batch_results(records, store)
+    try:
+        first = await results.__anext__()
+    except ScoringQueueFull:
+        logger.warning(f"Scoring queue full; rejecting batch submission of {len(records)} records.")
+        raise HTTPException(
+            status_code=503,
+            detail="The scoring service is at capacity; retry shortly.",
+            headers={"Retry-After": str(SCORING_RETRY_AFTER_SECONDS)},
+        )
+    return StreamingResponse(_prepend(first, results), media_type="application/x-ndjson")
+
+def _session_bank(session: AssessmentSession) -> CompiledItemBank:
+    try:
+        return item_bank_registry.get(session.item_bank_version)
+    except UnknownItemBankVersion:
+        raise HTTPException(status_code=409, detail=f"The session's item_bank_version {session.item_bank_version!r} is no longer published.")
+
+def _session_view(session: AssessmentSession, bank: CompiledItemBank, provisional: bool = False) -> Dict[str, Any]:
+    """Progress of a session, plus the profile its answers so far would get when `provisional`."""
+    view: Dict[str, Any] = {
+        "session_id": session.session_id,
+        "user_id": session.user_id,
+        "item_bank_version": session.item_bank_version,
+        "answered": session.answered,
+        "total": len(bank.slots),
+        "complete": session.answered == len(bank.slots),
+        "finalized": session.finalized,
+        "expires_at": datetime.fromtimestamp(session.expires_at, timezone.utc).isoformat(),
+    }
+    if provisional:
+        view["provisional_profile"] = score_tallies(session.subtype_raw, session.creation_item_counts, bank).model_dump(mode="json")
+    return view
+
+def _session_changes(answers: List[UserAnswer], bank: CompiledItemBank) -> List[Tuple[int, int]]:
+    """(slot index, answer code) per answer, or a 422 listing every answer that isn't valid for the bank."""
+    changes: List[Tuple[int, int]] = []
+    errors: List[Dict[str, Any]] = []
+    for position, answer in enumerate(answers):
+        hit = bank.answer_codes.get((answer.slot, answer.answer))
+        if hit is not None:
+            changes.append(hit)
+        elif answer.slot not in bank.slot_index:
+            errors.append({"position": position, "slot": answer.slot, "error": "unknown slot"})
+        else:
+            options = bank.slot_options[bank.slot_index[answer.slot]]
+            errors.append({"position": position, "slot": answer.slot, "error": f"invalid answer; expected one of {list(options)}"})
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    return changes
+
+_SESSION_NOT_FOUND = "Session not found or expired."
+
+@app.post("/v1/instinct-map/sessions", status_code=201)
+async def start_session(
+    user_id: str = Body(..., embed=True, description="Unique identifier for the user"),
+    item_bank_version: Optional[str] = Body(None, embed=True, description="Item-bank version to answer (default: the current version)"),
+    sessions: SessionStore = Depends(get_session_store),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Starts an incremental assessment: answers are then saved one at a time or in small packs
+    (hard save after each answer) and the profile is scored from running counters at finalize.
+    """
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id is required.")
+    bank = _item_bank_for(item_bank_version)
+    session = AssessmentSession.start(secrets.token_urlsafe(16), user_id, bank)
+    await run_in_threadpool(sessions.create, session)
+    logger.info(f"Started session {session.session_id} for user_id: {user_id} (item bank {bank.tag})")
+    return _session_view(session, bank)
+
+@app.get("/v1/instinct-map/sessions/{session_id}")
+async def get_session(
+    session_id: str,
+    provisional: bool = False,
+    sessions: SessionStore = Depends(get_session_store),
+    api_key: str = Depends(get_api_key)
+):
+    """Progress and saved answers of a session, so a client can resume it."""
+    session = await run_in_threadpool(sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=_SESSION_NOT_FOUND)
+    bank = _session_bank(session)
+    view = _session_view(session, bank, provisional)
+    view["answers"] = [answer.model_dump() for answer in session.answers(bank)]
+    return view
+
+@app.post("/v1/instinct-map/sessions/{session_id}/answers")
+async def save_session_answers(
+    session_id: str,
+    answers: List[UserAnswer] = Body(..., embed=True, description="One or more answers; a later answer to a slot replaces the earlier one"),
+    provisional: bool = False,
+    sessions: SessionStore = Depends(get_session_store),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Saves answers to a session and returns its progress (with `?provisional=true`, also the
+    profile the answers so far would get). Changing an answer moves its point from the old
+    subtype to the new one; the running counters are updated, never recomputed.
+    """
+    if not answers:
+        raise HTTPException(status_code=400, detail="Answers list cannot be empty.")
+    session = await run_in_threadpool(sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=_SESSION_NOT_FOUND)
+    bank = _session_bank(session)
+    changes = _session_changes(answers, bank)
+
+    def apply(current: AssessmentSession) -> int:
+        if current.finalized:
+            raise HTTPException(status_code=409, detail="The session was already finalized.")
+        return current.apply(changes, bank)
+
+    session, _ = await run_in_threadpool(sessions.update, session_id, apply)
+    if session is None:
+        raise HTTPException(status_code=404, detail=_SESSION_NOT_FOUND)
+    return _session_view(session, bank, provisional)
+
+@app.post("/v1/instinct-map/sessions/{session_id}/finalize", response_model=Profile)
+async def finalize_session(
+    session_id: str,
+    sessions: SessionStore = Depends(get_session_store),
+    store: ProfileStore = Depends(get_profile_store),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Scores the session from its running counters (no pass over the answers), caches the profile
+    for the session's user_id like /submit does, and returns it. Finalizing again returns the
+    same scores; the session accepts no more answers and expires with its TTL. Scoring goes
+    through the bounded scoring queue: a 503 leaves the session finalized, and a retry scores it.
+    """
+    def close(current: AssessmentSession) -> bool:
+        if current.answered == 0:
+            raise HTTPException(status_code=400, detail="Answers list cannot be empty.")
+        finalized_now = not current.finalized
+        current.finalized = True
+        return finalized_now
+
+    session, finalized_now = await run_in_threadpool(sessions.update, session_id, close)
+    if session is None:
+        raise HTTPException(status_code=404, detail=_SESSION_NOT_FOUND)
+    bank = _session_bank(session)
+    if finalized_now: # the answers are final now; a retried finalize must not archive them twice
+        response_archive.append(session.user_id, bank, bytes(session.codes))
     try:
-        # Score the answers
-        profile_data = score_answers(answers)
-        
-        # Save/cache the profile
-        store.save_profile(user_id, profile_data)
-        logger.info(f"Profile calculated and cached for user_id: {user_id}")
-        
-        return profile_data
-    except Exception as e:
-        logger.error(f"Error processing submission for user_id {user_id}: {str(e)}", exc_info=True)
-        # Consider what type of error to return. 
-        # If it's a data validation issue with answers, could be 400 or 422.
-        # If it's an internal server error during scoring, 500.
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred while processing the assessment: {str(e)}")
+        profile = await scoring_executor.run(score_tallies, session.subtype_raw, session.creation_item_counts, bank)
+    except ScoringQueueFull:
+        logger.warning(f"Scoring queue full; rejecting finalize of session {session_id}")
+        raise HTTPException(
+            status_code=503,
+            detail="The scoring service is at capacity; retry shortly.",
+            headers={"Retry-After": str(SCORING_RETRY_AFTER_SECONDS)},
+        )
+    saving = perf_counter()
+    await run_in_threadpool(store.save_profile, session.user_id, profile)
+    _store_write_seconds.observe(perf_counter() - saving)
+    logger.info(f"Profile calculated from session {session_id} and cached for user_id: {session.user_id}")
+    return Response(content=profile.model_dump_json().encode("utf-8"), media_type="application/json")
+
+def _profile_etag(profile_json: bytes) -> str:
+    """Strong ETag over the exact bytes served."""
+    return '"' + hashlib.blake2b(profile_json, digest_size=16).hexdigest() + '"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison (RFC 9110 13.1.2), so W/ prefixes are ignored."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
 
 @app.get("/v1/instinct-map/{user_id}", response_model=Profile)
 async def get_assessment_profile(
     user_id: str, 
     store: ProfileStore = Depends(get_profile_store),
-    api_key: str = Depends(get_api_key)
+    api_key: str = Depends(get_api_key),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Retrieves a previously calculated and cached Instinct Map profile for a given user_id.
+    The profile is assembled from its stored score record (memoized per worker, see profile_codec.py)
+    and served with a strong ETag; a matching If-None-Match gets a 304. The store read and the
+    assembly (which may recompile an item-bank version) run in the threadpool.
     """
     logger.info(f"Attempting to retrieve profile for user_id: {user_id}")
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id path parameter is required.")
 
-    profile = store.get_profile(user_id)
+    # Store reads are blocking I/O (SQLite waits out busy writers) and assemble the profile on a memo
+    # miss: threadpool, not the event loop
+    profile_json = await run_in_threadpool(store.get_profile_json, user_id)
+    profile_lookups_total.inc(result="miss" if profile_json is None else "hit")
     
-    if profile:
-        logger.info(f"Profile found for user_id: {user_id}")
-        return profile
-    else:
+    if profile_json is None:
         logger.warning(f"Profile not found for user_id: {user_id}")
         raise HTTPException(status_code=404, detail="Profile not found for the given user_id. Please submit the assessment first.")
 
+    logger.info(f"Profile found for user_id: {user_id}")
+    etag = _profile_etag(profile_json)
+    headers = {"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL, "Vary": "X-API-Key"}
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=profile_json, media_type="application/json", headers=headers)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(auth: None = Depends(get_metrics_auth)):
+    """Prometheus text exposition of request, scoring-stage, store and queue metrics, aggregated
+    across worker processes when NUMI_METRICS_DIR is set. Needs the API key, or the scrape token
+    (NUMI_METRICS_TOKEN) as a bearer token, like the /v1/ops endpoints."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/v1/ops/scoring-queue")
+async def get_scoring_queue_stats(api_key: str = Depends(get_api_key)):
+    """Scoring executor metrics for this worker: queue depth, in-flight calls, rejections, queue wait."""
+    return scoring_executor.stats()
+
+@app.get("/v1/ops/profiles")
+async def list_request_profiles(api_key: str = Depends(get_api_key)):
+    """Profiled submits held by this worker, newest first (see profiling.py for how requests are picked)."""
+    return {"profiles": request_profiler.summaries(), "skipped_busy": request_profiler.skipped_busy}
+
+@app.get("/v1/ops/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, format: str = "json", api_key: str = Depends(get_api_key)):
+    """
+    One request profile: `format=json` gives functions by cumulative time and caller -> callee
+    edges; `format=pstats` gives a file for `python -m pstats` or snakeviz.
+    Profiles live in the worker that served the request (the id starts with its pid).
+    """
+    record = request_profiler.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found in this worker's buffer.")
+    if format == "pstats":
+        return Response(content=request_profiler.pstats_bytes(record), media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'})
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'pstats'.")
+    return request_profiler.call_graph(record)
+
+@app.get("/v1/ops/item-banks")
+async def get_item_bank_stats(api_key: str = Depends(get_api_key)):
+    """Item-bank versions: published, current, and compiled in this worker's cache."""
+    return item_bank_registry.stats()
+
+@app.get("/v1/ops/response-archive")
+async def get_response_archive_stats(api_key: str = Depends(get_api_key)):
+    """This worker's response archive writer: queued/written submissions and its open segments."""
+    return response_archive.stats()
+
+@app.get("/v1/ops/shadow")
+async def get_shadow_scoring_stats(api_key: str = Depends(get_api_key)):
+    """
+    This worker's shadow-scoring comparison of the candidate rules (NUMI_SHADOW_RULES_FILE) with the
+    live ones: how often Driver, Creation, Growth Edge and the headline change, the most common
+    changes and recent samples. /metrics has the counters summed over workers.
+    """
+    return shadow_scorer.stats()
+
+@app.get("/v1/ops/startup")
+async def get_startup_timings(api_key: str = Depends(get_api_key)):
+    """How this worker started: data source (snapshot or source files) and per-phase timings."""
+    timings: Dict[str, Any] = {"pid": os.getpid()}
+    for name, value in STARTUP_TIMINGS.items():
+        if name.endswith("_seconds"):
+            timings[name.replace("_seconds", "_ms")] = round(value * 1000, 3)
+        else:
+            timings[name] = value
+    return timings
+
+@app.get("/v1/ops/profile-store")
+async def get_profile_store_stats(store: ProfileStore = Depends(get_profile_store), api_key: str = Depends(get_api_key)):
+    """Profile store counters for this worker (cache hits/evictions, write-behind flush lag and drops,
+    profile assembly from stored records)."""
+    stats = getattr(store, "stats", None)
+    return {"store": type(store).__name__, **(stats() if stats else {}), "assembly": profile_assembler.stats()}
+
 # A simple root endpoint for health check or basic info
 @app.get("/")
 async def root():
     return {"message": "Welcome to the NuMi Instinct Map API. See /docs for details."}
 
-# It might be useful to add a startup event to pre-load data if not already handled by module-level calls
-# in data_loader.py. However, data_loader.py already loads data when imported.
-# @app.on_event("startup")
-# async def startup_event():
-#     logger.info("Application startup: Pre-loading assessment data...")
-#     # This will trigger the lru_cache in data_loader
-#     load_assessment_questions()
-#     load_flowprint_labels()
-#     load_subtype_glossary()
-#     load_scenario_mapping()
-#     get_instinct_to_subtypes_map()
-#     logger.info("Assessment data loaded.")
+def warm_up() -> None:
+    """
+    Builds what the app otherwise initialises on first use: the compiled item bank, its compact
+    decoder and the NumPy batch scorer. gunicorn.conf.py calls this in a preloading master, so the
+    workers fork with it already in place (shared copy-on-write) instead of each building it.
+    """
+    started = perf_counter()
+    import batch_scoring # noqa: F401
+    compact_decoder_for(item_bank_registry.current())
+    STARTUP_TIMINGS["warm_up_seconds"] = perf_counter() - started
+
+_import_pid = os.getpid()
+STARTUP_TIMINGS: Dict[str, Any] = {
+    "data_source": data_loader.DATA_SOURCE, # "snapshot" or "source files"
+    "data_load_seconds": data_loader.DATA_LOAD_SECONDS,
+    "app_import_seconds": perf_counter() - _import_started, # includes the data load
+}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,351 @@
+"""Lightweight in-process metrics with Prometheus text exposition, aggregated across processes.
+
+Counters, gauges and histograms live in plain dicts behind one lock, so recording is a dict
+update (well under a microsecond) and safe to leave on in production. Each process serves its
+own live values; with NUMI_METRICS_DIR set, every process (gunicorn workers, and scoring
+processes when NUMI_SCORING_EXECUTOR=process) also writes a snapshot to
+`<dir>/metrics-<pid>.json` every METRICS_FLUSH_SECONDS, and /metrics on any worker merges all
+snapshots with its own live values:
+
+- counters and histograms are summed over every snapshot, including exited processes, so
+  totals don't go backwards when a worker is recycled;
+- gauges are either summed over live processes ("livesum", e.g. per-worker queue depth) or
+  the maximum over live processes ("max", e.g. the size of a store shared by all workers).
+
+This follows prometheus_client's multiprocess mode without taking the dependency.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import METRICS_DIR, METRICS_FLUSH_SECONDS
+
+# Latency buckets in seconds: 50us .. 10s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str]):
+        self._registry = registry
+        self._lock = registry._lock
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[LabelValues, Any] = {}
+        self._reset()
+
+    def _reset(self) -> None:
+        self.values = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        # Label values must be str already; this runs on every observation
+        return tuple([labels[name] for name in self.labelnames]) if labels else ()
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.type, "help": self.help, "labels": list(self.labelnames)}
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _reset(self) -> None:
+        # A counter without labels is exported as 0 before its first increment
+        self.values = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self._registry._ensure_flusher()
+
+    def mirror(self, total: float, **labels: str) -> None:
+        """Sets the total from a component that keeps its own monotonic count (see on_collect)."""
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = total
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str], mode: str = "livesum"):
+        if mode not in ("livesum", "max"):
+            raise ValueError(f"Unknown gauge mode {mode!r}; expected 'livesum' or 'max'.")
+        super().__init__(registry, name, help, labelnames)
+        self.mode = mode
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(super().describe(), mode=self.mode)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Sequence[str],
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: str) -> None:
+        self._observe(self._key(labels), value)
+
+    def labels(self, **labels: str) -> "_BoundHistogram":
+        """This histogram with fixed label values, for hot paths (skips per-call label handling)."""
+        return _BoundHistogram(self, self._key(labels))
+
+    def _observe(self, key: LabelValues, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value) # first bucket with upper bound >= value
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then +Inf, sum, count
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+        self._registry._ensure_flusher()
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(super().describe(), buckets=list(self.buckets))
+
+
+class _BoundHistogram:
+    __slots__ = ("_histogram", "_key")
+
+    def __init__(self, histogram: Histogram, key: LabelValues):
+        self._histogram = histogram
+        self._key = key
+
+    def observe(self, value: float) -> None:
+        self._histogram._observe(self._key, value)
+
+
+class MetricsRegistry:
+    """All metrics of one process, plus snapshot files for cross-process aggregation."""
+
+    def __init__(self, directory: Optional[Path] = METRICS_DIR, flush_interval: float = METRICS_FLUSH_SECONDS):
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collect_callbacks: List[Callable[[], None]] = []
+        self._flusher_pid: Optional[int] = None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        atexit.register(self._write_final_snapshot)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self) -> None:
+        # A forked child (e.g. a process-pool scorer) must not report the parent's values as its own
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = self._lock
+            metric._reset()
+        self._flusher_pid = None
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), mode: str = "livesum") -> Gauge:
+        return self._register(Gauge(self, name, help, labelnames, mode))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def on_collect(self, callback: Callable[[], None]) -> None:
+        """Runs `callback` before every snapshot/render, e.g. to refresh gauges from live state."""
+        self._collect_callbacks.append(callback)
+
+    def snapshot(self) -> Dict[str, Any]:
+        for callback in self._collect_callbacks:
+            callback()
+        with self._lock:
+            return {
+                name: dict(metric.describe(), samples=[[list(key), value if not isinstance(value, list) else list(value)]
+                                                      for key, value in metric.values.items()])
+                for name, metric in self._metrics.items()
+            }
+
+    # --- cross-process snapshots ---
+
+    def _snapshot_path(self, pid: int) -> Path:
+        return self.directory / f"metrics-{pid}.json"
+
+    def write_snapshot(self) -> None:
+        if self.directory is None:
+            return
+        path = self._snapshot_path(os.getpid())
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _write_final_snapshot(self) -> None:
+        try:
+            self.write_snapshot()
+        except OSError:
+            pass
+
+    def _ensure_flusher(self) -> None:
+        if self.directory is None or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        pid = os.getpid()
+        while self._flusher_pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except OSError:
+                pass # the next interval retries; /metrics still serves live values
+
+    def collect(self) -> Dict[str, Any]:
+        """This process's live values merged with every other process's latest snapshot."""
+        own_pid = os.getpid()
+        snapshots: List[Tuple[bool, Dict[str, Any]]] = [(True, self.snapshot())]
+        if self.directory is not None:
+            for path in self.directory.glob("metrics-*.json"):
+                try:
+                    pid = int(path.stem.split("-", 1)[1])
+                except ValueError:
+                    continue
+                if pid == own_pid:
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        snapshots.append((_pid_alive(pid), json.load(f)))
+                except (OSError, ValueError):
+                    continue
+
+        merged: Dict[str, Any] = {}
+        for alive, snapshot in snapshots:
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, dict(metric, samples={}))
+                samples = target["samples"]
+                if metric["type"] == "gauge" and not alive:
+                    continue
+                for key, value in metric["samples"]:
+                    key = tuple(key)
+                    if metric["type"] == "histogram":
+                        if key in samples:
+                            samples[key] = [a + b for a, b in zip(samples[key], value)]
+                        else:
+                            samples[key] = list(value)
+                    elif metric["type"] == "gauge" and metric.get("mode") == "max":
+                        samples[key] = max(samples.get(key, value), value)
+                    else:
+                        samples[key] = samples.get(key, 0) + value
+        return merged
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4) of collect()."""
+        lines: List[str] = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labels"]
+            for key, value in sorted(metric["samples"].items()):
+                labels = list(zip(labelnames, key))
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric["buckets"]) + ["+Inf"], value):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _labels(pairs: List[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request latency by method, route template and status.
+
+    Also publishes the request start time in `request_started`, so handlers can time the
+    request parsing/validation that happens before they run.
+    """
+
+    def __init__(self, app: Callable, histogram: Histogram, route_name: Callable[[Dict[str, Any]], str]):
+        self.app = app
+        self.histogram = histogram
+        self.route_name = route_name
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        request_started.set(started)
+        status = [500]
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router fills scope["endpoint"] in place, so the matched route is known afterwards
+            self.histogram.observe(time.perf_counter() - started, method=scope["method"],
+                                   route=self.route_name(scope), status=str(status[0]))
+
+
+request_started: ContextVar[Optional[float]] = ContextVar("request_started", default=None)
+
+registry = MetricsRegistry()
+
+# Shared metric definitions (instrumented modules import these)
+scoring_stage_seconds = registry.histogram(
+    "numi_scoring_stage_seconds", "Time spent in each stage of handling a submission.", ["stage"]
+)
+flowprint_fallbacks_total = registry.counter(
+    "numi_flowprint_label_fallbacks_total", "Profiles assembled with the default headline because no Flowprint label matched."
+)
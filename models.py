@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, List
+from pydantic import BaseModel, PrivateAttr
+from typing import Optional, Dict, List, Union
 
 class ItemMeta(BaseModel):
     slot: str              # "ER-1"
@@ -14,18 +14,34 @@ class UserAnswer(BaseModel):
     slot: str
     answer: str            # raw text or key ("A")
 
+class SubmissionRecord(BaseModel):
+    # One record of a batch submission; validated per record so one bad record doesn't fail the batch
+    user_id: str
+    answers: List[UserAnswer]
+    item_bank_version: Optional[str] = None # None: the current version
+
+class CompactSubmission(BaseModel):
+    # v2 submit body: one code per slot in the slot order of `item_bank_version`, a published
+    # layout id or an item-bank version name (see wire_format.py)
+    user_id: str
+    item_bank_version: str
+    answers: Union[str, List[int]]
+
 class Profile(BaseModel):
     headline: str
     signature: str
     driver: str
     creation: str
     growth_edge: str # For v1, this might be a placeholder or determined by simple logic
-    instinct_bars: Dict[str, Dict[str, Optional[float | str]]] # e.g. {"Energy Rhythm": {"percentile": None, "dominantSubtype": "Bursty"}}
-    clashes: List[str] # For v1, this will be an empty list
+    instinct_bars: Dict[str, Dict[str, Optional[int | float | str]]] # e.g. {"Energy Rhythm": {"percentile": 84, "dominantSubtype": "Bursty"}}
+    clashes: List[str] # Empty until norms are loaded
     timestamp: str
     # New fields for detailed scores
     all_subtype_scores: Optional[Dict[str, int]] = None
     instinct_strengths: Optional[Dict[str, float]] = None
+    # Compact score record a store can keep instead of the JSON (see profile_codec.py); only the
+    # compiled scorer sets it, and it is never serialized
+    _record: Optional[bytes] = PrivateAttr(default=None)
 
 # Internal models for scoring process, not directly part of API output structure from instinct_map_scoring.md Section 2
 # but useful for internal calculations and Profile construction.
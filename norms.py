@@ -0,0 +1,347 @@
+"""Population norms builder (instinct_map_scoring.md §7).
+
+Streams raw submissions (`{"user_id", "answers"}`) or stored profiles (`{"profile": {...}}`, as written by
+rescore.py, or bare Profile dumps) and keeps one mergeable accumulator per subtype and per instinct
+strength: Welford count/mean/M2 plus a full histogram of observed values. Accumulators from parallel
+shards combine with `merge`, so shards can be built independently and folded together afterwards.
+
+    python norms.py build submissions.jsonl [more.jsonl ...] -o norms.json
+    python norms.py build new_submissions.jsonl -o norms.json --refresh   # fold in only new lines
+    python norms.py merge shard-a.json shard-b.json -o norms.json
+    python norms.py build v2_submissions.jsonl -o norms.json --item-bank-version v2
+
+Norms describe one item-bank version (default: the current one), recorded in norms.json with its layout
+id; the API only applies them to scores from that version. Raw submissions naming another version belong
+to that version's population and are skipped (build its norms with --item-bank-version).
+
+`--refresh` remembers a byte offset per input file, so a quarterly refresh over append-only files only
+reads what was added since the last run.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Tuple
+
+import numpy as np
+from pydantic import ValidationError
+
+from models import SubmissionRecord
+from item_bank import CompiledItemBank, get_compiled_item_bank, get_item_bank
+from batch_scoring import encode_answer_matrix, score_answers_batch
+from scoring_engine import tally_endorsements, compute_instinct_metrics
+from config import NORMS_FILE, ITEM_BANK_BASE_VERSION
+
+NORMS_FORMAT = 1
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class ScoreAccumulator:
+    """Welford running mean/variance plus a histogram of values; mergeable across shards."""
+
+    def __init__(self):
+        self.count: int = 0
+        self.mean: float = 0.0
+        self.m2: float = 0.0
+        self.histogram: Dict[float, int] = {}
+
+    def add_values(self, values: np.ndarray) -> None:
+        """Folds a chunk of observations in (chunk statistics, then the pairwise merge)."""
+        if values.size == 0:
+            return
+        chunk = ScoreAccumulator()
+        chunk.count = int(values.size)
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        observed, counts = np.unique(values, return_counts=True)
+        chunk.histogram = {float(v): int(c) for v, c in zip(observed, counts)}
+        self.merge(chunk)
+
+    def merge(self, other: "ScoreAccumulator") -> None:
+        """Chan et al. parallel combination; histograms add exactly."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+        else:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self.m2 += other.m2 + delta * delta * self.count * other.count / total
+            self.count = total
+        for value, count in other.histogram.items():
+            self.histogram[value] = self.histogram.get(value, 0) + count
+
+    @property
+    def sd(self) -> float:
+        """Sample standard deviation (0.0 below two observations)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "sd": self.sd,
+            "m2": self.m2,
+            "histogram": {repr(value): count for value, count in sorted(self.histogram.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ScoreAccumulator":
+        acc = cls()
+        acc.count = int(data["count"])
+        acc.mean = float(data["mean"])
+        acc.m2 = float(data["m2"])
+        acc.histogram = {float(value): int(count) for value, count in data.get("histogram", {}).items()}
+        return acc
+
+
+class NormsAccumulator:
+    """One ScoreAccumulator per subtype and per instinct strength, plus per-source read offsets."""
+
+    def __init__(self, bank: Optional[CompiledItemBank] = None):
+        bank = bank or get_compiled_item_bank()
+        self.item_bank_version: str = bank.tag
+        self.layout: str = bank.version
+        self.subtypes: Dict[str, ScoreAccumulator] = {name: ScoreAccumulator() for name in bank.subtypes}
+        self.instinct_strengths: Dict[str, ScoreAccumulator] = {name: ScoreAccumulator() for name in bank.instincts}
+        self.sources: Dict[str, Dict[str, int]] = {}
+        self.version: int = 0
+        self.skipped: int = 0
+
+    @property
+    def count(self) -> int:
+        return max((acc.count for acc in self.subtypes.values()), default=0)
+
+    def add_chunk(self, subtype_raw: np.ndarray, instinct_mean: np.ndarray, bank: CompiledItemBank) -> None:
+        """Folds in an N x subtypes score matrix and the matching N x instincts strength matrix."""
+        for j, name in enumerate(bank.subtypes):
+            self.subtypes[name].add_values(subtype_raw[:, j])
+        for j, name in enumerate(bank.instincts):
+            self.instinct_strengths[name].add_values(instinct_mean[:, j])
+
+    def merge(self, other: "NormsAccumulator") -> None:
+        if (other.item_bank_version, other.layout) != (self.item_bank_version, self.layout):
+            raise ValueError(f"Can't merge norms of item-bank version {other.item_bank_version} into {self.item_bank_version}")
+        for name, acc in other.subtypes.items():
+            self.subtypes.setdefault(name, ScoreAccumulator()).merge(acc)
+        for name, acc in other.instinct_strengths.items():
+            self.instinct_strengths.setdefault(name, ScoreAccumulator()).merge(acc)
+        for source, state in other.sources.items():
+            mine = self.sources.setdefault(source, {"offset": 0, "records": 0})
+            mine["offset"] = max(mine["offset"], state["offset"])
+            mine["records"] += state["records"]
+        self.version = max(self.version, other.version)
+        self.skipped += other.skipped
+
+    def to_dict(self) -> Dict:
+        return {
+            "format": NORMS_FORMAT,
+            "version": self.version,
+            "item_bank_version": self.item_bank_version,
+            "layout": self.layout,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "count": self.count,
+            "skipped": self.skipped,
+            "subtypes": {name: acc.to_dict() for name, acc in self.subtypes.items()},
+            "instinct_strengths": {name: acc.to_dict() for name, acc in self.instinct_strengths.items()},
+            "sources": self.sources,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, bank: Optional[CompiledItemBank] = None) -> "NormsAccumulator":
+        # Files from before item-bank versions were recorded describe the base version
+        norms = cls(bank or get_item_bank(data.get("item_bank_version", ITEM_BANK_BASE_VERSION)))
+        if data.get("layout", norms.layout) != norms.layout:
+            raise ValueError(f"Norms were built for layout {data['layout']}; item-bank version {norms.item_bank_version} has {norms.layout}")
+        for name, acc in data.get("subtypes", {}).items():
+            norms.subtypes[name] = ScoreAccumulator.from_dict(acc)
+        for name, acc in data.get("instinct_strengths", {}).items():
+            norms.instinct_strengths[name] = ScoreAccumulator.from_dict(acc)
+        norms.sources = {source: dict(state) for source, state in data.get("sources", {}).items()}
+        norms.version = int(data.get("version", 0))
+        norms.skipped = int(data.get("skipped", 0))
+        return norms
+
+
+def _scores_from_lines(lines: List[bytes], bank: CompiledItemBank) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Turns raw submission and/or stored profile lines into score matrices. Returns (subtypes, strengths, skipped)."""
+    answer_lists = []
+    profile_rows: List[Tuple[List[int], List[float]]] = []
+    skipped = 0
+    for line in lines:
+        try:
+            raw = json.loads(line)
+        except ValueError:
+            skipped += 1
+            continue
+        if not isinstance(raw, dict):
+            skipped += 1
+            continue
+        if "answers" in raw:
+            try:
+                record = SubmissionRecord.model_validate(raw)
+            except ValidationError:
+                skipped += 1
+                continue
+            if record.item_bank_version not in (None, bank.tag):
+                skipped += 1 # another version's population
+            elif record.answers:
+                answer_lists.append(record.answers)
+            else:
+                skipped += 1
+            continue
+        profile = raw.get("profile", raw)
+        subtype_scores = profile.get("all_subtype_scores") if isinstance(profile, dict) else None
+        strengths = profile.get("instinct_strengths") if isinstance(profile, dict) else None
+        if not subtype_scores or not strengths:
+            skipped += 1
+            continue
+        profile_rows.append((
+            [subtype_scores.get(name, 0) for name in bank.subtypes],
+            [strengths.get(name, 0.0) for name in bank.instincts],
+        ))
+
+    subtype_blocks = []
+    strength_blocks = []
+    # Lists that answer a slot more than once can't be a code matrix row; like score_answer_lists,
+    # they go through the scalar engine so the norms describe the scores actually served
+    batch_lists = [answers for answers in answer_lists if len({answer.slot for answer in answers}) == len(answers)]
+    repeated_lists = [answers for answers in answer_lists if len({answer.slot for answer in answers}) != len(answers)]
+    if batch_lists:
+        scores = score_answers_batch(encode_answer_matrix(batch_lists, bank), bank)
+        subtype_blocks.append(scores.subtype_raw)
+        strength_blocks.append(scores.instinct_mean)
+    for answers in repeated_lists:
+        subtype_raw, _ = tally_endorsements(answers, bank)
+        instinct_mean, _, _ = compute_instinct_metrics(subtype_raw, bank)
+        profile_rows.append((subtype_raw, instinct_mean))
+    if profile_rows:
+        subtype_blocks.append(np.asarray([row[0] for row in profile_rows], dtype=np.int32))
+        strength_blocks.append(np.asarray([row[1] for row in profile_rows], dtype=np.float64))
+    if not subtype_blocks:
+        return np.zeros((0, bank.num_subtypes), dtype=np.int32), np.zeros((0, len(bank.instincts))), skipped
+    return np.concatenate(subtype_blocks), np.concatenate(strength_blocks), skipped
+
+
+def _is_complete(line: bytes) -> bool:
+    """Whether an unterminated last line already holds a whole JSON record."""
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+def accumulate_file(path: Path, start_offset: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    item_bank_version: Optional[str] = None) -> NormsAccumulator:
+    """Streams one JSONL file from `start_offset` into a fresh accumulator, in bounded memory."""
+    bank = get_item_bank(item_bank_version)
+    norms = NormsAccumulator(bank)
+    records = 0
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        lines: List[bytes] = []
+        offset = start_offset
+        for line in iter(f.readline, b""):
+            if not line.endswith(b"\n") and not _is_complete(line):
+                break # a line still being appended; leave it for the next refresh
+            offset += len(line)
+            if line.strip():
+                lines.append(line)
+            if len(lines) >= chunk_size:
+                subtype_raw, strengths, skipped = _scores_from_lines(lines, bank)
+                norms.add_chunk(subtype_raw, strengths, bank)
+                norms.skipped += skipped
+                records += len(lines)
+                lines = []
+        if lines:
+            subtype_raw, strengths, skipped = _scores_from_lines(lines, bank)
+            norms.add_chunk(subtype_raw, strengths, bank)
+            norms.skipped += skipped
+            records += len(lines)
+    norms.sources[str(Path(path).resolve())] = {"offset": offset, "records": records}
+    return norms
+
+
+def _accumulate_job(job: Tuple[str, int, int, str]) -> Dict:
+    path, offset, chunk_size, item_bank_version = job
+    return accumulate_file(Path(path), offset, chunk_size, item_bank_version).to_dict()
+
+
+def build_norms(
+    inputs: Iterable[Path],
+    base: Optional[NormsAccumulator] = None,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    item_bank_version: Optional[str] = None,
+) -> NormsAccumulator:
+    """Accumulates input files (in parallel when workers > 1) and merges them into `base`.
+
+    With a base, each file is only read from the offset recorded for it last time. Norms are for
+    `item_bank_version` (None: the base's version, else the current one).
+    """
+    norms = base or NormsAccumulator(get_item_bank(item_bank_version))
+    if item_bank_version is not None and item_bank_version != norms.item_bank_version:
+        raise ValueError(f"Existing norms are for item-bank version {norms.item_bank_version}, not {item_bank_version}")
+    jobs = []
+    for path in inputs:
+        key = str(Path(path).resolve())
+        offset = norms.sources.get(key, {}).get("offset", 0)
+        jobs.append((key, offset, chunk_size, norms.item_bank_version))
+    if workers > 1 and len(jobs) > 1:
+        with multiprocessing.get_context().Pool(min(workers, len(jobs))) as pool:
+            shards = [NormsAccumulator.from_dict(d) for d in pool.map(_accumulate_job, jobs)]
+    else:
+        shards = [NormsAccumulator.from_dict(_accumulate_job(job)) for job in jobs]
+    for shard in shards:
+        norms.merge(shard)
+    return norms
+
+
+def load_norms(path: Path) -> NormsAccumulator:
+    with open(path, "r", encoding="utf-8") as f:
+        return NormsAccumulator.from_dict(json.load(f))
+
+
+def write_norms(norms: NormsAccumulator, path: Path) -> None:
+    """Writes the next version of norms.json atomically (readers never see a partial file)."""
+    norms.version += 1
+    tmp_path = Path(path).with_name(Path(path).name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(norms.to_dict(), f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build population norms per subtype and instinct strength.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="accumulate JSONL submissions or profiles")
+    build.add_argument("inputs", nargs="+", type=Path)
+    build.add_argument("-o", "--output", type=Path, default=NORMS_FILE)
+    build.add_argument("--refresh", action="store_true", help="fold new lines into the existing output")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    build.add_argument("--item-bank-version", help="version the norms describe (default: the current one)")
+    merge = commands.add_parser("merge", help="combine norms shards")
+    merge.add_argument("shards", nargs="+", type=Path)
+    merge.add_argument("-o", "--output", type=Path, default=NORMS_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        base = load_norms(args.output) if args.refresh and args.output.exists() else None
+        norms = build_norms(args.inputs, base, args.workers, args.chunk_size, args.item_bank_version)
+    else:
+        shards = [load_norms(shard) for shard in args.shards]
+        norms = NormsAccumulator(get_item_bank(shards[0].item_bank_version))
+        for shard in shards:
+            norms.merge(shard)
+    write_norms(norms, args.output)
+    print(f"wrote {args.output} (version {norms.version}, {norms.count} records, {norms.skipped} skipped)")
+
+
+if __name__ == "__main__":
+    main()
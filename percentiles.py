@@ -0,0 +1,168 @@
+"""Request-time percentiles and clash detection from precomputed norms lookup tables.
+
+Raw subtype totals and instinct totals are small integers, so when a norms file loads every
+possible percentile and z-score is computed up front into dense tables; scoring a request is
+then a handful of list indexings. The active tables are swapped atomically when a new norms
+version lands on disk (checked at most every NORMS_RELOAD_INTERVAL_SECONDS, reloaded on a
+background thread), so no worker restart is needed and no request waits on a reload.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from item_bank import CompiledItemBank, UnknownItemBankVersion, item_bank_registry
+from config import ITEM_BANK_BASE_VERSION, NORMS_FILE, NORMS_MIN_COUNT, NORMS_RELOAD_INTERVAL_SECONDS, CLASH_Z_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile_rank(histogram: Dict[int, int], value: int, total: int) -> int:
+    """Mid-rank percentile: share of the population below `value` plus half of those equal to it."""
+    below = sum(count for v, count in histogram.items() if v < value)
+    equal = histogram.get(value, 0)
+    return int(round(100.0 * (below + 0.5 * equal) / total))
+
+
+class NormsTables:
+    """Dense percentile / z-score lookups for one norms version, aligned with one compiled bank."""
+
+    def __init__(self, norms: Dict, bank: CompiledItemBank):
+        self.bank = bank
+        self.version: int = int(norms.get("version", 0))
+        self.count: int = int(norms.get("count", 0))
+
+        # Highest possible raw total per subtype = number of slots that can endorse it
+        max_raw = [0] * bank.num_subtypes
+        for _, idx in {(slot, idx) for (slot, _), (idx, _) in bank.endorsement_table.items()}:
+            max_raw[idx] += 1
+
+        # subtype_z[subtype index][raw total] -> z-score against the population
+        subtype_stats = norms.get("subtypes", {})
+        self.subtype_z: List[Tuple[float, ...]] = []
+        for idx, name in enumerate(bank.subtypes):
+            stats = subtype_stats.get(name, {})
+            mean, sd = float(stats.get("mean", 0.0)), float(stats.get("sd", 0.0))
+            self.subtype_z.append(tuple(
+                (raw - mean) / sd if sd > 0 else 0.0 for raw in range(max_raw[idx] + 1)
+            ))
+
+        # instinct_percentile[instinct index][sum of its subtype totals] -> percentile (0-100)
+        strength_stats = norms.get("instinct_strengths", {})
+        self.instinct_percentile: List[Optional[Tuple[int, ...]]] = []
+        for j, name in enumerate(bank.instincts):
+            start, end = bank.instinct_subtype_slices[j]
+            histogram_by_strength = strength_stats.get(name, {}).get("histogram", {})
+            width = end - start
+            # Strengths are means rounded to 2 dp; scaling back by the subtype count recovers the exact total
+            histogram = {}
+            for strength, count in histogram_by_strength.items():
+                total = int(round(float(strength) * width))
+                histogram[total] = histogram.get(total, 0) + int(count)
+            population = sum(histogram.values())
+            if not width or not population:
+                self.instinct_percentile.append(None)
+                continue
+            max_total = sum(max_raw[start:end])
+            self.instinct_percentile.append(tuple(
+                _percentile_rank(histogram, total, population) for total in range(max_total + 1)
+            ))
+
+    def percentile(self, instinct_idx: int, subtype_raw: List[int]) -> Optional[int]:
+        table = self.instinct_percentile[instinct_idx]
+        if table is None:
+            return None
+        start, end = self.bank.instinct_subtype_slices[instinct_idx]
+        total = sum(subtype_raw[start:end])
+        return table[min(total, len(table) - 1)]
+
+    def clashes(self, subtype_raw: List[int]) -> List[str]:
+        """Instincts where two of its subtypes sit more than CLASH_Z_THRESHOLD z apart."""
+        clashes: List[str] = []
+        subtype_z = self.subtype_z
+        for instinct_name, (start, end) in zip(self.bank.instincts, self.bank.instinct_subtype_slices):
+            if end - start < 2:
+                continue
+            z_scores = [subtype_z[i][min(subtype_raw[i], len(subtype_z[i]) - 1)] for i in range(start, end)]
+            if max(z_scores) - min(z_scores) > CLASH_Z_THRESHOLD:
+                clashes.append(instinct_name)
+        return clashes
+
+
+class NormsProvider:
+    """Holds the active NormsTables and hot-swaps them when the norms file changes."""
+
+    def __init__(self, path: Path = NORMS_FILE, min_count: int = NORMS_MIN_COUNT,
+                 reload_interval: float = NORMS_RELOAD_INTERVAL_SECONDS):
+        self.path = Path(path)
+        self.min_count = min_count
+        self.reload_interval = reload_interval
+        self._tables: Optional[NormsTables] = None
+        self._file_signature: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self) -> None:
+        """Loads the norms file now (if it changed) and swaps the tables in."""
+        with self._reload_lock:
+            signature = self._signature()
+            if signature == self._file_signature:
+                return
+            tables = None
+            if signature is not None:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        norms = json.load(f)
+                    # Bound to the version the norms were built from, whichever version is current;
+                    # files from before versions were recorded describe the base version
+                    bank = item_bank_registry.get(norms.get("item_bank_version", ITEM_BANK_BASE_VERSION))
+                    if norms.get("layout", bank.version) != bank.version:
+                        raise ValueError(f"built for layout {norms['layout']}, item-bank version {bank.tag} has {bank.version}")
+                    tables = NormsTables(norms, bank)
+                except (OSError, ValueError, UnknownItemBankVersion) as e:
+                    logger.error(f"Could not load norms from {self.path}: {e}")
+                    return # keep serving the previous version
+                if tables.count < self.min_count:
+                    logger.info(f"Norms version {tables.version} has {tables.count} records (< {self.min_count}); percentiles stay off.")
+                    tables = None
+                else:
+                    logger.info(f"Loaded norms version {tables.version} ({tables.count} records).")
+            self._tables = tables # a single reference assignment, so readers see the old or the new tables
+            self._file_signature = signature
+
+    def current(self) -> Optional[NormsTables]:
+        """Active tables, or None without usable norms. Never blocks on a reload."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.reload_interval
+            if self._signature() != self._file_signature and not self._reload_lock.locked():
+                threading.Thread(target=self.reload, name="norms-reload", daemon=True).start()
+        return self._tables
+
+    def set_tables(self, tables: Optional[NormsTables]) -> None:
+        """Installs tables directly (tests, or callers that build norms in-process)."""
+        self._tables = tables
+        self._file_signature = self._signature()
+        self._next_check = time.monotonic() + self.reload_interval
+
+
+norms_provider = NormsProvider()
+norms_provider.reload() # load synchronously at startup so the first requests already have percentiles
+
+
+def current_norms(bank: CompiledItemBank) -> Optional[NormsTables]:
+    """Active norms tables if they were built for `bank`'s item-bank version and layout."""
+    tables = norms_provider.current()
+    if tables is not None and tables.bank.tag == bank.tag and tables.bank.version == bank.version:
+        return tables
+    return None
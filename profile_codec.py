@@ -0,0 +1,159 @@
+"""Compact stored form of profiles: stores keep the scores, the API profile is assembled on read.
+
+A profile from the compiled scorer carries a record (Profile._record) of what scoring decided:
+the item-bank version, the scoring time, the Driver / Creation / Growth Edge indices and the raw
+count per subtype. It is about 60 bytes, against about 1.5 KB of profile JSON:
+
+    B format | q timestamp (µs since the epoch, UTC) | b driver | b creation | b growth_edge
+    | B len(tag) | tag (UTF-8) | B count per subtype, in bank.subtypes order
+
+Profile stores keep that record instead of the JSON. On read, it is assembled against the
+version's compiled bank and the current norms, as assemble_compiled_profile does at submit time.
+Headline and signature come from the bank's Flowprint table, so each worker holds one copy of
+every string. Strengths, dominant subtypes, percentiles and clashes are recomputed from the
+counts. A corrected Flowprint_Labels.tsv, or new norms, therefore reaches every stored profile
+once the workers load it, with no rescoring. Each worker memoizes the assembled JSON per record
+in a bounded LRU. An entry is rebuilt when its bank or norms tables are replaced.
+Assembly is CPU work (and a recompile, if the version's bank was evicted), so the API
+reads profiles through the threadpool.
+
+Profiles without a record (the reference scorer, candidate rules, hand-built) are stored as JSON, as before.
+"""
+import logging
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from models import Profile
+from item_bank import CompiledItemBank, LIVE_RULES, UnknownItemBankVersion, item_bank_registry
+from percentiles import NormsTables, current_norms
+from config import PROFILE_ASSEMBLY_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+RECORD_FORMAT = 1 # first byte of a record; stored JSON always starts with "{"
+_HEADER = struct.Struct("<BqbbbB")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class ProfileRecord(NamedTuple):
+    tag: str              # item-bank version
+    timestamp: datetime   # when it was scored (the profile's timestamp)
+    driver: int           # index into bank.instincts, -1 if none
+    creation: int         # index into bank.subtypes, -1 if none
+    growth_edge: int      # index into bank.instincts, -1 if none
+    subtype_raw: List[int]
+
+
+def encode_record(subtype_raw: List[int], driver: int, creation: int, growth_edge: int,
+                  bank: CompiledItemBank, timestamp: datetime) -> Optional[bytes]:
+    """The record of a compiled score, or None when it can't be reassembled later (then the JSON is kept)."""
+    if bank.rules is not LIVE_RULES or max(driver, creation, growth_edge) > 127 or not all(0 <= n <= 255 for n in subtype_raw):
+        return None
+    tag = bank.tag.encode("utf-8")
+    micros = (timestamp - _EPOCH) // _MICROSECOND
+    return _HEADER.pack(RECORD_FORMAT, micros, driver, creation, growth_edge, len(tag)) + tag + bytes(subtype_raw)
+
+
+def is_record(stored: Union[bytes, str]) -> bool:
+    return isinstance(stored, (bytes, bytearray)) and stored[:1] == b"\x01"
+
+
+def decode_record(data: bytes) -> ProfileRecord:
+    _, micros, driver, creation, growth_edge, tag_length = _HEADER.unpack_from(data)
+    counts_at = _HEADER.size + tag_length
+    return ProfileRecord(
+        tag=bytes(data[_HEADER.size:counts_at]).decode("utf-8"),
+        timestamp=_EPOCH + micros * _MICROSECOND,
+        driver=driver,
+        creation=creation,
+        growth_edge=growth_edge,
+        subtype_raw=list(data[counts_at:]),
+    )
+
+
+def stored_form(profile: Profile) -> bytes:
+    """What a store keeps for a profile: its record if it has one, else its JSON."""
+    return profile._record or profile.model_dump_json().encode("utf-8")
+
+
+class ProfileAssembler:
+    """Turns stored forms back into profile JSON, memoizing assembled records per worker."""
+
+    def __init__(self, max_entries: int = PROFILE_ASSEMBLY_CACHE_SIZE):
+        self._max_entries = max_entries
+        # record -> (bank, norms tables, assembled JSON); entries built against replaced tables are stale
+        self._cache: "OrderedDict[bytes, Tuple[CompiledItemBank, Optional[NormsTables], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"hits": 0, "assembled": 0, "failed": 0}
+
+    @staticmethod
+    def _bank(record: ProfileRecord) -> Optional[CompiledItemBank]:
+        """The compiled bank of the record's version, if it still has the record's subtypes."""
+        try:
+            bank = item_bank_registry.get(record.tag)
+        except UnknownItemBankVersion:
+            logger.error(f"Stored profile refers to unknown item-bank version {record.tag!r}")
+            return None
+        if len(record.subtype_raw) != bank.num_subtypes:
+            logger.error(f"Stored profile has {len(record.subtype_raw)} subtype counts; item-bank version {record.tag} has {bank.num_subtypes}")
+            return None
+        return bank
+
+    @staticmethod
+    def _assemble(record: ProfileRecord, bank: CompiledItemBank, norms: Optional[NormsTables]) -> Profile:
+        """The profile a record stands for, as assemble_compiled_profile built it at submit time."""
+        # deferred: scoring_engine imports this module to encode records
+        from scoring_engine import CompiledScores, assemble_compiled_profile, compute_instinct_metrics
+        instinct_mean, instinct_range, instinct_std_dev = compute_instinct_metrics(record.subtype_raw, bank)
+        scores = CompiledScores(record.subtype_raw, instinct_mean, instinct_range, instinct_std_dev,
+                                record.driver, record.creation, record.growth_edge)
+        return assemble_compiled_profile(scores, bank, norms, record.timestamp)
+
+    def profile_json(self, stored: Union[bytes, str], memoize: bool = True) -> Optional[bytes]:
+        """Profile JSON for a stored form (None if a record can't be assembled)."""
+        if not is_record(stored):
+            return stored.encode("utf-8") if isinstance(stored, str) else bytes(stored)
+        data = bytes(stored)
+        record = decode_record(data)
+        bank = self._bank(record)
+        if bank is None:
+            with self._lock:
+                self._counters["failed"] += 1
+            return None
+        norms = current_norms(bank)
+        with self._lock:
+            entry = self._cache.get(data)
+            if entry is not None and entry[0] is bank and entry[1] is norms:
+                self._cache.move_to_end(data)
+                self._counters["hits"] += 1
+                return entry[2]
+        profile_json = self._assemble(record, bank, norms).model_dump_json().encode("utf-8")
+        with self._lock:
+            self._counters["assembled"] += 1
+            if memoize and self._max_entries > 0:
+                self._cache[data] = (bank, norms, profile_json)
+                self._cache.move_to_end(data)
+                while len(self._cache) > self._max_entries:
+                    self._cache.popitem(last=False)
+        return profile_json
+
+    def profile(self, stored: Union[bytes, str]) -> Optional[Profile]:
+        """The Profile for a stored form, carrying its record again so a re-save stays compact."""
+        profile_json = self.profile_json(stored)
+        if profile_json is None:
+            return None
+        profile = Profile.model_validate_json(profile_json)
+        if is_record(stored):
+            profile._record = bytes(stored)
+        return profile
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._cache), max_entries=self._max_entries)
+
+
+profile_assembler = ProfileAssembler()
@@ -1,11 +1,37 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Dict
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Iterable, Tuple, Any, List, Set
+import logging
+import os
+import sqlite3
+import threading
 import time
 
 from models import Profile
-from config import PROFILE_TTL_SECONDS
+from profile_codec import profile_assembler, stored_form
+from config import (
+    PROFILE_TTL_SECONDS,
+    PROFILE_CACHE_MAX_ENTRIES,
+    PROFILE_CACHE_MAX_BYTES,
+    PROFILE_CACHE_SWEEP_SECONDS,
+    PROFILE_STORE_BACKEND,
+    PROFILE_STORE_SQLITE_PATH,
+    PROFILE_EXPIRY_BATCH_SIZE,
+    PROFILE_EXPIRY_SWEEP_SECONDS,
+    PROFILE_STORE_COUNT_SECONDS,
+    PROFILE_WRITE_BEHIND,
+    PROFILE_WRITE_BEHIND_FLUSH_SECONDS,
+    PROFILE_WRITE_BEHIND_BATCH_SIZE,
+    PROFILE_WRITE_BEHIND_MAX_PENDING
+)
+
+logger = logging.getLogger(__name__)
 
 class ProfileStore(ABC):
+    # True when every worker process sees the same data (metrics then report its size once, not per worker)
+    shared_across_workers = False
+
     @abstractmethod
     def get_profile(self, user_id: str) -> Optional[Profile]:
         pass
@@ -14,28 +40,424 @@ class ProfileStore(ABC):
     def save_profile(self, user_id: str, profile: Profile) -> None:
         pass
 
+    def get_profile_json(self, user_id: str) -> Optional[bytes]:
+        """The profile exactly as serialized at save time, for serving without revalidation.
+           Stores that keep serialized profiles should override this."""
+        profile = self.get_profile(user_id)
+        return profile.model_dump_json().encode("utf-8") if profile is not None else None
+
+    def save_profiles(self, profiles: Iterable[Tuple[str, Profile]]) -> None:
+        """Saves many profiles at once. Stores with a cheaper bulk path should override this."""
+        for user_id, profile in profiles:
+            self.save_profile(user_id, profile)
+
+    def save_stored_forms(self, entries: Iterable[Tuple[str, bytes]]) -> None:
+        """Saves profiles already in their stored form (profile_codec.stored_form).
+           Stores that keep stored forms should override this to skip reassembly."""
+        profiles = [(user_id, profile_assembler.profile(data)) for user_id, data in entries]
+        self.save_profiles((user_id, profile) for user_id, profile in profiles if profile is not None)
+
+    def close(self) -> None:
+        """Stops background work; stores that buffer writes flush them here."""
+        pass
+
 class InMemoryProfileStore(ProfileStore):
-    def __init__(self):
-        self._store: Dict[str, Dict[str, any]] = {}
-        self._ttl = PROFILE_TTL_SECONDS
+    """Bounded per-process LRU cache of profiles.
+
+    Entries are kept in their stored form (profile_codec.py: a ~60-byte score record, or the JSON
+    bytes of a profile that has none), assembled into profile JSON on read, and are
+    evicted least-recently-used first once either max_entries or max_bytes is exceeded. A
+    background thread drops expired entries every sweep_interval seconds, so users who never
+    come back don't pin memory until the next read of their user_id.
+    """
+
+    # Rough per-entry bookkeeping cost (dict slot, key, tuple, bytes header) counted against max_bytes
+    _ENTRY_OVERHEAD_BYTES = 200
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_MAX_ENTRIES, max_bytes: int = PROFILE_CACHE_MAX_BYTES,
+                 sweep_interval: float = PROFILE_CACHE_SWEEP_SECONDS, ttl: int = PROFILE_TTL_SECONDS):
+        self._store: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict() # user_id -> (expiry_time, stored form)
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self._sweep_interval = sweep_interval
+        self._sweeper_pid: Optional[int] = None
+        self._stop = threading.Event()
+
+    def _entry_size(self, user_id: str, data: bytes) -> int:
+        return len(data) + len(user_id) + self._ENTRY_OVERHEAD_BYTES
+
+    def _get_entry(self, user_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._store.get(user_id)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            expiry_time, data = entry
+            if time.time() >= expiry_time:
+                self._remove(user_id)
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._store.move_to_end(user_id)
+            self._counters["hits"] += 1
+            return data
 
     def get_profile(self, user_id: str) -> Optional[Profile]:
-        entry = self._store.get(user_id)
-        if entry:
-            if time.time() < entry["expiry_time"]:
-                return Profile(**entry["profile_data"])
-            else:
-                # Entry has expired
-                del self._store[user_id]
-        return None
+        data = self._get_entry(user_id)
+        return profile_assembler.profile(data) if data is not None else None
+
+    def get_profile_json(self, user_id: str) -> Optional[bytes]:
+        data = self._get_entry(user_id)
+        return profile_assembler.profile_json(data) if data is not None else None
 
     def save_profile(self, user_id: str, profile: Profile) -> None:
+        self.save_profiles([(user_id, profile)])
+
+    def save_profiles(self, profiles: Iterable[Tuple[str, Profile]]) -> None:
+        self.save_stored_forms((user_id, stored_form(profile)) for user_id, profile in profiles)
+
+    def save_stored_forms(self, entries: Iterable[Tuple[str, bytes]]) -> None:
+        self._ensure_sweeper()
+        entries = list(entries)
         expiry_time = time.time() + self._ttl
-        self._store[user_id] = {
-            "profile_data": profile.model_dump(), # Store as dict for Pydantic re-creation
-            "expiry_time": expiry_time
-        }
+        with self._lock:
+            for user_id, data in entries:
+                if user_id in self._store:
+                    self._remove(user_id)
+                self._store[user_id] = (expiry_time, data)
+                self._bytes += self._entry_size(user_id, data)
+            self._evict()
+
+    def _remove(self, user_id: str) -> None:
+        _, data = self._store.pop(user_id)
+        self._bytes -= self._entry_size(user_id, data)
+
+    def _evict(self) -> None:
+        while self._store and (len(self._store) > self._max_entries or self._bytes > self._max_bytes):
+            user_id, (_, data) = self._store.popitem(last=False)
+            self._bytes -= self._entry_size(user_id, data)
+            self._counters["evictions"] += 1
+
+    def sweep_expired(self) -> int:
+        """Drops every expired entry; returns how many were removed."""
+        now = time.time()
+        with self._lock:
+            expired = [user_id for user_id, (expiry_time, _) in self._store.items() if expiry_time <= now]
+            for user_id in expired:
+                self._remove(user_id)
+            self._counters["expirations"] += len(expired)
+        return len(expired)
+
+    def _ensure_sweeper(self) -> None:
+        # Started lazily (and restarted after a fork) because threads don't survive gunicorn's preload fork
+        if self._sweep_interval <= 0 or self._sweeper_pid == os.getpid():
+            return
+        self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_loop, name="profile-cache-sweep", daemon=True).start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self._sweep_interval):
+            self.sweep_expired()
+
+    def close(self) -> None:
+        """Stops the background sweep."""
+        self._stop.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._store), bytes=self._bytes)
+
+class SQLiteProfileStore(ProfileStore):
+    """Profiles in a WAL-mode SQLite file, shared by every worker process on the host.
+
+    WAL lets readers run alongside a writer across processes; writers queue on busy_timeout.
+    Each process/thread gets its own connection (sqlite3 connections must not cross a fork or,
+    by default, threads), and the fixed SQL strings below hit sqlite3's prepared statement cache.
+    Expired rows are invisible to reads and are deleted in bounded batches, at most every
+    sweep_interval seconds, by whichever worker writes next. The stored_form column holds each
+    profile's stored form (profile_codec.py): a score record, or JSON for profiles without one.
+    """
+
+    shared_across_workers = True
+
+    _GET_SQL = "SELECT stored_form FROM profiles WHERE user_id = ? AND expires_at > ?"
+    _SAVE_SQL = "INSERT OR REPLACE INTO profiles (user_id, stored_form, expires_at, saved_at) VALUES (?, ?, ?, ?)"
+    _CHANGED_SQL = (
+        "SELECT user_id, saved_at, stored_form FROM profiles "
+        "WHERE (saved_at, user_id) > (?, ?) AND saved_at <= ? ORDER BY saved_at, user_id LIMIT ?"
+    )
+    _SWEEP_SQL = (
+        "DELETE FROM profiles WHERE rowid IN "
+        "(SELECT rowid FROM profiles WHERE expires_at <= ? LIMIT ?)"
+    )
+
+    def __init__(self, path: Path = PROFILE_STORE_SQLITE_PATH, ttl: int = PROFILE_TTL_SECONDS,
+                 expiry_batch_size: int = PROFILE_EXPIRY_BATCH_SIZE,
+                 sweep_interval: float = PROFILE_EXPIRY_SWEEP_SECONDS,
+                 count_interval: float = PROFILE_STORE_COUNT_SECONDS):
+        self._path = str(path)
+        self._ttl = ttl
+        self._expiry_batch_size = expiry_batch_size
+        self._sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._count_interval = count_interval
+        self._counted: Optional[Tuple[float, int]] = None # (monotonic time, live rows) from the last count
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "user_id TEXT PRIMARY KEY, stored_form BLOB NOT NULL, expires_at REAL NOT NULL, saved_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS profiles_expires_at ON profiles (expires_at)")
+            if not self._is_current(self._columns(conn)):
+                # Workers started without --preload all get here at once: migrate under the write lock
+                # and re-check, so only the first one alters the table
+                conn.execute("BEGIN IMMEDIATE")
+                columns = self._columns(conn)
+                if "saved_at" not in columns:
+                    # Stores created before saved_at existed: their rows were saved one TTL before they expire
+                    conn.execute("ALTER TABLE profiles ADD COLUMN saved_at REAL")
+                    conn.execute("UPDATE profiles SET saved_at = expires_at - ?", (ttl,))
+                if "stored_form" not in columns:
+                    # Stores from before stored forms named the column profile_json (declared TEXT; it holds
+                    # the BLOB records as they are)
+                    conn.execute("ALTER TABLE profiles RENAME COLUMN profile_json TO stored_form")
+                conn.commit()
+            conn.execute("CREATE INDEX IF NOT EXISTS profiles_saved_at ON profiles (saved_at, user_id)")
+
+    @staticmethod
+    def _columns(conn: sqlite3.Connection) -> Set[str]:
+        return {row[1] for row in conn.execute("PRAGMA table_info(profiles)")}
+
+    @staticmethod
+    def _is_current(columns: Set[str]) -> bool:
+        return {"saved_at", "stored_form"} <= columns
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=30, cached_statements=32)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL") # durable across process crashes; WAL fsyncs at checkpoints
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_profile(self, user_id: str) -> Optional[Profile]:
+        row = self._connection().execute(self._GET_SQL, (user_id, time.time())).fetchone()
+        if row is None:
+            return None
+        return profile_assembler.profile(row[0])
+
+    def get_profile_json(self, user_id: str) -> Optional[bytes]:
+        row = self._connection().execute(self._GET_SQL, (user_id, time.time())).fetchone()
+        return profile_assembler.profile_json(row[0]) if row is not None else None
+
+    def save_profile(self, user_id: str, profile: Profile) -> None:
+        self.save_profiles([(user_id, profile)])
+
+    def save_profiles(self, profiles: Iterable[Tuple[str, Profile]]) -> None:
+        self.save_stored_forms((user_id, stored_form(profile)) for user_id, profile in profiles)
+
+    def save_stored_forms(self, entries: Iterable[Tuple[str, bytes]]) -> None:
+        saved_at = time.time()
+        expires_at = saved_at + self._ttl
+        rows = [(user_id, data, expires_at, saved_at) for user_id, data in entries]
+        conn = self._connection()
+        with conn: # one transaction for the whole batch
+            conn.executemany(self._SAVE_SQL, rows)
+        self._maybe_sweep(conn)
+
+    def _maybe_sweep(self, conn: sqlite3.Connection) -> None:
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self._sweep_interval
+        self.delete_expired(conn)
+
+    def changed_since(self, after: Tuple[float, str], until: float, limit: int) -> List[Tuple[str, float, Any]]:
+        """Up to `limit` (user_id, saved_at, stored form) rows saved after the (saved_at, user_id)
+        position `after` and no later than `until`, in that order; expired rows not yet swept included.
+        Pass the last row's (saved_at, user_id) as the next `after` to page through every change."""
+        return self._connection().execute(self._CHANGED_SQL, (after[0], after[1], until, limit)).fetchall()
+
+    def stats(self) -> Dict[str, int]:
+        """Live row count, recounted at most every count_interval seconds: counting is a scan over
+           every live profile, and the metrics snapshot asks in every worker every few seconds."""
+        now = time.monotonic()
+        counted = self._counted
+        if counted is None or now - counted[0] >= self._count_interval:
+            row = self._connection().execute("SELECT COUNT(*) FROM profiles WHERE expires_at > ?", (time.time(),)).fetchone()
+            counted = self._counted = (now, row[0])
+        return {"entries": counted[1]}
+
+    def delete_expired(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Deletes expired rows in batches (short write transactions) and returns how many went."""
+        conn = conn or self._connection()
+        deleted = 0
+        while True:
+            with conn:
+                cursor = conn.execute(self._SWEEP_SQL, (time.time(), self._expiry_batch_size))
+            deleted += cursor.rowcount
+            if cursor.rowcount < self._expiry_batch_size:
+                return deleted
+
+
+class WriteBehindProfileStore(ProfileStore):
+    """Buffers saves in memory and writes them to a backing store in batches, off the request path.
+
+    save_profile returns once the profile's stored form (profile_codec.py) is in the local buffer;
+    a background thread flushes the buffer every flush_interval seconds in batches of up to
+    batch_size through the backing store's save_stored_forms. Repeat saves for a user_id that is still buffered are coalesced into
+    one write. Reads check the buffer first, so a worker always sees its own pending writes
+    (other workers see them after the next flush), assembled as the backing stores do.
+
+    Entries leave the buffer only after the backing write succeeds; a failed flush is retried
+    on the next cycle. If the buffer reaches max_pending, the saving thread flushes inline; if
+    the backing store is failing and that doesn't free space, the oldest pending write is
+    dropped and counted. close() flushes everything that is left.
+    """
+
+    def __init__(self, backing: ProfileStore, flush_interval: float = PROFILE_WRITE_BEHIND_FLUSH_SECONDS,
+                 batch_size: int = PROFILE_WRITE_BEHIND_BATCH_SIZE, max_pending: int = PROFILE_WRITE_BEHIND_MAX_PENDING):
+        self.backing = backing
+        self.shared_across_workers = backing.shared_across_workers
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._max_pending = max_pending
+        # user_id -> (stored form, enqueue time), oldest first
+        self._pending: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() # one flush at a time, so batches reach the backing store in order
+        self._counters: Dict[str, int] = {"buffered": 0, "coalesced": 0, "flushed": 0, "flush_batches": 0,
+                                          "flush_errors": 0, "dropped": 0}
+        self._last_flush_lag = 0.0
+        self._max_flush_lag = 0.0
+        self._flusher_pid: Optional[int] = None
+        self._stop = threading.Event()
+
+    def get_profile(self, user_id: str) -> Optional[Profile]:
+        with self._lock:
+            entry = self._pending.get(user_id)
+        return profile_assembler.profile(entry[0]) if entry is not None else self.backing.get_profile(user_id)
+
+    def get_profile_json(self, user_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._pending.get(user_id)
+        return profile_assembler.profile_json(entry[0]) if entry is not None else self.backing.get_profile_json(user_id)
+
+    def save_profile(self, user_id: str, profile: Profile) -> None:
+        self.save_profiles([(user_id, profile)])
+
+    def save_profiles(self, profiles: Iterable[Tuple[str, Profile]]) -> None:
+        self._ensure_flusher()
+        now = time.monotonic()
+        entries = [(user_id, (stored_form(profile), now)) for user_id, profile in profiles]
+        with self._lock:
+            for user_id, entry in entries:
+                if self._pending.pop(user_id, None) is not None:
+                    self._counters["coalesced"] += 1
+                self._pending[user_id] = entry
+            self._counters["buffered"] += len(entries)
+            overfull = len(self._pending) > self._max_pending
+        if overfull:
+            self.flush()
+            self._drop_overflow()
+
+    def _drop_overflow(self) -> None:
+        with self._lock:
+            dropped = 0
+            while len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+                dropped += 1
+            self._counters["dropped"] += dropped
+        if dropped:
+            logger.error(f"Write-behind buffer full and the backing store is failing; dropped {dropped} profile write(s).")
+
+    def flush(self) -> int:
+        """Writes everything currently buffered to the backing store; returns how many were written.
+           Stops at the first failed batch (those entries stay buffered for the next attempt)."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = []
+                    for user_id, entry in self._pending.items():
+                        batch.append((user_id, entry))
+                        if len(batch) >= self._batch_size:
+                            break
+                if not batch:
+                    return written
+                try:
+                    self.backing.save_stored_forms((user_id, entry[0]) for user_id, entry in batch)
+                except Exception as e:
+                    with self._lock:
+                        self._counters["flush_errors"] += 1
+                    logger.error(f"Write-behind flush of {len(batch)} profile(s) failed: {str(e)}", exc_info=True)
+                    return written
+                now = time.monotonic()
+                with self._lock:
+                    for user_id, entry in batch:
+                        # A newer save for the same user arrived mid-flush: it stays buffered
+                        if self._pending.get(user_id) is entry:
+                            del self._pending[user_id]
+                    self._counters["flushed"] += len(batch)
+                    self._counters["flush_batches"] += 1
+                    self._last_flush_lag = now - batch[0][1][1]
+                    self._max_flush_lag = max(self._max_flush_lag, self._last_flush_lag)
+                written += len(batch)
+
+    def _ensure_flusher(self) -> None:
+        # Started lazily (and restarted after a fork), like InMemoryProfileStore's sweeper
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="profile-write-behind", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self._flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Stops the flusher, writes out every buffered profile and closes the backing store."""
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            lost = len(self._pending)
+            self._pending.clear()
+            self._counters["dropped"] += lost
+        if lost:
+            logger.error(f"Write-behind shutdown flush failed; {lost} profile write(s) were not persisted.")
+        self.backing.close()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            oldest = next(iter(self._pending.values()), None)
+            return dict(
+                self._counters,
+                pending=len(self._pending),
+                oldest_pending_ms=round((now - oldest[1]) * 1000, 3) if oldest else 0.0,
+                last_flush_lag_ms=round(self._last_flush_lag * 1000, 3),
+                max_flush_lag_ms=round(self._max_flush_lag * 1000, 3),
+                backing=self.backing.stats() if hasattr(self.backing, "stats") else {},
+            )
+
+
+def create_profile_store(backend: str = PROFILE_STORE_BACKEND, write_behind: bool = PROFILE_WRITE_BEHIND) -> ProfileStore:
+    """Builds the configured profile store (NUMI_PROFILE_STORE), optionally behind a write-behind buffer."""
+    if backend == "memory":
+        store: ProfileStore = InMemoryProfileStore()
+    elif backend == "sqlite":
+        store = SQLiteProfileStore()
+    else:
+        raise ValueError(f"Unknown profile store backend: {backend!r} (expected 'memory' or 'sqlite')")
+    return WriteBehindProfileStore(store) if write_behind else store
 
 # Singleton instance for the application to use
 # This can be replaced with a more sophisticated dependency injection system later if needed.
-profile_store_instance: ProfileStore = InMemoryProfileStore() 
\ No newline at end of file
+profile_store_instance: ProfileStore = create_profile_store() 
\ No newline at end of file
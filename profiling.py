@@ -0,0 +1,145 @@
+"""On-demand profiling of individual /submit requests.
+
+A submit is profiled when it carries `X-Profile-Request: <NUMI_PROFILING_TOKEN>`, or at random
+with probability NUMI_PROFILING_SAMPLE_RATE. Its CPU work (scoring plus response
+serialization) then runs under cProfile on the scoring executor, and the call graph is kept in
+a bounded per-worker ring buffer; the response carries `X-Profile-Id` to fetch it from
+GET /v1/ops/profiles/{id} (JSON, or `?format=pstats` for snakeviz / `python -m pstats`).
+
+Unprofiled requests pay one random() call. Only one request per process is profiled at a
+time (cProfile hooks are per-thread before Python 3.12 and process-wide from 3.12), so a
+sampled request that finds the profiler busy simply runs unprofiled.
+"""
+import cProfile
+import hmac
+import itertools
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from config import PROFILING_TOKEN, PROFILING_SAMPLE_RATE, PROFILING_BUFFER_SIZE, PROFILING_MAX_FUNCTIONS
+
+# pstats function key: (filename, line number, function name)
+FunctionKey = Tuple[str, int, str]
+
+
+def profile_call(fn: Callable, *args: Any) -> Tuple[Any, Dict[FunctionKey, tuple]]:
+    """Runs fn(*args) under cProfile; returns (result, raw pstats data). Picklable, for process pools."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = fn(*args)
+    finally:
+        profiler.disable()
+    return result, pstats.Stats(profiler).stats
+
+
+def score_and_serialize(fn: Callable, *args: Any) -> Tuple[Any, bytes]:
+    """fn(*args) plus the JSON serialization the handler would do, so both land in one profile."""
+    profile = fn(*args)
+    return profile, profile.model_dump_json().encode("utf-8")
+
+
+def _function_name(key: FunctionKey) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name # built-ins, e.g. "<method 'get' of 'dict' objects>"
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _trim(stats: Dict[FunctionKey, tuple], max_functions: int) -> Dict[FunctionKey, tuple]:
+    """Keeps the max_functions entries with the highest cumulative time, and only edges among them."""
+    kept = dict(sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:max_functions])
+    return {
+        key: (cc, nc, tt, ct, {caller: timing for caller, timing in callers.items() if caller in kept})
+        for key, (cc, nc, tt, ct, callers) in kept.items()
+    }
+
+
+class RequestProfiler:
+    """Decides which requests to profile and keeps their results in a ring buffer."""
+
+    def __init__(self, token: Optional[str] = PROFILING_TOKEN, sample_rate: float = PROFILING_SAMPLE_RATE,
+                 capacity: int = PROFILING_BUFFER_SIZE, max_functions: int = PROFILING_MAX_FUNCTIONS):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.max_functions = max_functions
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._records_lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._ids = itertools.count(1)
+        self.skipped_busy = 0
+
+    def wanted(self, request_token: Optional[str]) -> bool:
+        """True for a request carrying the privileged token, or one picked by random sampling."""
+        if request_token and self.token and hmac.compare_digest(request_token, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self) -> bool:
+        """Claims the profiler for one request; False (and counted) if another request holds it."""
+        if self._busy.acquire(blocking=False):
+            return True
+        self.skipped_busy += 1
+        return False
+
+    def end(self) -> None:
+        self._busy.release()
+
+    def record(self, route: str, user_id: str, duration: float, stats: Dict[FunctionKey, tuple]) -> str:
+        """Stores a finished profile and returns its id (worker pid + sequence number)."""
+        profile_id = f"{os.getpid()}-{next(self._ids)}"
+        trimmed = _trim(stats, self.max_functions)
+        with self._records_lock:
+            self._records.append({
+                "id": profile_id,
+                "created": time.time(),
+                "route": route,
+                "user_id": user_id,
+                "duration_ms": round(duration * 1000, 3),
+                "profiled_ms": round(max((entry[3] for entry in trimmed.values()), default=0.0) * 1000, 3),
+                "stats": trimmed,
+            })
+        return profile_id
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Newest first, without the call graphs."""
+        with self._records_lock:
+            records = list(self._records)
+        return [{k: v for k, v in record.items() if k != "stats"} for record in reversed(records)]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._records_lock:
+            return next((record for record in self._records if record["id"] == profile_id), None)
+
+    @staticmethod
+    def call_graph(record: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON view: functions by cumulative time, and caller -> callee edges (the call tree)."""
+        stats = record["stats"]
+        functions = [
+            {"function": _function_name(key), "primitive_calls": cc, "calls": nc,
+             "own_ms": round(tt * 1000, 4), "cumulative_ms": round(ct * 1000, 4)}
+            for key, (cc, nc, tt, ct, _) in stats.items()
+        ]
+        edges = [
+            {"caller": _function_name(caller), "callee": _function_name(key), "calls": timing[0],
+             "cumulative_ms": round(timing[3] * 1000, 4)}
+            for key, (_, _, _, _, callers) in stats.items()
+            for caller, timing in callers.items()
+        ]
+        edges.sort(key=lambda edge: edge["cumulative_ms"], reverse=True)
+        summary = {k: v for k, v in record.items() if k != "stats"}
+        return dict(summary, functions=functions, edges=edges)
+
+    @staticmethod
+    def pstats_bytes(record: Dict[str, Any]) -> bytes:
+        """The profile in pstats' on-disk format (what Stats.dump_stats writes)."""
+        return marshal.dumps(record["stats"])
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,397 @@
+"""Reliability & QA batch job (instinct_map_scoring.md §8).
+
+Reads item-level responses for one item-bank version in chunks, from the response archive
+(response_archive.py segments) and/or JSONL submissions shaped like the /submit body, and reports
+per instinct:
+
+- Cronbach's alpha over the instinct's Likert items, keyed 1-5 (reverse items flipped), flagged
+  below RELIABILITY_ALPHA_THRESHOLD; respondents who skipped one of the items are left out of that
+  instinct's alpha (listwise);
+- per item: mean, SD, corrected item-total correlation and alpha if the item were deleted;
+- per Scenario item, Scenario-vs-Likert agreement: how often the chosen subtype is the one the
+  respondent's Likert answers endorse most in that instinct (`agreement`, ties count as agreeing,
+  among respondents with any Likert endorsement there) and how often it got any Likert
+  endorsement at all (`endorsed`).
+
+Everything reported derives from per-instinct count / mean vector / co-moment matrix accumulators
+that merge exactly (Chan et al.), so each source is read in bounded memory by its own worker
+process and the shards are combined afterwards; the report keeps the accumulators, so reports of
+disjoint sources merge too.
+
+    python reliability.py build --archive /var/numi/archive -o reliability.json --workers 8
+    python reliability.py build submissions.jsonl --item-bank-version v1 -o reliability.json
+    python reliability.py merge a.json b.json -o reliability.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pydantic import ValidationError
+
+from models import SubmissionRecord
+from item_bank import CompiledItemBank, get_item_bank, item_bank_registry, UnknownItemBankVersion
+from response_archive import Segment, iter_segments
+from config import RELIABILITY_ALPHA_THRESHOLD, RESPONSE_ARCHIVE_DIR, LIKERT_SCORE_MAP
+
+REPORT_FORMAT = 1
+DEFAULT_CHUNK_SIZE = 20000
+
+
+class CovarianceAccumulator:
+    """Count, mean vector and co-moment matrix of k variables; chunks and shards merge exactly."""
+
+    def __init__(self, k: int):
+        self.count: int = 0
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    def add_rows(self, rows: np.ndarray) -> None:
+        """Folds in an n x k block of observations (block statistics, then the pairwise merge)."""
+        if rows.shape[0] == 0:
+            return
+        chunk = CovarianceAccumulator(rows.shape[1])
+        chunk.count = rows.shape[0]
+        chunk.mean = rows.mean(axis=0)
+        centered = rows - chunk.mean
+        chunk.comoment = centered.T @ centered
+        self.merge(chunk)
+
+    def merge(self, other: "CovarianceAccumulator") -> None:
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.comoment = other.count, other.mean.copy(), other.comoment.copy()
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.count * other.count / total)
+        self.mean = self.mean + delta * (other.count / total)
+        self.count = total
+
+    @property
+    def covariance(self) -> np.ndarray:
+        """Sample covariance matrix (zeros below two observations)."""
+        return self.comoment / (self.count - 1) if self.count > 1 else np.zeros_like(self.comoment)
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "mean": self.mean.tolist(), "comoment": self.comoment.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CovarianceAccumulator":
+        acc = cls(len(data["mean"]))
+        acc.count = int(data["count"])
+        acc.mean = np.asarray(data["mean"], dtype=np.float64)
+        acc.comoment = np.asarray(data["comoment"], dtype=np.float64).reshape(len(acc.mean), len(acc.mean))
+        return acc
+
+
+def cronbach_alpha(covariance: np.ndarray) -> Optional[float]:
+    """k/(k-1) * (1 - sum of item variances / variance of the total); None when undefined."""
+    k = covariance.shape[0]
+    total_variance = covariance.sum()
+    if k < 2 or total_variance <= 0:
+        return None
+    return float(k / (k - 1) * (1 - np.trace(covariance) / total_variance))
+
+
+class _ItemTables:
+    """Code lookups for one compiled item bank: keyed Likert scores and Likert / Scenario endorsements."""
+
+    def __init__(self, bank: CompiledItemBank):
+        width = bank.max_code + 1
+        num_slots = len(bank.slots)
+        none = bank.num_subtypes
+        # keyed[slot, code]: 1-5 Likert score, reversed for reverse items; NaN when unanswered or not Likert
+        self.keyed = np.full((num_slots, width), np.nan)
+        # likert_subtype / scenario_subtype[slot, code]: endorsed subtype, or `none`
+        self.likert_subtype = np.full((num_slots, width), none, dtype=np.int32)
+        self.scenario_subtype = np.full((num_slots, width), none, dtype=np.int32)
+        self.likert_slots: Dict[int, List[int]] = {} # instinct index -> Likert slot indices
+        self.scenario_slots: List[int] = []
+        for slot_idx, (endorsements, instinct) in enumerate(zip(bank.code_endorsements, bank.slot_instincts)):
+            is_likert = bool(bank.slot_options[slot_idx]) and bank.slot_options[slot_idx][0] in LIKERT_SCORE_MAP
+            for code, endorsement in enumerate(endorsements):
+                if code and endorsement is not None:
+                    (self.likert_subtype if is_likert else self.scenario_subtype)[slot_idx, code] = endorsement[0]
+            if is_likert:
+                for code in range(1, len(bank.slot_options[slot_idx]) + 1):
+                    self.keyed[slot_idx, code] = 6 - code if bank.slot_reversed[slot_idx] else code
+                if instinct >= 0:
+                    self.likert_slots.setdefault(instinct, []).append(slot_idx)
+            elif bank.slot_options[slot_idx] and instinct >= 0:
+                self.scenario_slots.append(slot_idx)
+
+
+class ReliabilityAccumulator:
+    """Per-instinct item covariances and per-Scenario-item agreement counts for one item-bank version."""
+
+    def __init__(self, bank: CompiledItemBank):
+        self.bank = bank
+        self.tables = _ItemTables(bank)
+        self.items: Dict[int, CovarianceAccumulator] = {
+            instinct: CovarianceAccumulator(len(slots)) for instinct, slots in self.tables.likert_slots.items()
+        }
+        # Scenario slot index -> [answered, compared (chosen subtype vs. any Likert endorsement), agreeing, endorsed]
+        self.scenario: Dict[int, List[int]] = {slot_idx: [0, 0, 0, 0] for slot_idx in self.tables.scenario_slots}
+        self.respondents: int = 0
+        self.skipped: int = 0
+        self.sources: Dict[str, int] = {}
+
+    def add_codes(self, codes: np.ndarray) -> None:
+        """Folds in an N x slots uint8 code matrix."""
+        n = codes.shape[0]
+        if n == 0:
+            return
+        tables = self.tables
+        slot_positions = np.arange(codes.shape[1])
+        self.respondents += n
+
+        # 1. Alpha: keyed Likert scores, complete cases per instinct
+        keyed = tables.keyed[slot_positions, codes]
+        for instinct, slots in tables.likert_slots.items():
+            block = keyed[:, slots]
+            self.items[instinct].add_rows(block[~np.isnan(block).any(axis=1)])
+
+        # 2. Likert endorsements per subtype (one bincount over the chunk, like batch scoring)
+        num_columns = self.bank.num_subtypes + 1
+        likert = tables.likert_subtype[slot_positions, codes]
+        cells = (likert + (np.arange(n, dtype=np.int64) * num_columns)[:, np.newaxis]).ravel()
+        endorsements = np.bincount(cells, minlength=n * num_columns).reshape(n, num_columns)
+
+        # 3. Scenario choice vs. the Likert endorsements in the same instinct
+        rows = np.arange(n)
+        for slot_idx in tables.scenario_slots:
+            chosen = tables.scenario_subtype[slot_idx, codes[:, slot_idx]]
+            answered = chosen < self.bank.num_subtypes
+            if not answered.any():
+                continue
+            start, end = self.bank.instinct_subtype_slices[self.bank.slot_instincts[slot_idx]]
+            top = endorsements[:, start:end].max(axis=1)
+            chosen_count = endorsements[rows, chosen] # the last column counts nothing
+            compared = answered & (top > 0)
+            stats = self.scenario[slot_idx]
+            stats[0] += int(answered.sum())
+            stats[1] += int(compared.sum())
+            stats[2] += int((compared & (chosen_count == top)).sum())
+            stats[3] += int((answered & (chosen_count > 0)).sum())
+
+    def merge(self, other: "ReliabilityAccumulator") -> None:
+        for instinct, acc in other.items.items():
+            self.items[instinct].merge(acc)
+        for slot_idx, stats in other.scenario.items():
+            self.scenario[slot_idx] = [a + b for a, b in zip(self.scenario[slot_idx], stats)]
+        self.respondents += other.respondents
+        self.skipped += other.skipped
+        for source, records in other.sources.items():
+            self.sources[source] = self.sources.get(source, 0) + records
+
+    def to_dict(self) -> Dict:
+        bank = self.bank
+        return {
+            "item_bank_version": bank.tag,
+            "layout": bank.version,
+            "respondents": self.respondents,
+            "skipped": self.skipped,
+            "items": {bank.instincts[i]: acc.to_dict() for i, acc in self.items.items()},
+            "scenario": {bank.slots[s]: stats for s, stats in self.scenario.items()},
+            "sources": self.sources,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, bank: Optional[CompiledItemBank] = None) -> "ReliabilityAccumulator":
+        bank = bank or get_item_bank(data["item_bank_version"])
+        if data.get("layout", bank.version) != bank.version:
+            raise ValueError(f"Accumulators of layout {data['layout']} don't match item bank {bank.tag} ({bank.version})")
+        acc = cls(bank)
+        instinct_pos = {name: i for i, name in enumerate(bank.instincts)}
+        for name, items in data.get("items", {}).items():
+            acc.items[instinct_pos[name]] = CovarianceAccumulator.from_dict(items)
+        for slot, stats in data.get("scenario", {}).items():
+            acc.scenario[bank.slot_index[slot]] = [int(x) for x in stats]
+        acc.respondents = int(data.get("respondents", 0))
+        acc.skipped = int(data.get("skipped", 0))
+        acc.sources = {source: int(records) for source, records in data.get("sources", {}).items()}
+        return acc
+
+    def report(self, alpha_threshold: float = RELIABILITY_ALPHA_THRESHOLD) -> Dict[str, Any]:
+        """The machine-readable QA report, with the accumulators it was computed from."""
+        bank = self.bank
+        instincts: Dict[str, Any] = {}
+        for instinct, acc in self.items.items():
+            slots = self.tables.likert_slots[instinct]
+            covariance = acc.covariance
+            alpha = cronbach_alpha(covariance)
+            variances = np.diag(covariance)
+            total_variance = covariance.sum()
+            items: Dict[str, Any] = {}
+            for i, slot_idx in enumerate(slots):
+                # Corrected item-total: the item against the total of the other items
+                with_rest = covariance[i].sum() - variances[i]
+                rest_variance = total_variance - 2 * covariance[i].sum() + variances[i]
+                denominator = np.sqrt(variances[i] * rest_variance)
+                keep = [j for j in range(len(slots)) if j != i]
+                items[bank.slots[slot_idx]] = {
+                    "mean": round(float(acc.mean[i]), 4),
+                    "sd": round(float(np.sqrt(variances[i])), 4),
+                    "item_total_r": round(float(with_rest / denominator), 4) if denominator > 0 else None,
+                    "alpha_if_deleted": _rounded(cronbach_alpha(covariance[np.ix_(keep, keep)])),
+                }
+            instincts[bank.instincts[instinct]] = {
+                "n": acc.count,
+                "alpha": _rounded(alpha),
+                "flagged": alpha is not None and alpha < alpha_threshold,
+                "items": items,
+                "scenario": {},
+            }
+        for slot_idx, (answered, compared, agreeing, endorsed) in self.scenario.items():
+            name = bank.instincts[bank.slot_instincts[slot_idx]]
+            instincts.setdefault(name, {"n": 0, "alpha": None, "flagged": False, "items": {}, "scenario": {}})
+            instincts[name]["scenario"][bank.slots[slot_idx]] = {
+                "n": answered,
+                "agreement": round(agreeing / compared, 4) if compared else None,
+                "endorsed": round(endorsed / answered, 4) if answered else None,
+            }
+        return {
+            "format": REPORT_FORMAT,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "item_bank_version": bank.tag,
+            "respondents": self.respondents,
+            "skipped": self.skipped,
+            "alpha_threshold": alpha_threshold,
+            "flagged": [name for name, summary in instincts.items() if summary["flagged"]],
+            "instincts": instincts,
+            "accumulators": self.to_dict(),
+        }
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def accumulate_segment(path: Path, bank: CompiledItemBank, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ReliabilityAccumulator:
+    """One archive segment, read zero-copy chunk by chunk."""
+    acc = ReliabilityAccumulator(bank)
+    segment = Segment(path)
+    if segment.layout != bank.version:
+        raise ValueError(f"{path} holds layout {segment.layout}, not {bank.tag} ({bank.version})")
+    codes = segment.records["codes"]
+    for start in range(0, len(codes), chunk_size):
+        acc.add_codes(np.asarray(codes[start:start + chunk_size]))
+    acc.sources[str(Path(path).resolve())] = len(codes)
+    return acc
+
+
+def accumulate_jsonl(path: Path, bank: CompiledItemBank, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ReliabilityAccumulator:
+    """JSONL submissions; records naming another item-bank version, or invalid ones, are skipped."""
+    acc = ReliabilityAccumulator(bank)
+    rows: List[bytes] = []
+    records = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            records += 1
+            try:
+                record = SubmissionRecord.model_validate_json(line)
+            except ValidationError:
+                acc.skipped += 1
+                continue
+            if not record.answers or not _scored_with(record, bank):
+                acc.skipped += 1
+                continue
+            rows.append(bytes(bank.encode_answers(record.answers)))
+            if len(rows) >= chunk_size:
+                acc.add_codes(np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), -1))
+                rows = []
+    if rows:
+        acc.add_codes(np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), -1))
+    acc.sources[str(Path(path).resolve())] = records
+    return acc
+
+
+def _scored_with(record: SubmissionRecord, bank: CompiledItemBank) -> bool:
+    if not record.item_bank_version:
+        return item_bank_registry.current() is bank
+    try:
+        return item_bank_registry.resolve(record.item_bank_version) is bank
+    except UnknownItemBankVersion:
+        return False
+
+
+def _accumulate_job(job: Tuple[str, str, str, int]) -> Dict:
+    kind, path, version, chunk_size = job
+    accumulate = accumulate_segment if kind == "segment" else accumulate_jsonl
+    return accumulate(Path(path), get_item_bank(version), chunk_size).to_dict()
+
+
+def build_report_accumulator(
+    item_bank_version: str,
+    archive: Optional[Path] = None,
+    inputs: Iterable[Path] = (),
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> ReliabilityAccumulator:
+    """Accumulates every archive segment of the version and every JSONL input, one process per source."""
+    bank = get_item_bank(item_bank_version)
+    jobs = [("segment", str(segment.path), bank.tag, chunk_size) for segment in iter_segments(archive, bank.tag)] if archive else []
+    jobs += [("jsonl", str(path), bank.tag, chunk_size) for path in inputs]
+    if workers > 1 and len(jobs) > 1:
+        with multiprocessing.get_context().Pool(min(workers, len(jobs))) as pool:
+            shards = pool.map(_accumulate_job, jobs)
+    else:
+        shards = [_accumulate_job(job) for job in jobs]
+    total = ReliabilityAccumulator(bank)
+    for shard in shards:
+        total.merge(ReliabilityAccumulator.from_dict(shard, bank))
+    return total
+
+
+def write_report(report: Dict[str, Any], path: Path) -> None:
+    tmp_path = Path(path).with_name(Path(path).name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cronbach's alpha, item-total correlations and Scenario/Likert agreement per instinct.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="accumulate archive segments and/or JSONL submissions")
+    build.add_argument("inputs", nargs="*", type=Path, help="JSONL files of {user_id, answers} submissions")
+    build.add_argument("--archive", type=Path, default=RESPONSE_ARCHIVE_DIR, help="response archive directory (default: NUMI_RESPONSE_ARCHIVE_DIR)")
+    build.add_argument("--item-bank-version", default=None, help="version to analyse (default: current)")
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    build.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    build.add_argument("-o", "--output", type=Path, default=Path("reliability.json"))
+    merge = commands.add_parser("merge", help="combine reports of disjoint sources")
+    merge.add_argument("reports", nargs="+", type=Path)
+    merge.add_argument("-o", "--output", type=Path, default=Path("reliability.json"))
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if not args.inputs and args.archive is None:
+            parser.error("nothing to read: pass JSONL files or --archive (or set NUMI_RESPONSE_ARCHIVE_DIR)")
+        version = args.item_bank_version or item_bank_registry.current().tag
+        acc = build_report_accumulator(version, args.archive, args.inputs, args.workers, args.chunk_size)
+    else:
+        acc = None
+        for path in args.reports:
+            with open(path, "r", encoding="utf-8") as f:
+                shard = ReliabilityAccumulator.from_dict(json.load(f)["accumulators"])
+            if acc is None:
+                acc = shard
+            else:
+                acc.merge(shard)
+    report = acc.report()
+    write_report(report, args.output)
+    flagged = ", ".join(report["flagged"]) or "none"
+    print(f"wrote {args.output} ({report['respondents']} respondents, {report['skipped']} skipped; alpha < {report['alpha_threshold']}: {flagged})")
+
+
+if __name__ == "__main__":
+    main()
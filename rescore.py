@@ -0,0 +1,204 @@
+"""Offline bulk rescoring: JSONL submissions in, JSONL profiles out.
+
+Each input line is a submission shaped like the /submit body, `{"user_id": ..., "answers": [...]}`,
+optionally with the `item_bank_version` it was taken under; it is rescored with that version's
+rules (records without one use --item-bank-version, else the current version).
+Each output line is `{"user_id", "profile"}` or `{"user_id", "line", "error"}`, in input order.
+
+    python rescore.py submissions.jsonl profiles.jsonl --workers 8
+    python rescore.py submissions.jsonl profiles.jsonl --resume
+
+Progress is checkpointed to `<output>.offset` after every chunk, so an interrupted run continues
+with --resume from the last fully written chunk instead of starting over.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Tuple, Iterator, Optional, Dict, Any
+
+from pydantic import ValidationError
+
+from models import SubmissionRecord
+from item_bank import get_compiled_item_bank, get_item_bank, item_bank_registry, UnknownItemBankVersion
+from batch_scoring import score_answer_lists
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _user_id_of(line: bytes) -> Optional[str]:
+    """Best-effort user_id of a record that failed validation, for the error line."""
+    try:
+        raw = json.loads(line)
+    except ValueError:
+        return None
+    return raw.get("user_id") if isinstance(raw, dict) else None
+
+
+def _score_chunk(first_line_no: int, lines: List[bytes], default_version: Optional[str] = None) -> Tuple[bytes, int]:
+    """Worker: parses and scores one chunk of raw JSONL lines. Returns (output bytes, error count)."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(lines)
+    valid: Dict[str, List[Tuple[int, SubmissionRecord]]] = {} # item-bank version -> records
+    for i, line in enumerate(lines):
+        line_no = first_line_no + i
+        try:
+            # Parsing and validation in one pass through pydantic-core; much cheaper than json.loads first
+            record = SubmissionRecord.model_validate_json(line)
+        except ValidationError as e:
+            results[i] = {"user_id": _user_id_of(line), "line": line_no, "error": str(e)}
+            continue
+        if not record.user_id or not record.answers:
+            results[i] = {"user_id": record.user_id, "line": line_no, "error": "user_id and a non-empty answers list are required."}
+            continue
+        version = record.item_bank_version or default_version
+        try:
+            bank = item_bank_registry.resolve(version) if version else get_compiled_item_bank()
+        except UnknownItemBankVersion:
+            results[i] = {"user_id": record.user_id, "line": line_no, "error": f"Unknown item_bank_version {version!r}."}
+            continue
+        valid.setdefault(bank.tag, []).append((i, record))
+
+    for version, group in valid.items():
+        profiles = score_answer_lists([record.answers for _, record in group], get_item_bank(version))
+        for (i, record), profile in zip(group, profiles):
+            results[i] = {"user_id": record.user_id, "profile": profile.model_dump(mode="json")}
+
+    errors = len(lines) - sum(len(group) for group in valid.values())
+    return "".join(json.dumps(result) + "\n" for result in results).encode("utf-8"), errors
+
+
+def _read_chunks(input_file, chunk_size: int, first_line_no: int) -> Iterator[Tuple[int, List[bytes], int, int]]:
+    """Yields (first line number, non-blank lines, input byte offset and line count after the chunk)."""
+    lines: List[bytes] = []
+    line_no = first_line_no
+    chunk_first_line = first_line_no
+    for line in iter(input_file.readline, b""):
+        line_no += 1
+        if line.strip():
+            if not lines:
+                chunk_first_line = line_no
+            lines.append(line)
+        if len(lines) >= chunk_size:
+            yield chunk_first_line, lines, input_file.tell(), line_no
+            lines = []
+    if lines:
+        yield chunk_first_line, lines, input_file.tell(), line_no
+
+
+def _checkpoint_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".offset")
+
+
+def _load_checkpoint(output_path: Path) -> Dict[str, int]:
+    path = _checkpoint_path(output_path)
+    if not path.exists():
+        return {"input_offset": 0, "output_offset": 0, "lines": 0, "records": 0, "errors": 0}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(output_path: Path, checkpoint: Dict[str, int]) -> None:
+    path = _checkpoint_path(output_path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _init_worker() -> None:
+    # With the fork start method the compiled bank is inherited from the parent; this only
+    # does work under spawn, once per worker rather than once per chunk.
+    get_compiled_item_bank()
+
+
+def rescore_file(
+    input_path: Path,
+    output_path: Path,
+    workers: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume: bool = False,
+    progress_every: float = 5.0,
+    item_bank_version: Optional[str] = None,
+) -> Dict[str, int]:
+    """Rescores a JSONL file of submissions and returns the final checkpoint counters."""
+    workers = workers or os.cpu_count() or 1
+    resume = resume and output_path.exists()
+    checkpoint = _load_checkpoint(output_path) if resume else {
+        "input_offset": 0, "output_offset": 0, "lines": 0, "records": 0, "errors": 0
+    }
+
+    # Data is parsed and compiled here, before the pool starts, so forked workers share it copy-on-write
+    get_compiled_item_bank()
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+
+    started = time.monotonic()
+    last_report = started
+    records_at_start = checkpoint["records"]
+    with open(input_path, "rb") as input_file, open(output_path, "r+b" if resume else "wb") as output_file:
+        # Drop anything written after the last checkpoint (a partially written chunk)
+        output_file.truncate(checkpoint["output_offset"])
+        output_file.seek(checkpoint["output_offset"])
+        input_file.seek(checkpoint["input_offset"])
+
+        with context.Pool(workers, initializer=_init_worker) as pool:
+            # At most 2 chunks per worker in flight keeps memory bounded regardless of input size
+            pending: deque = deque()
+            chunks = _read_chunks(input_file, chunk_size, checkpoint["lines"])
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    first_line_no, lines, input_offset, lines_read = chunk
+                    pending.append((pool.apply_async(_score_chunk, (first_line_no, lines, item_bank_version)), len(lines), input_offset, lines_read))
+                if not pending:
+                    break
+
+                result, count, input_offset, lines_read = pending.popleft()
+                output_bytes, errors = result.get()
+                output_file.write(output_bytes)
+                output_file.flush()
+                checkpoint = {
+                    "input_offset": input_offset,
+                    "output_offset": output_file.tell(),
+                    "lines": lines_read,
+                    "records": checkpoint["records"] + count,
+                    "errors": checkpoint["errors"] + errors,
+                }
+                _save_checkpoint(output_path, checkpoint)
+
+                now = time.monotonic()
+                if progress_every and now - last_report >= progress_every:
+                    last_report = now
+                    rate = (checkpoint["records"] - records_at_start) / (now - started)
+                    print(f"rescored {checkpoint['records']} records ({checkpoint['errors']} errors), {rate:,.0f} records/s", file=sys.stderr)
+
+    elapsed = time.monotonic() - started
+    done = checkpoint["records"] - records_at_start
+    print(f"done: {done} records in {elapsed:.1f}s ({done / elapsed if elapsed else 0:,.0f} records/s), "
+          f"{checkpoint['errors']} errors in total", file=sys.stderr)
+    return checkpoint
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Rescore JSONL submissions into JSONL profiles.")
+    parser.add_argument("input", type=Path, help="JSONL file of {user_id, answers} submissions")
+    parser.add_argument("output", type=Path, help="JSONL file to write profiles to")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="records per worker task")
+    parser.add_argument("--resume", action="store_true", help="continue from <output>.offset")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="seconds between progress lines (0 = off)")
+    parser.add_argument("--item-bank-version", help="version for records that don't name one (default: current)")
+    args = parser.parse_args(argv)
+    rescore_file(args.input, args.output, args.workers, args.chunk_size, args.resume, args.progress_every,
+                 args.item_bank_version)
+
+
+if __name__ == "__main__":
+    main()
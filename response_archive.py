@@ -0,0 +1,324 @@
+"""Append-only archive of raw item-level responses in memory-mapped, fixed-width segment files.
+
+Every scored submission (v1/v2 submit, batch records, finalized sessions) is kept as one record:
+
+    user_hash  uint64          first 8 bytes of blake2b(user_id): joinable, not reversible
+    timestamp  datetime64[ms]  when the submission was scored (UTC)
+    codes      uint8[slots]    one answer code per slot, as in CompiledItemBank.slot_options (0 = unanswered)
+
+Segments are per item-bank version, since the version fixes the slot count and so the record
+width; the version, its layout id and the dtype are in the segment header. Layout of a segment:
+
+    0     8 bytes   MAGIC
+    8     uint64    committed record count (written after the records it counts)
+    16    uint32    header JSON length, then the header JSON
+    4096  records   `capacity` fixed-width records, the file preallocated (sparse) at creation
+
+With NUMI_RESPONSE_ARCHIVE_DIR set, each process writes its own segments under
+`<dir>/<item-bank version>/`, so gunicorn workers never share a writable file. `append` only
+queues the submission; a background thread encodes, hashes and packs the queue every
+RESPONSE_ARCHIVE_FLUSH_SECONDS and copies it into the mapped segment in one slice, then bumps
+the committed count. Records reach the page cache at once (a crashed worker loses only its queue)
+and disk when the kernel writes back or the segment is closed. Readers map segments read-only
+as NumPy structured arrays, without parsing:
+
+    for segment in iter_segments(dir, "v1"):
+        codes = segment.records["codes"]   # (n, slots) uint8, zero-copy
+
+    python response_archive.py stats [dir]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from item_bank import CompiledItemBank
+from models import UserAnswer
+from config import (
+    RESPONSE_ARCHIVE_DIR,
+    RESPONSE_ARCHIVE_SEGMENT_RECORDS,
+    RESPONSE_ARCHIVE_FLUSH_SECONDS,
+    RESPONSE_ARCHIVE_MAX_PENDING
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = 1
+MAGIC = b"NUMIRSP1"
+HEADER_SIZE = 4096 # records start page-aligned
+_COUNT = struct.Struct("<Q")
+_RECORD_PREFIX = struct.Struct("<Qq") # user_hash, timestamp (ms)
+RECORD_PREFIX_SIZE = _RECORD_PREFIX.size
+
+# (bank, user_id, answer codes or the answers to encode, time scored)
+_Pending = Tuple[CompiledItemBank, str, Union[bytes, List[UserAnswer]], float]
+
+
+def user_hash(user_id: str) -> int:
+    """The archive's key for a user_id (uint64)."""
+    return int.from_bytes(hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def record_dtype(num_slots: int):
+    """NumPy dtype of one record for an item bank with `num_slots` slots."""
+    import numpy as np # analytics only; the writer doesn't need NumPy
+    return np.dtype([("user_hash", "<u8"), ("timestamp", "<M8[ms]"), ("codes", "u1", (num_slots,))])
+
+
+class _SegmentWriter:
+    """One segment file being filled by this process."""
+
+    def __init__(self, path: Path, bank: CompiledItemBank, capacity: int):
+        self.path = path
+        self.record_size = RECORD_PREFIX_SIZE + len(bank.slots)
+        self.capacity = capacity
+        self.count = 0
+        header = json.dumps({
+            "format": ARCHIVE_FORMAT,
+            "item_bank_version": bank.tag,
+            "layout": bank.version,
+            "slots": len(bank.slots),
+            "record_size": self.record_size,
+            "capacity": capacity,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+        }).encode("utf-8")
+        if 20 + len(header) > HEADER_SIZE:
+            raise ValueError(f"Segment header too long ({len(header)} bytes)")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "x+b")
+        self._file.truncate(HEADER_SIZE + capacity * self.record_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[:8] = MAGIC
+        self._map[8:16] = _COUNT.pack(0)
+        self._map[16:20] = struct.pack("<I", len(header))
+        self._map[20:20 + len(header)] = header
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.count
+
+    def write(self, packed: memoryview, records: int) -> None:
+        start = HEADER_SIZE + self.count * self.record_size
+        self._map[start:start + len(packed)] = packed
+        self.count += records
+        self._map[8:16] = _COUNT.pack(self.count) # commit: readers only look this far
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+class ResponseArchive:
+    """Queues scored submissions and appends them to this process's segments in batches."""
+
+    def __init__(self, directory: Optional[Path] = RESPONSE_ARCHIVE_DIR, segment_records: int = RESPONSE_ARCHIVE_SEGMENT_RECORDS,
+                 flush_interval: float = RESPONSE_ARCHIVE_FLUSH_SECONDS, max_pending: int = RESPONSE_ARCHIVE_MAX_PENDING):
+        self.directory = Path(directory) if directory else None
+        self._segment_records = segment_records
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending: List[_Pending] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() # one flush at a time, so records land in order
+        self._segments: Dict[str, _SegmentWriter] = {} # item-bank version -> open segment
+        self._sequence = 0
+        self._counters: Dict[str, int] = {"queued": 0, "written": 0, "segments": 0, "flush_errors": 0, "dropped": 0}
+        self._flusher_pid: Optional[int] = None
+        self._stop = threading.Event()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def append(self, user_id: str, bank: CompiledItemBank, answers: Union[bytes, List[UserAnswer]]) -> None:
+        """Queues one submission (answer codes, or the answers themselves) for the archive."""
+        if self.directory is None:
+            return
+        self.append_many(bank, [(user_id, answers)])
+
+    def append_many(self, bank: CompiledItemBank, submissions: List[Tuple[str, Union[bytes, List[UserAnswer]]]]) -> None:
+        if self.directory is None or not submissions:
+            return
+        self._ensure_flusher()
+        now = time.time()
+        with self._lock:
+            self._pending.extend((bank, user_id, answers, now) for user_id, answers in submissions)
+            self._counters["queued"] += len(submissions)
+            overfull = len(self._pending) > self._max_pending
+        if overfull:
+            self.flush() # the flusher is behind: write inline rather than grow without bound
+
+    def _open_segment(self, bank: CompiledItemBank) -> _SegmentWriter:
+        self._sequence += 1
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = self.directory / bank.tag / f"{stamp}-{os.getpid()}-{self._sequence:04d}.seg"
+        segment = _SegmentWriter(path, bank, self._segment_records)
+        self._counters["segments"] += 1
+        return segment
+
+    def _reset_after_fork(self) -> None:
+        # A forked worker must not write into (or close) the segments its parent has mapped, nor
+        # write the parent's queue a second time
+        self._segments = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def flush(self) -> int:
+        """Writes every queued submission to the segments; returns how many were written.
+           A failed write is logged and its submissions dropped, so one bad batch can't wedge the queue."""
+        if self.directory is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            by_version: Dict[str, List[_Pending]] = {}
+            for entry in pending:
+                by_version.setdefault(entry[0].tag, []).append(entry)
+            written = 0
+            for version, entries in by_version.items():
+                try:
+                    written += self._write(entries)
+                except Exception as e:
+                    with self._lock:
+                        self._counters["flush_errors"] += 1
+                        self._counters["dropped"] += len(entries)
+                    logger.error(f"Response archive write of {len(entries)} submission(s) for {version} failed: {str(e)}", exc_info=True)
+            with self._lock:
+                self._counters["written"] += written
+            return written
+
+    def _write(self, entries: List[_Pending]) -> int:
+        bank = entries[0][0]
+        num_slots = len(bank.slots)
+        packed = bytearray()
+        for _, user_id, answers, scored_at in entries:
+            codes = answers if isinstance(answers, (bytes, bytearray)) else bank.encode_answers(answers)
+            if len(codes) != num_slots:
+                raise ValueError(f"{len(codes)} answer codes for the {num_slots}-slot item bank {bank.tag}")
+            packed += _RECORD_PREFIX.pack(user_hash(user_id), int(scored_at * 1000))
+            packed += codes
+        record_size = RECORD_PREFIX_SIZE + num_slots
+        done = 0
+        while done < len(entries):
+            segment = self._segments.get(bank.tag)
+            if segment is not None and segment.free == 0:
+                segment.close()
+                segment = None
+            if segment is None:
+                segment = self._segments[bank.tag] = self._open_segment(bank)
+            take = min(segment.free, len(entries) - done)
+            segment.write(memoryview(packed)[done * record_size:(done + take) * record_size], take)
+            done += take
+        return done
+
+    def _ensure_flusher(self) -> None:
+        # Started lazily (and restarted after a fork), like the write-behind profile store's flusher
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="response-archive-flush", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self._flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """Stops the flusher, writes out the queue and closes this process's segments."""
+        if self.directory is None:
+            return
+        self._stop.set()
+        self.flush()
+        with self._flush_lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments = {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, enabled=self.enabled, pending=len(self._pending),
+                        open_segments={version: segment.count for version, segment in self._segments.items()})
+
+
+# --- reading ---
+
+class Segment:
+    """A segment mapped read-only; `records` is a zero-copy structured array of its committed records."""
+
+    def __init__(self, path: Path):
+        import numpy as np
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            prefix = f.read(20)
+            if len(prefix) < 20 or prefix[:8] != MAGIC:
+                raise ValueError(f"{self.path} is not a response archive segment")
+            (header_length,) = struct.unpack("<I", prefix[16:20])
+            self.header: Dict[str, Any] = json.loads(f.read(header_length))
+        if self.header["format"] != ARCHIVE_FORMAT:
+            raise ValueError(f"{self.path}: unsupported archive format {self.header['format']}")
+        self.item_bank_version: str = self.header["item_bank_version"]
+        self.layout: str = self.header["layout"]
+        self.dtype = record_dtype(self.header["slots"])
+        # The count is read once, so the array stays consistent while the writer keeps appending
+        (count,) = _COUNT.unpack(prefix[8:16])
+        self.records = np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,)) if count else np.empty(0, self.dtype)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+def iter_segments(directory: Optional[Path] = RESPONSE_ARCHIVE_DIR, item_bank_version: Optional[str] = None) -> Iterator[Segment]:
+    """Every segment under `directory` (of one item-bank version, if given), oldest first by name."""
+    if directory is None:
+        return
+    root = Path(directory)
+    versions = [item_bank_version] if item_bank_version else sorted(p.name for p in root.iterdir() if p.is_dir()) if root.is_dir() else []
+    for version in versions:
+        for path in sorted((root / version).glob("*.seg")):
+            yield Segment(path)
+
+
+def _stats(directory: Path) -> Dict[str, Any]:
+    versions: Dict[str, Dict[str, Any]] = {}
+    for segment in iter_segments(directory):
+        summary = versions.setdefault(segment.item_bank_version, {"segments": 0, "records": 0, "bytes": 0, "first": None, "last": None})
+        summary["segments"] += 1
+        summary["records"] += len(segment)
+        summary["bytes"] += segment.records.nbytes
+        if len(segment):
+            first, last = str(segment.records["timestamp"].min()), str(segment.records["timestamp"].max())
+            summary["first"] = min(summary["first"] or first, first)
+            summary["last"] = max(summary["last"] or last, last)
+    return versions
+
+
+response_archive = ResponseArchive()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect the raw response archive.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stats = sub.add_parser("stats", help="records, bytes and time range per item-bank version")
+    stats.add_argument("directory", nargs="?", type=Path, default=RESPONSE_ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+    if args.directory is None:
+        parser.error("no archive directory (pass one or set NUMI_RESPONSE_ARCHIVE_DIR)")
+    print(json.dumps(_stats(args.directory), indent=2))
+
+
+if __name__ == "__main__":
+    main()
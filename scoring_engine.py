@@ -1,7 +1,8 @@
 from collections import defaultdict
 import math
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, NamedTuple
 from datetime import datetime, timezone
+from time import perf_counter
 
 from models import UserAnswer, Profile, ItemMeta, FullScoringResult
 from data_loader import (
@@ -18,6 +19,10 @@ from config import (
     CREATION_INSTINCT_NAME,
     REVERSE_ITEM_MAPPING # <-- Import new mapping
 )
+from item_bank import CompiledItemBank, get_compiled_item_bank
+from percentiles import NormsTables, current_norms
+from profile_codec import encode_record
+from metrics import scoring_stage_seconds, flowprint_fallbacks_total
 
 def calculate_subtype_endorsements(user_answers: List[UserAnswer]) -> Dict[str, int]:
     """Calculates +1 endorsements for each subtype based on user answers."""
@@ -344,6 +349,7 @@ def assemble_final_profile(scoring_result: FullScoringResult) -> Profile:
         signature = flowprint_info.get("signature", signature)
     else:
         # This warning is helpful for debugging content issues in Flowprint_Labels.tsv
+        flowprint_fallbacks_total.inc()
         print(f"Warning: Flowprint label not found for Creation: {scoring_result.creation}, Driver: {scoring_result.driver}")
 
     # 2. Build instinctBars
@@ -376,8 +382,264 @@ def assemble_final_profile(scoring_result: FullScoringResult) -> Profile:
     )
 
 
+# --- Compiled single-pass path ---
+# The functions above are the readable reference implementation of instinct_map_scoring.md.
+# The request path below produces identical results from the index tables in item_bank.py:
+# one pass over the answers fills a counter array and everything else reads precomputed indices.
+
+class CompiledScores(NamedTuple):
+    """Index-based scoring result. Lists are aligned with bank.subtypes / bank.instincts."""
+    subtype_raw: List[int]
+    instinct_mean: List[float]
+    instinct_range: List[int]
+    instinct_std_dev: List[float]
+    driver: int       # index into bank.instincts, -1 if no candidates
+    creation: int     # index into bank.subtypes, -1 if no Creation subtypes are defined
+    growth_edge: int  # index into bank.instincts, -1 if no candidates
+
+
+def tally_endorsements(user_answers: List[UserAnswer], bank: CompiledItemBank) -> Tuple[List[int], List[int]]:
+    """Single pass over answers: raw subtype totals plus endorsed Creation item counts."""
+    subtype_raw = [0] * bank.num_subtypes
+    creation_item_counts = [0] * bank.num_subtypes
+    table = bank.endorsement_table
+    for answer in user_answers:
+        hit = table.get((answer.slot, answer.answer))
+        if hit is not None:
+            idx, is_creation_item = hit
+            subtype_raw[idx] += 1
+            if is_creation_item:
+                creation_item_counts[idx] += 1
+    return subtype_raw, creation_item_counts
+
+
+def tally_codes(codes: bytes, bank: CompiledItemBank) -> Tuple[List[int], List[int]]:
+    """tally_endorsements for a per-slot code string (see CompiledItemBank.slot_options); codes must be in range."""
+    subtype_raw = [0] * bank.num_subtypes
+    creation_item_counts = [0] * bank.num_subtypes
+    for endorsements, code in zip(bank.code_endorsements, codes):
+        hit = endorsements[code]
+        if hit is not None:
+            idx, is_creation_item = hit
+            subtype_raw[idx] += 1
+            if is_creation_item:
+                creation_item_counts[idx] += 1
+    return subtype_raw, creation_item_counts
+
+
+def compute_instinct_metrics(
+    subtype_raw: List[int], bank: CompiledItemBank
+) -> Tuple[List[float], List[int], List[float]]:
+    """(mean, range, std-dev) per instinct over the counter array, aligned with bank.instincts."""
+    instinct_mean: List[float] = []
+    instinct_range: List[int] = []
+    instinct_std_dev: List[float] = []
+    for start, end in bank.instinct_subtype_slices:
+        if start == end:
+            instinct_mean.append(0.0)
+            instinct_range.append(0)
+            instinct_std_dev.append(0.0)
+            continue
+        scores = subtype_raw[start:end]
+        # Same arithmetic as calculate_instinct_metrics so rounding (and therefore tie-breaks) match
+        mean_score = sum(scores) / len(scores)
+        instinct_mean.append(round(mean_score, 2))
+        instinct_range.append(max(scores) - min(scores))
+        if len(scores) > 1:
+            variance = sum([(s - mean_score) ** 2 for s in scores]) / (len(scores) - 1)
+            instinct_std_dev.append(round(math.sqrt(variance), 2))
+        else:
+            instinct_std_dev.append(0.0)
+    return instinct_mean, instinct_range, instinct_std_dev
+
+
+def select_key_instincts(
+    subtype_raw: List[int],
+    creation_item_counts: List[int],
+    instinct_mean: List[float],
+    instinct_range: List[int],
+    instinct_std_dev: List[float],
+    bank: CompiledItemBank,
+) -> Tuple[int, int, int]:
+    """Driver / Creation / Growth Edge indices (-1 when there are no candidates)."""
+    # Driver: Strength + Range, tie-break larger Range, first candidate wins a full tie
+    driver = -1
+    max_adjusted_score = -1
+    max_range_for_tiebreak = -1
+    for i in bank.driver_instinct_indices:
+        adjusted_score = instinct_mean[i] + instinct_range[i]
+        if adjusted_score > max_adjusted_score:
+            max_adjusted_score = adjusted_score
+            max_range_for_tiebreak = instinct_range[i]
+            driver = i
+        elif adjusted_score == max_adjusted_score and instinct_range[i] > max_range_for_tiebreak:
+            max_range_for_tiebreak = instinct_range[i]
+            driver = i
+
+    # Creation: highest raw, then more endorsed items, then CREATION_SUBTYPE_TIEBREAK_ORDER
+    creation = -1
+    if bank.creation_subtype_indices:
+        highest_score = max(subtype_raw[i] for i in bank.creation_subtype_indices)
+        tied = [i for i in bank.creation_subtype_indices if subtype_raw[i] == highest_score]
+        if len(tied) > 1:
+            max_endorsed_items = max(creation_item_counts[i] for i in tied)
+            tied = [i for i in tied if creation_item_counts[i] == max_endorsed_items]
+        if len(tied) > 1:
+            # min() keeps the first of equal ranks, i.e. glossary order for subtypes outside the tie-break list
+            tied = [min(tied, key=bank.creation_tiebreak_rank.__getitem__)]
+        creation = tied[0]
+
+    # Growth Edge: lowest Strength, tie-break highest std-dev, first candidate wins a full tie
+    growth_edge = -1
+    candidates = bank.growth_edge_instinct_indices
+    if candidates:
+        min_strength = min(instinct_mean[i] for i in candidates)
+        lowest = [i for i in candidates if instinct_mean[i] == min_strength]
+        growth_edge = lowest[0]
+        max_std_dev = -1.0
+        for i in lowest:
+            if instinct_std_dev[i] > max_std_dev:
+                max_std_dev = instinct_std_dev[i]
+                growth_edge = i
+    return driver, creation, growth_edge
+
+
+def compute_compiled_scores(
+    subtype_raw: List[int], creation_item_counts: List[int], bank: CompiledItemBank
+) -> CompiledScores:
+    """Instinct metrics and Driver / Creation / Growth Edge selection over the counter array."""
+    instinct_mean, instinct_range, instinct_std_dev = compute_instinct_metrics(subtype_raw, bank)
+    driver, creation, growth_edge = select_key_instincts(
+        subtype_raw, creation_item_counts, instinct_mean, instinct_range, instinct_std_dev, bank
+    )
+    return CompiledScores(
+        subtype_raw=subtype_raw,
+        instinct_mean=instinct_mean,
+        instinct_range=instinct_range,
+        instinct_std_dev=instinct_std_dev,
+        driver=driver,
+        creation=creation,
+        growth_edge=growth_edge
+    )
+
+
+def _compiled_names(scores: CompiledScores, bank: CompiledItemBank) -> Tuple[str, str, str]:
+    """Resolves (driver, creation, growth_edge) indices to names, with the reference fallbacks."""
+    driver = bank.instincts[scores.driver] if scores.driver >= 0 else DRIVER_INSTINCTS_CANDIDATES[0]
+    creation = bank.subtypes[scores.creation] if scores.creation >= 0 else CREATION_SUBTYPE_TIEBREAK_ORDER[0]
+    growth_edge = bank.instincts[scores.growth_edge] if scores.growth_edge >= 0 else "N/A"
+    return driver, creation, growth_edge
+
+
+def compiled_scores_to_result(scores: CompiledScores, bank: CompiledItemBank) -> FullScoringResult:
+    """Converts index-based scores into the name-keyed FullScoringResult."""
+    driver, creation, growth_edge = _compiled_names(scores, bank)
+    return FullScoringResult(
+        subtype_raw=dict(zip(bank.subtypes, scores.subtype_raw)),
+        instinct_mean=dict(zip(bank.instincts, scores.instinct_mean)),
+        instinct_range=dict(zip(bank.instincts, scores.instinct_range)),
+        instinct_std_dev=dict(zip(bank.instincts, scores.instinct_std_dev)),
+        driver=driver,
+        creation=creation,
+        growth_edge=growth_edge
+    )
+
+
+def assemble_compiled_profile(
+    scores: CompiledScores, bank: CompiledItemBank, norms: Optional[NormsTables] = None,
+    timestamp: Optional[datetime] = None
+) -> Profile:
+    """Index-based equivalent of assemble_final_profile.
+       With norms, instinct bars carry percentiles and clashes are filled in (v2); without, output is v1.
+       The profile carries its compact record (profile_codec.py); pass `timestamp` to reassemble a stored one.
+       A reassembly doesn't count as a Flowprint fallback again: that was counted when the profile was scored.
+    """
+    driver, creation, growth_edge = _compiled_names(scores, bank)
+
+    headline = "Default Headline - Check Flowprint Mapping" # Fallback
+    signature = "Default Signature - Check Flowprint Mapping" # Fallback
+    flowprint_info = bank.flowprint_for(scores.creation, scores.driver)
+    if flowprint_info:
+        headline, signature = flowprint_info
+    elif timestamp is None:
+        flowprint_fallbacks_total.inc()
+        print(f"Warning: Flowprint label not found for Creation: {creation}, Driver: {driver}")
+
+    subtype_raw = scores.subtype_raw
+    instinct_bars: Dict[str, Dict[str, Optional[float | str]]] = {}
+    for instinct_idx, (instinct_name, (start, end)) in enumerate(zip(bank.instincts, bank.instinct_subtype_slices)):
+        dominant_subtype = None
+        if start != end:
+            # First subtype (glossary order) with the highest score, as in get_dominant_subtype
+            instinct_scores = subtype_raw[start:end]
+            dominant_subtype = bank.subtypes[start + instinct_scores.index(max(instinct_scores))]
+        instinct_bars[instinct_name] = {
+            "percentile": norms.percentile(instinct_idx, subtype_raw) if norms else None,
+            "dominantSubtype": dominant_subtype
+        }
+
+    timestamp = timestamp or datetime.now(timezone.utc)
+    profile = Profile(
+        headline=headline,
+        signature=signature,
+        driver=driver,
+        creation=creation,
+        growth_edge=growth_edge,
+        instinct_bars=instinct_bars,
+        clashes=norms.clashes(subtype_raw) if norms else [],
+        timestamp=timestamp.isoformat(),
+        all_subtype_scores=dict(zip(bank.subtypes, subtype_raw)),
+        instinct_strengths=dict(zip(bank.instincts, scores.instinct_mean))
+    )
+    profile._record = encode_record(subtype_raw, scores.driver, scores.creation, scores.growth_edge, bank, timestamp)
+    return profile
+
+
+_endorsements_seconds = scoring_stage_seconds.labels(stage="endorsements")
+_instinct_metrics_seconds = scoring_stage_seconds.labels(stage="instinct_metrics")
+_selection_seconds = scoring_stage_seconds.labels(stage="selection")
+_profile_assembly_seconds = scoring_stage_seconds.labels(stage="profile_assembly")
+
+
+def _score_tallies(
+    subtype_raw: List[int], creation_item_counts: List[int], bank: CompiledItemBank, started: float
+) -> Profile:
+    """Shared tail of the compiled entry points; records per-stage timings from `started`."""
+    counted = perf_counter()
+    _endorsements_seconds.observe(counted - started)
+    instinct_mean, instinct_range, instinct_std_dev = compute_instinct_metrics(subtype_raw, bank)
+    measured = perf_counter()
+    _instinct_metrics_seconds.observe(measured - counted)
+    driver, creation, growth_edge = select_key_instincts(
+        subtype_raw, creation_item_counts, instinct_mean, instinct_range, instinct_std_dev, bank
+    )
+    selected = perf_counter()
+    _selection_seconds.observe(selected - measured)
+    scores = CompiledScores(subtype_raw, instinct_mean, instinct_range, instinct_std_dev, driver, creation, growth_edge)
+    profile = assemble_compiled_profile(scores, bank, current_norms(bank))
+    _profile_assembly_seconds.observe(perf_counter() - selected)
+    return profile
+
+
+def score_answers_compiled(user_answers: List[UserAnswer], bank: CompiledItemBank) -> Profile:
+    """Scores answers against a specific compiled item bank."""
+    started = perf_counter()
+    subtype_raw, creation_item_counts = tally_endorsements(user_answers, bank)
+    return _score_tallies(subtype_raw, creation_item_counts, bank, started)
+
+
+def score_codes(codes: bytes, bank: CompiledItemBank) -> Profile:
+    """Scores a validated per-slot code string (the v2 compact submission format)."""
+    started = perf_counter()
+    subtype_raw, creation_item_counts = tally_codes(codes, bank)
+    return _score_tallies(subtype_raw, creation_item_counts, bank, started)
+
+
+def score_tallies(subtype_raw: List[int], creation_item_counts: List[int], bank: CompiledItemBank) -> Profile:
+    """Scores counters that were tallied elsewhere, e.g. kept up to date answer by answer."""
+    return _score_tallies(list(subtype_raw), list(creation_item_counts), bank, perf_counter())
+
+
 def score_answers(user_answers: List[UserAnswer]) -> Profile:
     """Main function to take user answers and return the full Profile."""
-    full_scoring_data = calculate_full_profile_data(user_answers)
-    final_profile = assemble_final_profile(full_scoring_data)
-    return final_profile 
\ No newline at end of file
+    return score_answers_compiled(user_answers, get_compiled_item_bank()) 
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""Runs CPU-bound scoring off the asyncio event loop, with admission control.
+
+Scoring a submission holds the CPU for a millisecond or so; run inline in an `async def`
+endpoint it stalls every other request on the worker, health checks included. Submits are
+handed to a thread pool (or a process pool, for real parallelism past the GIL) instead, and
+at most `max_workers + max_queue` of them may be outstanding at once. Anything past that is
+rejected immediately with ScoringQueueFull, which the API turns into a 503 with Retry-After,
+so a burst queues in bounded memory instead of piling up unbounded latency.
+"""
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from item_bank import get_compiled_item_bank
+from metrics import registry
+from config import SCORING_EXECUTOR, SCORING_WORKERS, SCORING_QUEUE_MAX
+
+# Recent queue waits kept for the percentile figures in stats()
+_WAIT_SAMPLES = 1024
+
+
+queue_wait_seconds = registry.histogram(
+    "numi_scoring_queue_wait_seconds", "Time submits waited for a free scoring worker."
+)
+
+
+class ScoringQueueFull(Exception):
+    """Raised when every scoring worker is busy and the queue is at its limit."""
+
+
+def _timed_call(fn: Callable, args: Tuple) -> Tuple[Any, float]:
+    # time.time() rather than monotonic(): it has to be comparable across processes
+    started = time.time()
+    return fn(*args), started
+
+
+def _init_process_worker() -> None:
+    get_compiled_item_bank()
+
+
+class ScoringExecutor:
+    """Bounded dispatcher for scoring calls. Counters are only touched from the event loop thread."""
+
+    def __init__(self, kind: str = SCORING_EXECUTOR, max_workers: int = SCORING_WORKERS,
+                 max_queue: int = SCORING_QUEUE_MAX):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown scoring executor {kind!r}; expected 'thread' or 'process'.")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._outstanding = 0
+        self.submitted = 0
+        self.rejected = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    def _get_executor(self) -> Executor:
+        # Created on first use, so gunicorn workers each start their own pool after forking
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn, not fork: a child forked from a busy worker would inherit its threads,
+                # locks and metric callbacks mid-flight
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_init_process_worker)
+            else:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="scoring")
+        return self._executor
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Runs fn(*args) on the pool. With the process pool, fn and args must be picklable."""
+        if self._outstanding >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ScoringQueueFull()
+        self._outstanding += 1
+        self.submitted += 1
+        enqueued = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started = await loop.run_in_executor(self._get_executor(), _timed_call, fn, args)
+        finally:
+            self._outstanding -= 1
+        wait = max(0.0, started - enqueued)
+        self._wait_count += 1
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        self._recent_waits.append(wait)
+        queue_wait_seconds.observe(wait)
+        return result
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a free worker (outstanding beyond those that can be running)."""
+        return max(0, self._outstanding - self.max_workers)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._recent_waits)
+        def recent(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 3) if waits else 0.0
+        return {
+            "executor": self.kind,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._outstanding,
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "queue_wait_ms_avg": round(self._wait_total / self._wait_count * 1000, 3) if self._wait_count else 0.0,
+            "queue_wait_ms_max": round(self._wait_max * 1000, 3),
+            "queue_wait_ms_p50": recent(0.50),
+            "queue_wait_ms_p99": recent(0.99),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+scoring_executor = ScoringExecutor()
@@ -0,0 +1,280 @@
+"""Incremental assessment sessions: answers saved one at a time, scored from running counters.
+
+A session pins the item-bank version it was started under and holds one answer code per slot
+(0 = unanswered, see CompiledItemBank.slot_options) plus the two counter arrays the compiled
+scorer tallies: endorsements per subtype and endorsed Creation items per subtype. Saving an
+answer takes back the endorsement of the slot's previous answer and adds the new one's, so the
+counters always equal a full tally of the current answers and finalizing only assembles the
+profile from them. About 200 bytes per session for the 100-item bank.
+"""
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+import os
+import sqlite3
+import threading
+import time
+
+from item_bank import CompiledItemBank
+from models import UserAnswer
+from config import (
+    SESSION_STORE_BACKEND,
+    SESSION_STORE_SQLITE_PATH,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_ENTRIES,
+    PROFILE_EXPIRY_BATCH_SIZE,
+    PROFILE_EXPIRY_SWEEP_SECONDS
+)
+
+T = TypeVar("T")
+
+
+class AssessmentSession:
+    """One in-progress assessment: per-slot answer codes and the running scoring counters."""
+
+    __slots__ = ("session_id", "user_id", "item_bank_version", "codes", "subtype_raw", "creation_item_counts",
+                 "answered", "finalized", "created_at", "expires_at")
+
+    def __init__(self, session_id: str, user_id: str, item_bank_version: str, codes: bytearray,
+                 subtype_raw: array, creation_item_counts: array, answered: int = 0, finalized: bool = False,
+                 created_at: float = 0.0, expires_at: float = 0.0):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.item_bank_version = item_bank_version
+        self.codes = codes
+        self.subtype_raw = subtype_raw
+        self.creation_item_counts = creation_item_counts
+        self.answered = answered
+        self.finalized = finalized
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+    @classmethod
+    def start(cls, session_id: str, user_id: str, bank: CompiledItemBank) -> "AssessmentSession":
+        zeros = [0] * bank.num_subtypes
+        return cls(session_id, user_id, bank.tag, bytearray(len(bank.slots)), array("H", zeros), array("H", zeros),
+                   created_at=time.time())
+
+    def apply(self, changes: List[Tuple[int, int]], bank: CompiledItemBank) -> int:
+        """Sets (slot index, code) pairs, keeping the counters in step; returns how many slots changed."""
+        code_endorsements = bank.code_endorsements
+        subtype_raw, creation_item_counts = self.subtype_raw, self.creation_item_counts
+        changed = 0
+        for slot_idx, code in changes:
+            previous = self.codes[slot_idx]
+            if previous == code:
+                continue
+            endorsements = code_endorsements[slot_idx]
+            taken_back = endorsements[previous]
+            if taken_back is not None:
+                subtype_raw[taken_back[0]] -= 1
+                if taken_back[1]:
+                    creation_item_counts[taken_back[0]] -= 1
+            added = endorsements[code]
+            if added is not None:
+                subtype_raw[added[0]] += 1
+                if added[1]:
+                    creation_item_counts[added[0]] += 1
+            self.answered += (code != 0) - (previous != 0)
+            self.codes[slot_idx] = code
+            changed += 1
+        return changed
+
+    def answers(self, bank: CompiledItemBank) -> List[UserAnswer]:
+        """The saved answers, e.g. for a client resuming the assessment."""
+        return bank.decode_answers(self.codes)
+
+
+class SessionStore(ABC):
+    """TTL-bounded session storage. A session expires `ttl` seconds after it was last changed."""
+
+    shared_across_workers = False
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        self._ttl = ttl
+
+    @abstractmethod
+    def create(self, session: AssessmentSession) -> None:
+        pass
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[AssessmentSession]:
+        pass
+
+    @abstractmethod
+    def update(self, session_id: str, change: Callable[[AssessmentSession], T]) -> Tuple[Optional[AssessmentSession], Optional[T]]:
+        """Runs `change` on the session and saves it, atomically with respect to other updates.
+        Returns (session, change's result), or (None, None) when the session is missing or expired.
+        If `change` raises, nothing is saved."""
+
+    def close(self) -> None:
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process sessions, least recently changed first; expired ones are dropped as new ones arrive."""
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS, max_entries: int = SESSION_MAX_ENTRIES):
+        super().__init__(ttl)
+        self._max_entries = max_entries
+        self._sessions: "OrderedDict[str, AssessmentSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"evictions": 0, "expirations": 0}
+
+    def create(self, session: AssessmentSession) -> None:
+        now = time.time()
+        session.expires_at = now + self._ttl
+        with self._lock:
+            # Every session has the same TTL, so the least recently changed ones expire first
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if oldest.expires_at > now:
+                    break
+                del self._sessions[oldest.session_id]
+                self._counters["expirations"] += 1
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self._max_entries:
+                self._sessions.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _live(self, session_id: str) -> Optional[AssessmentSession]:
+        session = self._sessions.get(session_id)
+        if session is not None and session.expires_at <= time.time():
+            del self._sessions[session_id]
+            self._counters["expirations"] += 1
+            return None
+        return session
+
+    def get(self, session_id: str) -> Optional[AssessmentSession]:
+        with self._lock:
+            return self._live(session_id)
+
+    def update(self, session_id: str, change: Callable[[AssessmentSession], T]) -> Tuple[Optional[AssessmentSession], Optional[T]]:
+        with self._lock:
+            session = self._live(session_id)
+            if session is None:
+                return None, None
+            # Change a copy, so a failing `change` leaves the stored session untouched
+            working = AssessmentSession(
+                session.session_id, session.user_id, session.item_bank_version, bytearray(session.codes),
+                array("H", session.subtype_raw), array("H", session.creation_item_counts),
+                session.answered, session.finalized, session.created_at, session.expires_at
+            )
+            result = change(working)
+            working.expires_at = time.time() + self._ttl
+            self._sessions[session_id] = working
+            self._sessions.move_to_end(session_id)
+            return working, result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._sessions))
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in the SQLite file the profiles use, so any worker can take a session's next answer.
+
+    Updates run in a BEGIN IMMEDIATE transaction (read, change, write back), which serializes
+    concurrent answers to a session across processes. Counters are stored as packed uint16 arrays.
+    """
+
+    shared_across_workers = True
+
+    _COLUMNS = "session_id, user_id, item_bank_version, codes, subtype_raw, creation_item_counts, answered, finalized, created_at, expires_at"
+    _GET_SQL = f"SELECT {_COLUMNS} FROM sessions WHERE session_id = ? AND expires_at > ?"
+    _SAVE_SQL = f"INSERT OR REPLACE INTO sessions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    _SWEEP_SQL = "DELETE FROM sessions WHERE rowid IN (SELECT rowid FROM sessions WHERE expires_at <= ? LIMIT ?)"
+
+    def __init__(self, path: Path = SESSION_STORE_SQLITE_PATH, ttl: int = SESSION_TTL_SECONDS,
+                 expiry_batch_size: int = PROFILE_EXPIRY_BATCH_SIZE, sweep_interval: float = PROFILE_EXPIRY_SWEEP_SECONDS):
+        super().__init__(ttl)
+        self._path = str(path)
+        self._expiry_batch_size = expiry_batch_size
+        self._sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, item_bank_version TEXT NOT NULL, "
+            "codes BLOB NOT NULL, subtype_raw BLOB NOT NULL, creation_item_counts BLOB NOT NULL, "
+            "answered INTEGER NOT NULL, finalized INTEGER NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit mode: transactions are explicit, so an update's read and write share one
+            conn = sqlite3.connect(self._path, timeout=30, cached_statements=32, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _row(session: AssessmentSession) -> tuple:
+        return (session.session_id, session.user_id, session.item_bank_version, bytes(session.codes),
+                session.subtype_raw.tobytes(), session.creation_item_counts.tobytes(), session.answered,
+                int(session.finalized), session.created_at, session.expires_at)
+
+    @staticmethod
+    def _session(row: tuple) -> AssessmentSession:
+        session_id, user_id, version, codes, subtype_raw, creation_item_counts, answered, finalized, created_at, expires_at = row
+        return AssessmentSession(session_id, user_id, version, bytearray(codes), array("H", subtype_raw),
+                                 array("H", creation_item_counts), answered, bool(finalized), created_at, expires_at)
+
+    def create(self, session: AssessmentSession) -> None:
+        session.expires_at = time.time() + self._ttl
+        conn = self._connection()
+        conn.execute(self._SAVE_SQL, self._row(session))
+        self._maybe_sweep(conn)
+
+    def get(self, session_id: str) -> Optional[AssessmentSession]:
+        row = self._connection().execute(self._GET_SQL, (session_id, time.time())).fetchone()
+        return self._session(row) if row is not None else None
+
+    def update(self, session_id: str, change: Callable[[AssessmentSession], T]) -> Tuple[Optional[AssessmentSession], Optional[T]]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(self._GET_SQL, (session_id, time.time())).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None, None
+            session = self._session(row)
+            result = change(session)
+            session.expires_at = time.time() + self._ttl
+            conn.execute(self._SAVE_SQL, self._row(session))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return session, result
+
+    def _maybe_sweep(self, conn: sqlite3.Connection) -> None:
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self._sweep_interval
+        while conn.execute(self._SWEEP_SQL, (time.time(), self._expiry_batch_size)).rowcount >= self._expiry_batch_size:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        row = self._connection().execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)).fetchone()
+        return {"entries": row[0]}
+
+
+def create_session_store(backend: str = SESSION_STORE_BACKEND) -> SessionStore:
+    """Builds the configured session store (NUMI_SESSION_STORE, defaulting to the profile store's backend)."""
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session store backend: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+session_store_instance: SessionStore = create_session_store()
@@ -0,0 +1,185 @@
+"""Shadow scoring: candidate scoring rules run on a copy of live /submit traffic.
+
+A candidate is a JSON file (NUMI_SHADOW_RULES_FILE) naming the rules it changes, e.g.
+
+    {"name": "creation-order-b", "rules": {"creation_tiebreak_order": ["Visionary", "Architect", ...],
+                                            "reverse_item_mapping": {"SR-5": "Fight"}}}
+
+(rule names are the ScoringRules fields; unnamed rules stay live). After a submission is scored
+and saved, its answers and the live Driver / Creation / Growth Edge / headline are queued for
+one background thread per worker, which rescores the answers with the candidate rules and counts
+what changed. The request never waits: a full queue drops the comparison (counted), and the
+thread sleeps after every comparison so it uses at most SHADOW_CPU_BUDGET of a core.
+
+Per-worker divergence rates, the most common live -> candidate transitions and recent samples are
+at GET /v1/ops/shadow; the counters also go to /metrics (numi_shadow_*), summed over workers.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from models import Profile, UserAnswer
+from item_bank import CompiledItemBank, ScoringRules, LIVE_RULES, item_bank_registry
+from scoring_engine import tally_codes, tally_endorsements, compute_compiled_scores, compiled_scores_to_result
+from metrics import registry as metrics_registry
+from config import SHADOW_RULES_FILE, SHADOW_SAMPLE_RATE, SHADOW_QUEUE_MAX, SHADOW_CPU_BUDGET, SHADOW_MAX_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+COMPARED_FIELDS = ("driver", "creation", "growth_edge", "headline")
+_DEFAULT_HEADLINE = "Default Headline - Check Flowprint Mapping" # as assemble_compiled_profile
+
+shadow_comparisons_total = metrics_registry.counter(
+    "numi_shadow_comparisons_total", "Shadow scoring comparisons by outcome (compared, dropped, error).", ["result"]
+)
+shadow_divergence_total = metrics_registry.counter(
+    "numi_shadow_divergence_total", "Shadow comparisons where the candidate rules changed a field.", ["field"]
+)
+
+
+def load_candidate(path: Path) -> Tuple[str, Dict[str, Any], ScoringRules]:
+    """(name, rule overrides, rules) from a candidate file; ValueError when it is malformed."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), dict):
+        raise ValueError(f"{path}: expected {{\"name\": ..., \"rules\": {{...}}}}")
+    overrides = data["rules"]
+    return str(data.get("name") or Path(path).stem), overrides, LIVE_RULES.with_overrides(overrides)
+
+
+class ShadowScorer:
+    """Compares candidate scoring rules with the live ones on sampled submissions, off the request path."""
+
+    def __init__(self, rules_file: Optional[Path] = SHADOW_RULES_FILE, sample_rate: float = SHADOW_SAMPLE_RATE,
+                 queue_max: int = SHADOW_QUEUE_MAX, cpu_budget: float = SHADOW_CPU_BUDGET, max_samples: int = SHADOW_MAX_SAMPLES):
+        self.name: Optional[str] = None
+        self.overrides: Dict[str, Any] = {}
+        self.rules: Optional[ScoringRules] = None
+        if rules_file:
+            try:
+                self.name, self.overrides, self.rules = load_candidate(Path(rules_file))
+            except (OSError, ValueError, TypeError) as e:
+                # A bad candidate must not take the service down; it just isn't shadowed
+                logger.error(f"Shadow scoring disabled: can't load candidate rules from {rules_file}: {str(e)}")
+        self.sample_rate = sample_rate
+        self.cpu_budget = min(max(cpu_budget, 0.001), 1.0)
+        self._queue: "queue.Queue[Tuple[str, CompiledItemBank, Union[bytes, List[UserAnswer]], Tuple[str, ...]]]" = queue.Queue(queue_max)
+        self._candidate_banks: Dict[Tuple[str, str], CompiledItemBank] = {} # (version, layout) -> candidate bank
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"compared": 0, "diverged": 0, "dropped": 0, "errors": 0}
+        self._changed: Counter = Counter()
+        self._transitions: Dict[str, Counter] = {field: Counter() for field in COMPARED_FIELDS}
+        self._samples: Deque[Dict[str, Any]] = deque(maxlen=max_samples)
+        self._cpu_seconds = 0.0
+        self._worker_pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rules is not None
+
+    def offer(self, user_id: str, bank: CompiledItemBank, responses: Union[bytes, List[UserAnswer]], live: Profile) -> None:
+        """Queues a scored submission for comparison; never blocks."""
+        if self.rules is None or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((user_id, bank, responses, (live.driver, live.creation, live.growth_edge, live.headline)))
+        except queue.Full:
+            with self._lock:
+                self._counters["dropped"] += 1
+            shadow_comparisons_total.inc(result="dropped")
+
+    def _candidate_bank(self, bank: CompiledItemBank) -> CompiledItemBank:
+        key = (bank.tag, bank.version)
+        candidate = self._candidate_banks.get(key)
+        if candidate is None:
+            candidate = self._candidate_banks[key] = item_bank_registry.compile_with_rules(bank.tag, self.rules)
+        return candidate
+
+    def score(self, bank: CompiledItemBank, responses: Union[bytes, List[UserAnswer]]) -> Tuple[str, ...]:
+        """(driver, creation, growth_edge, headline) of the responses under the candidate rules."""
+        candidate = self._candidate_bank(bank)
+        if isinstance(responses, (bytes, bytearray)):
+            subtype_raw, creation_item_counts = tally_codes(responses, candidate)
+        else:
+            subtype_raw, creation_item_counts = tally_endorsements(responses, candidate)
+        scores = compute_compiled_scores(subtype_raw, creation_item_counts, candidate)
+        result = compiled_scores_to_result(scores, candidate)
+        flowprint = candidate.flowprint_for(scores.creation, scores.driver)
+        return result.driver, result.creation, result.growth_edge, flowprint[0] if flowprint else _DEFAULT_HEADLINE
+
+    def compare(self, user_id: str, bank: CompiledItemBank, responses: Union[bytes, List[UserAnswer]], live: Tuple[str, ...]) -> Dict[str, Dict[str, str]]:
+        """Scores with the candidate rules and records the comparison; returns the changed fields."""
+        shadow = self.score(bank, responses)
+        changes = {field: {"live": old, "candidate": new} for field, old, new in zip(COMPARED_FIELDS, live, shadow) if old != new}
+        with self._lock:
+            self._counters["compared"] += 1
+            if changes:
+                self._counters["diverged"] += 1
+                self._samples.append({
+                    "user_id": user_id,
+                    "item_bank_version": bank.tag,
+                    "at": datetime.now(timezone.utc).isoformat(),
+                    "changes": changes,
+                })
+            for field, change in changes.items():
+                self._changed[field] += 1
+                self._transitions[field][f"{change['live']} -> {change['candidate']}"] += 1
+        shadow_comparisons_total.inc(result="compared")
+        for field in changes:
+            shadow_divergence_total.inc(field=field)
+        return changes
+
+    def _ensure_worker(self) -> None:
+        # Started lazily (and restarted after a fork), like the write-behind profile store's flusher
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        threading.Thread(target=self._run, name="shadow-scoring", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            user_id, bank, responses, live = self._queue.get()
+            started = time.thread_time()
+            try:
+                self.compare(user_id, bank, responses, live)
+            except Exception as e:
+                with self._lock:
+                    self._counters["errors"] += 1
+                shadow_comparisons_total.inc(result="error")
+                logger.error(f"Shadow scoring failed for user_id {user_id}: {str(e)}", exc_info=True)
+            spent = time.thread_time() - started
+            with self._lock:
+                self._cpu_seconds += spent
+            # Idle long enough that this thread stays within its share of a core
+            time.sleep(spent * (1 / self.cpu_budget - 1))
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            compared = self._counters["compared"]
+            return {
+                "enabled": self.enabled,
+                "candidate": {"name": self.name, "rules": self.overrides} if self.enabled else None,
+                "sample_rate": self.sample_rate,
+                "cpu_budget": self.cpu_budget,
+                **self._counters,
+                "queued": self._queue.qsize(),
+                "cpu_seconds": round(self._cpu_seconds, 3),
+                "divergence_rate": {
+                    "any": round(self._counters["diverged"] / compared, 4) if compared else None,
+                    **{field: round(self._changed[field] / compared, 4) if compared else None for field in COMPARED_FIELDS},
+                },
+                "transitions": {field: dict(counts.most_common(top)) for field, counts in self._transitions.items()},
+                "samples": list(self._samples),
+            }
+
+
+shadow_scorer = ShadowScorer()
@@ -0,0 +1,382 @@
+import asyncio
+import json
+import pstats
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from data_loader import ALL_ITEM_METADATA
+from profile_store import InMemoryProfileStore
+from idempotency import IdempotencyCache
+from profiling import RequestProfiler
+from scoring_engine import score_answers
+from models import UserAnswer
+
+TEST_API_KEY = "test-key"
+
+
+def _answers(likert: str = "Agree", scenario: str = "A"):
+    return [
+        {"slot": m.slot, "answer": scenario if m.answer_type == "Scenario" else likert}
+        for m in ALL_ITEM_METADATA
+    ]
+
+
+class ApiTestCase(unittest.TestCase):
+    """Runs the app against a fresh in-memory store with a known API key."""
+
+    def setUp(self):
+        self._original_api_key = main.API_KEY
+        main.API_KEY = TEST_API_KEY
+        self.store = InMemoryProfileStore()
+        main.app.dependency_overrides[main.get_profile_store] = lambda: self.store
+        self._original_idempotency_cache = main.idempotency_cache
+        main.idempotency_cache = IdempotencyCache()
+        self.client = TestClient(main.app)
+        self.headers = {"X-API-Key": TEST_API_KEY}
+
+    def tearDown(self):
+        main.app.dependency_overrides.clear()
+        main.idempotency_cache = self._original_idempotency_cache
+        main.API_KEY = self._original_api_key
+
+
+class TestSubmitBatch(ApiTestCase):
+
+    def test_streams_one_line_per_record_in_order(self):
+        records = [
+            {"user_id": "u1", "answers": _answers("Strongly Agree", "A")},
+            {"user_id": "u2", "answers": []},
+            {"user_id": "u3"},
+            {"user_id": "u4", "answers": _answers("Disagree", "C")},
+        ]
+        response = self.client.post("/v1/instinct-map/submit-batch", json={"records": records}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line["index"] for line in lines], [0, 1, 2, 3])
+        self.assertIn("profile", lines[0])
+        self.assertIn("error", lines[1])
+        self.assertIn("error", lines[2])
+        self.assertEqual(lines[2]["user_id"], "u3")
+
+        expected = score_answers([UserAnswer(**a) for a in records[3]["answers"]]).model_dump(mode="json")
+        got = lines[3]["profile"]
+        expected.pop("timestamp")
+        got.pop("timestamp")
+        self.assertEqual(got, expected)
+        self.assertIsNotNone(self.store.get_profile("u1"))
+        self.assertIsNotNone(self.store.get_profile("u4"))
+        self.assertIsNone(self.store.get_profile("u2"))
+
+    def test_rejects_empty_and_oversized_batches(self):
+        response = self.client.post("/v1/instinct-map/submit-batch", json={"records": []}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        original_limit = main.MAX_BATCH_SUBMISSIONS
+        main.MAX_BATCH_SUBMISSIONS = 1
+        try:
+            records = [{"user_id": "a", "answers": _answers()}, {"user_id": "b", "answers": _answers()}]
+            response = self.client.post("/v1/instinct-map/submit-batch", json={"records": records}, headers=self.headers)
+            self.assertEqual(response.status_code, 413)
+        finally:
+            main.MAX_BATCH_SUBMISSIONS = original_limit
+
+    def test_scored_through_the_bounded_queue(self):
+        records = [{"user_id": "b1", "answers": _answers()}, {"user_id": "b2", "answers": _answers("Disagree")}]
+        with patch.object(main.scoring_executor, "max_queue", -main.scoring_executor.max_workers):
+            response = self.client.post("/v1/instinct-map/submit-batch", json={"records": records}, headers=self.headers)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertIsNone(self.store.get_profile("b1"))
+
+        # Past the first chunk the stream has started: rejected records get an error line
+        run = main.scoring_executor.run
+        calls = []
+
+        async def second_call_rejected(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise main.ScoringQueueFull()
+            return await run(*args)
+
+        with patch.object(main, "BATCH_SUBMIT_CHUNK_SIZE", 1), \
+                patch.object(main.scoring_executor, "run", side_effect=second_call_rejected):
+            response = self.client.post("/v1/instinct-map/submit-batch", json={"records": records}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertIn("profile", lines[0])
+        self.assertIn("capacity", lines[1]["error"])
+        self.assertIsNone(self.store.get_profile("b2"))
+
+    def test_requires_api_key(self):
+        response = self.client.post("/v1/instinct-map/submit-batch", json={"records": []}, headers={"X-API-Key": "wrong"})
+        self.assertEqual(response.status_code, 403)
+
+
+class TestGetProfile(ApiTestCase):
+
+    def _submit(self, user_id="u1", likert="Agree"):
+        response = self.client.post(
+            "/v1/instinct-map/submit", json={"user_id": user_id, "answers": _answers(likert)}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_serves_submitted_profile_with_etag(self):
+        submitted = self._submit()
+        response = self.client.get("/v1/instinct-map/u1", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), submitted)
+        self.assertTrue(response.headers["etag"].startswith('"'))
+        self.assertIn("max-age", response.headers["cache-control"])
+
+    def test_if_none_match_returns_304(self):
+        self._submit()
+        etag = self.client.get("/v1/instinct-map/u1", headers=self.headers).headers["etag"]
+        for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            response = self.client.get("/v1/instinct-map/u1", headers=dict(self.headers, **{"If-None-Match": header}))
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response.headers["etag"], etag)
+            self.assertEqual(response.content, b"")
+        response = self.client.get("/v1/instinct-map/u1", headers=dict(self.headers, **{"If-None-Match": '"stale"'}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_when_profile_changes(self):
+        self._submit()
+        first = self.client.get("/v1/instinct-map/u1", headers=self.headers).headers["etag"]
+        self._submit(likert="Disagree")
+        second = self.client.get("/v1/instinct-map/u1", headers=self.headers).headers["etag"]
+        self.assertNotEqual(first, second)
+
+    def test_store_is_read_off_the_event_loop(self):
+        self._submit()
+        read = self.store.get_profile_json
+        loops = []
+
+        def get_profile_json(user_id):
+            loops.append(asyncio._get_running_loop())
+            return read(user_id)
+
+        with patch.object(self.store, "get_profile_json", side_effect=get_profile_json):
+            self.assertEqual(self.client.get("/v1/instinct-map/u1", headers=self.headers).status_code, 200)
+        self.assertEqual(loops, [None])
+
+    def test_profile_is_assembled_off_the_event_loop(self):
+        self._submit()
+        assemble = main.profile_assembler.profile_json
+        loops = []
+
+        def profile_json(stored, memoize=True):
+            loops.append(asyncio._get_running_loop())
+            return assemble(stored, memoize)
+
+        with patch.object(main.profile_assembler, "profile_json", side_effect=profile_json):
+            self.assertEqual(self.client.get("/v1/instinct-map/u1", headers=self.headers).status_code, 200)
+        self.assertEqual(loops, [None])
+
+    def test_missing_profile_is_404(self):
+        response = self.client.get("/v1/instinct-map/nobody", headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestCompactSubmit(ApiTestCase):
+
+    def test_compact_submit_matches_verbose_submit(self):
+        bank = self.client.get("/v2/instinct-map/item-bank", headers=self.headers).json()
+        verbose = _answers("Strongly Agree", "C")
+        by_slot = {a["slot"]: a["answer"] for a in verbose}
+        codes = ""
+        for entry in bank["slots"]:
+            answer_to_code = {answer: code for code, answer in entry["codes"].items()}
+            codes += answer_to_code[by_slot[entry["slot"]]]
+
+        compact = self.client.post(
+            "/v2/instinct-map/submit",
+            json={"user_id": "c1", "item_bank_version": bank["version"], "answers": codes},
+            headers=self.headers,
+        )
+        self.assertEqual(compact.status_code, 200)
+        expected = self.client.post("/v1/instinct-map/submit", json={"user_id": "v1", "answers": verbose}, headers=self.headers)
+        got, want = compact.json(), expected.json()
+        got.pop("timestamp")
+        want.pop("timestamp")
+        self.assertEqual(got, want)
+        self.assertIsNotNone(self.store.get_profile("c1"))
+
+    def test_compact_errors_come_back_together(self):
+        version = self.client.get("/v2/instinct-map/item-bank", headers=self.headers).json()["version"]
+        codes = "9" * 3 + "1" * (len(ALL_ITEM_METADATA) - 3)
+        response = self.client.post(
+            "/v2/instinct-map/submit", json={"user_id": "c1", "item_bank_version": version, "answers": codes}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual([e["position"] for e in response.json()["detail"]], [0, 1, 2])
+
+    def test_unknown_item_bank_version(self):
+        response = self.client.post(
+            "/v2/instinct-map/submit", json={"user_id": "c1", "item_bank_version": "nope", "answers": "1"}, headers=self.headers
+        )
+        self.assertEqual(response.status_code, 422)
+
+
+class TestSubmitAdmissionControl(ApiTestCase):
+
+    def test_full_scoring_queue_gets_503_with_retry_after(self):
+        with patch.object(main.scoring_executor, "max_queue", -main.scoring_executor.max_workers):
+            response = self.client.post("/v1/instinct-map/submit", json={"user_id": "u1", "answers": _answers()}, headers=self.headers)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertIsNone(self.store.get_profile("u1"))
+
+        # Rejections aren't cached as results: the retry is scored normally
+        retry = self.client.post("/v1/instinct-map/submit", json={"user_id": "u1", "answers": _answers()}, headers=self.headers)
+        self.assertEqual(retry.status_code, 200)
+        stats = self.client.get("/v1/ops/scoring-queue", headers=self.headers).json()
+        self.assertGreaterEqual(stats["rejected"], 1)
+        self.assertEqual(stats["in_flight"], 0)
+
+
+class TestMetricsEndpoint(ApiTestCase):
+
+    def test_reports_stage_timings_and_store_lookups(self):
+        self.client.post("/v1/instinct-map/submit", json={"user_id": "m1", "answers": _answers()}, headers=self.headers)
+        self.client.get("/v1/instinct-map/m1", headers=self.headers)
+        self.client.get("/v1/instinct-map/missing", headers=self.headers)
+
+        response = self.client.get("/metrics", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        text = response.text
+        for stage in ("request_parse", "endorsements", "instinct_metrics", "selection", "profile_assembly", "store_write", "serialization"):
+            self.assertIn(f'numi_scoring_stage_seconds_count{{stage="{stage}"}}', text)
+        self.assertIn('numi_profile_store_lookups_total{result="hit"}', text)
+        self.assertIn('numi_profile_store_lookups_total{result="miss"}', text)
+        self.assertIn('numi_http_request_duration_seconds_count{method="POST",route="/v1/instinct-map/submit",status="200"}', text)
+        self.assertIn("numi_flowprint_label_fallbacks_total", text)
+
+    def test_requires_the_api_key_or_the_scrape_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        bearer = {"Authorization": "Bearer scrape-token"}
+        self.assertEqual(self.client.get("/metrics", headers=bearer).status_code, 403)
+        with patch.object(main, "METRICS_TOKEN", "scrape-token"):
+            self.assertEqual(self.client.get("/metrics", headers=bearer).status_code, 200)
+            self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code, 403)
+
+
+class TestStartupTimings(ApiTestCase):
+
+    def test_reports_data_source_and_phases(self):
+        main.warm_up()
+        with TestClient(main.app) as client: # runs the lifespan, which records readiness
+            body = client.get("/v1/ops/startup", headers=self.headers).json()
+            metrics = client.get("/metrics", headers=self.headers).text
+        self.assertIn(body["data_source"], ("snapshot", "source files"))
+        self.assertFalse(body["preloaded"])
+        for phase in ("data_load", "app_import", "warm_up", "ready"):
+            self.assertGreaterEqual(body[f"{phase}_ms"], 0)
+            self.assertIn(f'numi_startup_seconds{{phase="{phase}"}}', metrics)
+        self.assertGreaterEqual(body["ready_ms"], body["app_import_ms"])
+
+
+class TestRequestProfiling(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._original_profiler = main.request_profiler
+        main.request_profiler = RequestProfiler(token="profile-me", sample_rate=0, capacity=2)
+
+    def tearDown(self):
+        main.request_profiler = self._original_profiler
+        super().tearDown()
+
+    def test_privileged_header_profiles_the_request(self):
+        plain = self.client.post("/v1/instinct-map/submit", json={"user_id": "p0", "answers": _answers()}, headers=self.headers)
+        self.assertNotIn("X-Profile-Id", plain.headers)
+        wrong = self.client.post("/v1/instinct-map/submit", json={"user_id": "p1", "answers": _answers()},
+                                 headers={**self.headers, "X-Profile-Request": "guess"})
+        self.assertNotIn("X-Profile-Id", wrong.headers)
+
+        response = self.client.post("/v1/instinct-map/submit", json={"user_id": "p2", "answers": _answers()},
+                                    headers={**self.headers, "X-Profile-Request": "profile-me"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["driver"], plain.json()["driver"])
+        profile_id = response.headers["X-Profile-Id"]
+
+        listing = self.client.get("/v1/ops/profiles", headers=self.headers).json()
+        self.assertEqual([p["id"] for p in listing["profiles"]], [profile_id])
+        graph = self.client.get(f"/v1/ops/profiles/{profile_id}", headers=self.headers).json()
+        functions = [f["function"] for f in graph["functions"]]
+        self.assertTrue(any("score_answers_compiled" in f for f in functions))
+        self.assertTrue(any("model_dump_json" in f for f in functions))
+        self.assertTrue(graph["edges"])
+
+        dump = self.client.get(f"/v1/ops/profiles/{profile_id}?format=pstats", headers=self.headers)
+        with tempfile.NamedTemporaryFile(suffix=".pstats") as f:
+            f.write(dump.content)
+            f.flush()
+            self.assertGreater(pstats.Stats(f.name).total_calls, 0)
+
+        self.assertEqual(self.client.get("/v1/ops/profiles/nope", headers=self.headers).status_code, 404)
+        self.assertEqual(self.client.get("/v1/ops/profiles", headers={"X-API-Key": "wrong"}).status_code, 403)
+
+
+class TestIdempotentSubmit(ApiTestCase):
+
+    def _post(self, body, **headers):
+        return self.client.post("/v1/instinct-map/submit", json=body, headers=dict(self.headers, **headers))
+
+    def test_retry_replays_without_rescoring(self):
+        body = {"user_id": "u1", "answers": _answers()}
+        first = self._post(body)
+        self.assertNotIn("idempotent-replayed", first.headers)
+        with patch.object(main, "score_answers_compiled", side_effect=AssertionError("rescored")), \
+                patch.object(self.store, "save_profile", side_effect=AssertionError("saved again")):
+            # Same answers in another order are the same submission
+            retry = self._post(dict(body, answers=list(reversed(body["answers"]))))
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.headers["idempotent-replayed"], "true")
+        self.assertEqual(retry.content, first.content)
+
+    def test_idempotency_key_scopes_replays(self):
+        first = self._post({"user_id": "u1", "answers": _answers()}, **{"Idempotency-Key": "k1"})
+        replay = self._post({"user_id": "u1", "answers": _answers()}, **{"Idempotency-Key": "k1"})
+        self.assertEqual(replay.content, first.content)
+        conflict = self._post({"user_id": "u1", "answers": _answers("Disagree")}, **{"Idempotency-Key": "k1"})
+        self.assertEqual(conflict.status_code, 422)
+
+    def test_concurrent_duplicates_score_once(self):
+        calls = []
+        cache = IdempotencyCache()
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return b"profile"
+
+        async def burst():
+            return await asyncio.gather(*(cache.run("k", "fp", compute) for _ in range(5)))
+
+        results = asyncio.run(burst())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r[0] for r in results], [b"profile"] * 5)
+        self.assertEqual(sum(1 for _, replayed in results if not replayed), 1)
+
+    def test_failed_runs_are_not_cached(self):
+        cache = IdempotencyCache()
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        async def succeeding():
+            return b"ok"
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(cache.run("k", "fp", failing))
+        self.assertEqual(asyncio.run(cache.run("k", "fp", succeeding)), (b"ok", False))
+
+
+if __name__ == '__main__':
+    unittest.main()
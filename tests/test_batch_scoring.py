@@ -0,0 +1,85 @@
+import random
+import unittest
+
+import numpy as np
+
+from models import UserAnswer
+from data_loader import ALL_ITEM_METADATA
+from config import LIKERT_SCORE_MAP, CREATION_INSTINCT_NAME
+from item_bank import get_compiled_item_bank
+from percentiles import norms_provider
+from scoring_engine import score_answers, calculate_full_profile_data, compiled_scores_to_result
+from batch_scoring import encode_answer_matrix, score_answers_batch, batch_row_profile
+
+
+def _random_answers(rng: random.Random):
+    """One answer per slot (the code matrix holds a single code per slot), some skipped or invalid."""
+    answers = []
+    for item_meta in ALL_ITEM_METADATA:
+        roll = rng.random()
+        if roll < 0.03:
+            continue
+        if roll < 0.05:
+            answers.append(UserAnswer(slot=item_meta.slot, answer="Maybe"))
+            continue
+        if item_meta.answer_type == "Scenario" and item_meta.scenario_map:
+            options = list(item_meta.scenario_map)
+        else:
+            options = list(LIKERT_SCORE_MAP)
+        answers.append(UserAnswer(slot=item_meta.slot, answer=rng.choice(options)))
+    return answers
+
+
+class TestBatchScoring(unittest.TestCase):
+
+    def setUp(self):
+        self.bank = get_compiled_item_bank()
+        norms_provider.set_tables(None)
+
+    def _assert_rows_match(self, answer_lists):
+        scores = score_answers_batch(encode_answer_matrix(answer_lists, self.bank), self.bank)
+        for i, answers in enumerate(answer_lists):
+            batch_result = compiled_scores_to_result(scores.row(i), self.bank)
+            self.assertEqual(batch_result.model_dump(), calculate_full_profile_data(answers).model_dump())
+            batch_profile = batch_row_profile(scores, i, self.bank).model_dump()
+            scalar_profile = score_answers(answers).model_dump()
+            batch_profile.pop("timestamp")
+            scalar_profile.pop("timestamp")
+            self.assertEqual(batch_profile, scalar_profile)
+
+    def test_random_rows_match_scalar_engine(self):
+        rng = random.Random(42)
+        self._assert_rows_match([_random_answers(rng) for _ in range(400)])
+
+    def test_creation_tie_rows_match_scalar_engine(self):
+        creation_slots = [m.slot for m in ALL_ITEM_METADATA if m.instinct == CREATION_INSTINCT_NAME]
+        rng = random.Random(3)
+        answer_lists = []
+        for _ in range(200):
+            endorsed = set(rng.sample(creation_slots, rng.randint(0, len(creation_slots))))
+            answer_lists.append([
+                UserAnswer(slot=m.slot, answer="Agree" if m.slot in endorsed else "Neutral")
+                for m in ALL_ITEM_METADATA
+            ])
+        self._assert_rows_match(answer_lists)
+
+    def test_empty_rows(self):
+        self._assert_rows_match([[], []])
+
+    def test_encode_decode_round_trip(self):
+        answers = _random_answers(random.Random(1))
+        codes = self.bank.encode_answers(answers)
+        valid = [a for a in answers if a.answer != "Maybe"]
+        self.assertEqual(self.bank.decode_answers(codes), valid)
+
+    def test_rejects_bad_shapes_and_codes(self):
+        with self.assertRaises(ValueError):
+            score_answers_batch(np.zeros((2, 3), dtype=np.uint8), self.bank)
+        codes = np.zeros((1, len(self.bank.slots)), dtype=np.uint8)
+        codes[0, 0] = self.bank.max_code + 1
+        with self.assertRaises(ValueError):
+            score_answers_batch(codes, self.bank)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from bench import make_inputs, compare, _creation_is_tied, build_benchmarks
+
+
+class TestBench(unittest.TestCase):
+
+    def test_inputs_are_seeded_and_cover_the_tie_path(self):
+        submissions, tied = make_inputs(samples=30, seed=3)
+        again, _ = make_inputs(samples=30, seed=3)
+        self.assertEqual(submissions, again)
+        self.assertEqual(len(submissions), 30)
+        self.assertGreaterEqual(len(tied), 20)
+        self.assertTrue(all(_creation_is_tied(answers) for answers in tied))
+
+    def test_compare_flags_only_slowdowns_past_threshold(self):
+        baseline = {"a": {"best_us": 100.0}, "b": {"best_us": 100.0}, "c": {"best_us": 100.0}}
+        current = {"a": {"best_us": 110.0}, "b": {"best_us": 130.0}, "c": {"best_us": 50.0}, "d": {"best_us": 1.0}}
+        rows = {row["name"]: row for row in compare(current, baseline, threshold=0.15)}
+        self.assertFalse(rows["a"]["regression"])
+        self.assertTrue(rows["b"]["regression"])
+        self.assertFalse(rows["c"]["regression"])
+        self.assertIsNone(rows["d"]["change"])
+
+    def test_compiled_stages_are_benchmarked(self):
+        benchmarks = build_benchmarks(samples=5, seed=3)
+        for name in ("tally_endorsements", "compute_instinct_metrics", "compute_compiled_scores",
+                     "assemble_compiled_profile", "calculate_subtype_endorsements", "score_answers"):
+            run, calls = benchmarks[name]
+            run()
+            self.assertEqual(calls, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import data_loader
+from data_snapshot import SOURCE_FILES, build_snapshot, load_snapshot, source_checksum
+
+
+class TestDataSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = self.tmp / "data.snapshot"
+
+    def test_snapshot_round_trips_the_parsed_data(self):
+        build_snapshot(self.path)
+        items, labels, glossary, subtypes = data_loader._from_snapshot(load_snapshot(self.path))
+        self.assertEqual(items, data_loader.load_assessment_questions())
+        self.assertEqual(labels, data_loader.load_flowprint_labels())
+        self.assertEqual(glossary, data_loader.load_subtype_glossary())
+        self.assertEqual(subtypes, data_loader.get_instinct_to_subtypes_map())
+
+    def test_stale_or_missing_snapshot_is_ignored(self):
+        self.assertIsNone(load_snapshot(self.tmp / "missing.snapshot"))
+        build_snapshot(self.path)
+        copies = []
+        for source in SOURCE_FILES:
+            copies.append(self.tmp / source.name)
+            shutil.copyfile(source, copies[-1])
+        self.assertIsNotNone(load_snapshot(self.path, copies))
+        with open(copies[-1], "a", encoding="utf-8") as f:
+            f.write("Energy Rhythm,New,Edited after the build\n")
+        self.assertNotEqual(source_checksum(copies), source_checksum())
+        with self.assertLogs("data_snapshot", "WARNING"):
+            self.assertIsNone(load_snapshot(self.path, copies))
+
+    def test_corrupt_snapshot_is_ignored(self):
+        self.path.write_bytes(b"not a pickle")
+        with self.assertLogs("data_snapshot", "WARNING"):
+            self.assertIsNone(load_snapshot(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import csv
+import json
+import pickle
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import main
+from config import DATA_PATH, ITEM_BANK_BASE_VERSION
+from data_loader import ALL_ITEM_METADATA, load_assessment_questions
+from item_bank import ItemBankRegistry, UnknownItemBankVersion, get_compiled_item_bank
+from scoring_engine import score_answers_compiled
+from tests.test_api import ApiTestCase, _answers
+from models import UserAnswer
+
+DATA_FILES = ("assessment_questions.csv", "scenario_mapping.json", "Flowprint_Labels.tsv", "Subtype_Glossary.csv")
+
+
+def _publish_variant(root: Path, version: str) -> None:
+    """A copy of the base item bank with relabelled Flowprints and the last question dropped."""
+    target = root / version
+    target.mkdir(parents=True)
+    for name in DATA_FILES:
+        shutil.copyfile(DATA_PATH / name, target / name)
+    with open(DATA_PATH / "Flowprint_Labels.tsv", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f, delimiter="\t"))
+    with open(target / "Flowprint_Labels.tsv", "w", encoding="utf-8", newline="") as f:
+        csv.writer(f, delimiter="\t").writerows([rows[0]] + [row[:2] + [f"{version} {row[2]}"] + row[3:] for row in rows[1:]])
+    lines = (DATA_PATH / "assessment_questions.csv").read_text(encoding="utf-8-sig").splitlines()
+    (target / "assessment_questions.csv").write_text("\n".join(lines[:-1]) + "\n", encoding="utf-8")
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        for version in ("v2", "v3"):
+            _publish_variant(self.root, version)
+        self.registry = ItemBankRegistry(self.root, ITEM_BANK_BASE_VERSION, max_cached=2, reload_interval=0)
+
+
+class TestItemBankRegistry(RegistryTestCase):
+
+    def test_versions_compile_once_and_score_with_their_own_rules(self):
+        self.assertEqual(self.registry.versions(), [ITEM_BANK_BASE_VERSION, "v2", "v3"])
+        v2 = self.registry.get("v2")
+        self.assertIs(self.registry.get("v2"), v2)
+        self.assertEqual((v2.tag, len(v2.slots)), ("v2", len(ALL_ITEM_METADATA) - 1))
+        answers = [UserAnswer(**a) for a in _answers()]
+        base_profile = score_answers_compiled(answers, self.registry.get(ITEM_BANK_BASE_VERSION))
+        self.assertEqual(score_answers_compiled(answers, v2).headline, f"v2 {base_profile.headline}")
+        self.assertIs(self.registry.resolve(v2.version), v2) # by layout id
+
+    def test_layout_ids_resolve_without_a_prior_compile(self):
+        layout = self.registry.get("v2").version
+        fresh = ItemBankRegistry(self.root, ITEM_BANK_BASE_VERSION, max_cached=2, reload_interval=0)
+        self.assertEqual(fresh.resolve(layout).tag, "v2") # v3 shares the layout; the first version wins
+        with self.assertRaises(UnknownItemBankVersion):
+            fresh.resolve("0123456789ab")
+
+    def test_only_base_data_stays_cached_in_the_loaders(self):
+        self.assertIs(load_assessment_questions(), load_assessment_questions())
+        self.assertIsNot(load_assessment_questions(self.root / "v2"), load_assessment_questions(self.root / "v2"))
+
+    def test_unknown_and_unsafe_versions_are_rejected(self):
+        for version in ("v9", "../data", ""):
+            with self.assertRaises(UnknownItemBankVersion):
+                self.registry.get(version)
+
+    def test_cache_is_bounded_and_keeps_the_current_version(self):
+        current = self.registry.current()
+        self.registry.get("v2")
+        self.registry.get("v3")
+        self.assertEqual(self.registry.stats()["cached"], [ITEM_BANK_BASE_VERSION, "v3"])
+        self.assertEqual(self.registry.evicted, 1)
+        self.assertIs(self.registry.current(), current)
+
+    def test_activate_swaps_the_current_version(self):
+        before = self.registry.current()
+        self.assertEqual(self.registry.activate("v2").tag, "v2")
+        self.assertEqual((self.registry.root / "CURRENT").read_text().strip(), "v2")
+        self.assertEqual(self.registry.current().tag, "v2")
+        with self.assertRaises(UnknownItemBankVersion):
+            self.registry.activate("v9")
+        self.assertEqual(self.registry.current().tag, "v2")
+        # Another worker sees the switch through the CURRENT file
+        other = ItemBankRegistry(self.root, ITEM_BANK_BASE_VERSION, reload_interval=0)
+        self.assertEqual(other.current().tag, "v2")
+        self.assertIsNot(self.registry.current(), before)
+
+    def test_bad_current_file_falls_back_to_the_default_version(self):
+        (self.root / "CURRENT").write_text("v9\n")
+        with self.assertLogs("item_bank", "ERROR"):
+            self.assertEqual(self.registry.current().tag, ITEM_BANK_BASE_VERSION)
+
+    def test_banks_pickle_as_references(self):
+        bank = get_compiled_item_bank()
+        self.assertIs(pickle.loads(pickle.dumps(bank)), bank)
+
+
+class TestVersionedSubmit(ApiTestCase, RegistryTestCase):
+
+    def setUp(self):
+        ApiTestCase.setUp(self)
+        RegistryTestCase.setUp(self)
+        patcher = patch.object(main, "item_bank_registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_submissions_score_against_the_version_they_name(self):
+        current = self.client.post("/v1/instinct-map/submit", json={"user_id": "u1", "answers": _answers()}, headers=self.headers)
+        named = self.client.post(
+            "/v1/instinct-map/submit", json={"user_id": "u2", "answers": _answers(), "item_bank_version": "v2"}, headers=self.headers
+        )
+        self.assertEqual(named.status_code, 200)
+        self.assertEqual(named.json()["headline"], f"v2 {current.json()['headline']}")
+
+        unknown = self.client.post(
+            "/v1/instinct-map/submit", json={"user_id": "u3", "answers": _answers(), "item_bank_version": "v9"}, headers=self.headers
+        )
+        self.assertEqual(unknown.status_code, 422)
+
+        layout = self.client.get("/v2/instinct-map/item-bank", params={"version": "v2"}, headers=self.headers).json()
+        self.assertEqual((layout["tag"], len(layout["slots"])), ("v2", len(ALL_ITEM_METADATA) - 1))
+
+    def test_batch_records_group_by_version(self):
+        records = [
+            {"user_id": "b1", "answers": _answers()},
+            {"user_id": "b2", "answers": _answers(), "item_bank_version": "v3"},
+            {"user_id": "b3", "answers": _answers(), "item_bank_version": "v9"},
+        ]
+        response = self.client.post("/v1/instinct-map/submit-batch", json={"records": records}, headers=self.headers)
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(lines[1]["profile"]["headline"], f"v3 {lines[0]['profile']['headline']}")
+        self.assertIn("v9", lines[2]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import asyncio
+import unittest
+
+import httpx
+
+import main
+from profile_store import InMemoryProfileStore
+from idempotency import IdempotencyCache
+from loadtest import load_submissions, run_load, summarize, _percentile
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_percentiles_and_summary(self):
+        values = [float(v) for v in range(1, 101)]
+        self.assertEqual((_percentile(values, 50), _percentile(values, 99), _percentile(values, 100)), (50.0, 99.0, 100.0))
+        report = summarize({"a": [(0.001, 200), (0.002, 503)], "b": [(0.003, "ConnectError")]}, elapsed=1.0)
+        self.assertEqual((report["requests"], report["errors"]), (3, 2))
+        self.assertEqual(report["endpoints"]["a"]["statuses"], {"200": 1, "503": 1})
+        self.assertEqual(report["latency_ms"]["max"], 3.0)
+
+    def _run(self, submissions, total_requests, get_ratio):
+        original_key, original_cache = main.API_KEY, main.idempotency_cache
+        main.API_KEY = "k"
+        main.idempotency_cache = IdempotencyCache()
+        store = InMemoryProfileStore()
+        main.app.dependency_overrides[main.get_profile_store] = lambda: store
+
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+                return await run_load(client, submissions, total_requests, 4, get_ratio, "k", seed=2)
+
+        try:
+            return asyncio.run(go()), store
+        finally:
+            main.app.dependency_overrides.clear()
+            main.API_KEY, main.idempotency_cache = original_key, original_cache
+
+    def test_in_process_run_mixes_submits_and_gets(self):
+        report, _ = self._run(load_submissions(None, 10, seed=2), 60, 0.5)
+        self.assertEqual((report["requests"], report["errors"]), (60, 0))
+        self.assertEqual(set(report["endpoints"]), {"POST /v1/instinct-map/submit", "GET /v1/instinct-map/{user_id}"})
+
+    def test_reused_bodies_get_unique_user_ids(self):
+        report, store = self._run(load_submissions(None, 10, seed=2), 25, 0.0)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(store.stats()["entries"], 25) # every submit scored and saved, none replayed
+
+if __name__ == '__main__':
+    unittest.main()
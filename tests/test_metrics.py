@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_prometheus_text_format(self):
+        registry = MetricsRegistry(directory=None)
+        requests = registry.counter("app_requests_total", "Requests.", ["route"])
+        errors = registry.counter("app_errors_total", "Errors.")
+        latency = registry.histogram("app_latency_seconds", "Latency.", buckets=(0.01, 0.1))
+        requests.inc(route="/a")
+        requests.inc(2, route="/a")
+        for value in (0.005, 0.05, 0.5):
+            latency.observe(value)
+
+        text = registry.render()
+        self.assertIn('# TYPE app_requests_total counter\napp_requests_total{route="/a"} 3\n', text)
+        self.assertIn("app_errors_total 0\n", text)
+        self.assertIn('app_latency_seconds_bucket{le="0.01"} 1\n', text)
+        self.assertIn('app_latency_seconds_bucket{le="0.1"} 2\n', text)
+        self.assertIn('app_latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("app_latency_seconds_count 3\n", text)
+        self.assertIs(registry.counter("app_errors_total", "Errors."), errors)
+
+    def test_aggregates_snapshots_of_other_processes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = MetricsRegistry(directory=Path(tmp))
+            served = registry.counter("served_total", "Served.")
+            queue = registry.gauge("queue_depth", "Queue depth.")
+            shared = registry.gauge("shared_entries", "Shared store size.", mode="max")
+            latency = registry.histogram("latency_seconds", "Latency.", buckets=(1.0,))
+            served.inc(5)
+            queue.set(1)
+            shared.set(10)
+            latency.observe(0.5)
+
+            # Another live worker (the test runner's parent) and a worker that has exited
+            exited = subprocess.Popen([sys.executable, "-c", "pass"])
+            exited.wait()
+            other = {
+                "served_total": {"type": "counter", "help": "Served.", "labels": [], "samples": [[[], 7]]},
+                "queue_depth": {"type": "gauge", "help": "Queue depth.", "labels": [], "mode": "livesum", "samples": [[[], 2]]},
+                "shared_entries": {"type": "gauge", "help": "Shared store size.", "labels": [], "mode": "max", "samples": [[[], 12]]},
+                "latency_seconds": {"type": "histogram", "help": "Latency.", "labels": [], "buckets": [1.0], "samples": [[[], [0, 1, 2.0, 1]]]},
+            }
+            for pid in (os.getppid(), exited.pid):
+                with open(Path(tmp) / f"metrics-{pid}.json", "w") as f:
+                    json.dump(other, f)
+
+            merged = registry.collect()
+            self.assertEqual(merged["served_total"]["samples"][()], 19) # counters include exited workers
+            self.assertEqual(merged["queue_depth"]["samples"][()], 3) # gauges only count live ones
+            self.assertEqual(merged["shared_entries"]["samples"][()], 12)
+            self.assertEqual(merged["latency_seconds"]["samples"][()], [1, 2, 4.5, 3])
+
+            registry.write_snapshot()
+            self.assertTrue((Path(tmp) / f"metrics-{os.getpid()}.json").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from data_loader import ALL_ITEM_METADATA
+from config import LIKERT_SCORE_MAP
+from models import UserAnswer
+from item_bank import get_compiled_item_bank
+from scoring_engine import score_answers
+from norms import ScoreAccumulator, NormsAccumulator, build_norms, write_norms, load_norms
+
+
+def _submission(rng: random.Random, user_id: str):
+    answers = []
+    for m in ALL_ITEM_METADATA:
+        options = list(m.scenario_map) if m.answer_type == "Scenario" and m.scenario_map else list(LIKERT_SCORE_MAP)
+        answers.append({"slot": m.slot, "answer": rng.choice(options)})
+    return {"user_id": user_id, "answers": answers}
+
+
+class TestScoreAccumulator(unittest.TestCase):
+
+    def test_merged_shards_match_single_pass(self):
+        rng = np.random.default_rng(0)
+        values = rng.integers(0, 13, size=1000).astype(float)
+        whole = ScoreAccumulator()
+        whole.add_values(values)
+        left, right = ScoreAccumulator(), ScoreAccumulator()
+        left.add_values(values[:313])
+        right.add_values(values[313:])
+        left.merge(right)
+        self.assertEqual(left.count, whole.count)
+        self.assertEqual(left.histogram, whole.histogram)
+        self.assertAlmostEqual(left.mean, float(values.mean()), places=12)
+        self.assertAlmostEqual(left.sd, float(values.std(ddof=1)), places=12)
+
+    def test_round_trips_through_dict(self):
+        acc = ScoreAccumulator()
+        acc.add_values(np.array([1.0, 2.0, 2.0, 5.0]))
+        copy = ScoreAccumulator.from_dict(json.loads(json.dumps(acc.to_dict())))
+        self.assertEqual((copy.count, copy.mean, copy.m2, copy.histogram), (acc.count, acc.mean, acc.m2, acc.histogram))
+
+
+class TestBuildNorms(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        rng = random.Random(5)
+        self.submissions = [_submission(rng, f"u{i}") for i in range(60)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, rows):
+        path = self.dir / name
+        with open(path, "a") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        return path
+
+    def test_submissions_and_profiles_give_same_norms(self):
+        raw_path = self._write("raw.jsonl", self.submissions)
+        profiles = [
+            {"user_id": s["user_id"], "profile": score_answers([UserAnswer(**a) for a in s["answers"]]).model_dump(mode="json")}
+            for s in self.submissions
+        ]
+        profile_path = self._write("profiles.jsonl", profiles)
+        from_raw = build_norms([raw_path], chunk_size=7)
+        from_profiles = build_norms([profile_path], chunk_size=11)
+        self.assertEqual(from_raw.count, 60)
+        for name, acc in from_raw.subtypes.items():
+            self.assertEqual(acc.histogram, from_profiles.subtypes[name].histogram)
+            self.assertAlmostEqual(acc.mean, from_profiles.subtypes[name].mean, places=9)
+        for name, acc in from_raw.instinct_strengths.items():
+            self.assertEqual(acc.histogram, from_profiles.instinct_strengths[name].histogram)
+
+    def test_refresh_only_reads_new_lines(self):
+        path = self._write("raw.jsonl", self.submissions[:40])
+        output = self.dir / "norms.json"
+        write_norms(build_norms([path]), output)
+        self._write("raw.jsonl", self.submissions[40:])
+        refreshed = build_norms([path], base=load_norms(output))
+        write_norms(refreshed, output)
+        full = build_norms([self._write("all.jsonl", self.submissions)])
+
+        stored = load_norms(output)
+        self.assertEqual(stored.version, 2)
+        self.assertEqual(stored.count, 60)
+        for name, acc in full.subtypes.items():
+            self.assertEqual(stored.subtypes[name].histogram, acc.histogram)
+            self.assertAlmostEqual(stored.subtypes[name].sd, acc.sd, places=9)
+
+    def test_skips_malformed_lines(self):
+        path = self._write("raw.jsonl", self.submissions[:3])
+        with open(path, "a") as f:
+            f.write("garbage\n{\"user_id\": \"x\", \"answers\": []}\n")
+        norms = build_norms([path])
+        self.assertEqual(norms.count, 3)
+        self.assertEqual(norms.skipped, 2)
+
+    def test_repeated_slots_scored_like_the_api(self):
+        submission = dict(self.submissions[0])
+        first = submission["answers"][0]
+        submission["answers"] = submission["answers"] + [{"slot": first["slot"], "answer": "Strongly Disagree" if first["answer"] != "Strongly Disagree" else "Strongly Agree"}]
+        norms = build_norms([self._write("raw.jsonl", [submission])])
+        expected = score_answers([UserAnswer(**a) for a in submission["answers"]]).all_subtype_scores
+        self.assertEqual({name: list(acc.histogram) for name, acc in norms.subtypes.items()},
+                         {name: [float(expected[name])] for name in norms.subtypes})
+
+    def test_unterminated_last_record(self):
+        path = self._write("raw.jsonl", self.submissions[:2])
+        with open(path, "a") as f:
+            f.write(json.dumps(self.submissions[2])) # complete, but no trailing newline
+        self.assertEqual(build_norms([path]).count, 3)
+        with open(path, "a") as f:
+            f.write("\n" + json.dumps(self.submissions[3])[:50]) # still being appended
+        norms = build_norms([path])
+        self.assertEqual((norms.count, norms.skipped), (3, 0))
+        self.assertEqual(norms.sources[str(path.resolve())]["offset"], path.stat().st_size - 50)
+
+    def test_other_item_bank_versions_are_left_out(self):
+        rows = self.submissions[:3] + [dict(self.submissions[3], item_bank_version="v2")]
+        norms = build_norms([self._write("raw.jsonl", rows)])
+        self.assertEqual((norms.count, norms.skipped), (3, 1))
+        stored = norms.to_dict()
+        self.assertEqual((stored["item_bank_version"], stored["layout"]), (get_compiled_item_bank().tag, get_compiled_item_bank().version))
+
+
+if __name__ == '__main__':
+    unittest.main()
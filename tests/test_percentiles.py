@@ -0,0 +1,123 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from data_loader import ALL_ITEM_METADATA
+from config import LIKERT_SCORE_MAP, CLASH_Z_THRESHOLD
+from models import UserAnswer
+from data_loader import INSTINCT_TO_SUBTYPES_MAP, FLOWPRINT_LABEL_DATA
+from item_bank import CompiledItemBank, get_compiled_item_bank
+from batch_scoring import encode_answer_matrix, score_answers_batch
+from norms import NormsAccumulator
+from percentiles import NormsTables, NormsProvider, norms_provider, current_norms
+from scoring_engine import score_answers, tally_endorsements
+
+
+def _random_answers(rng: random.Random):
+    answers = []
+    for m in ALL_ITEM_METADATA:
+        options = list(m.scenario_map) if m.answer_type == "Scenario" and m.scenario_map else list(LIKERT_SCORE_MAP)
+        answers.append(UserAnswer(slot=m.slot, answer=rng.choice(options)))
+    return answers
+
+
+def _norms_dict(answer_lists, bank):
+    scores = score_answers_batch(encode_answer_matrix(answer_lists, bank), bank)
+    norms = NormsAccumulator(bank)
+    norms.add_chunk(scores.subtype_raw, scores.instinct_mean, bank)
+    return json.loads(json.dumps(norms.to_dict()))
+
+
+class TestNormsTables(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.bank = get_compiled_item_bank()
+        rng = random.Random(11)
+        cls.population = [_random_answers(rng) for _ in range(300)]
+        cls.norms = _norms_dict(cls.population, cls.bank)
+        cls.tables = NormsTables(cls.norms, cls.bank)
+
+    def tearDown(self):
+        norms_provider.set_tables(None)
+
+    def test_percentiles_match_population_ranks(self):
+        answers = self.population[0]
+        subtype_raw, _ = tally_endorsements(answers, self.bank)
+        for j, name in enumerate(self.bank.instincts):
+            start, end = self.bank.instinct_subtype_slices[j]
+            mine = sum(subtype_raw[start:end])
+            totals = [sum(tally_endorsements(a, self.bank)[0][start:end]) for a in self.population]
+            below = sum(1 for t in totals if t < mine)
+            equal = sum(1 for t in totals if t == mine)
+            self.assertEqual(self.tables.percentile(j, subtype_raw), int(round(100.0 * (below + 0.5 * equal) / len(totals))), name)
+
+    def test_clashes_follow_z_gap_rule(self):
+        stats = self.norms["subtypes"]
+        for answers in self.population[:50]:
+            subtype_raw, _ = tally_endorsements(answers, self.bank)
+            expected = []
+            for j, name in enumerate(self.bank.instincts):
+                start, end = self.bank.instinct_subtype_slices[j]
+                z = [
+                    (subtype_raw[i] - stats[self.bank.subtypes[i]]["mean"]) / stats[self.bank.subtypes[i]]["sd"]
+                    if stats[self.bank.subtypes[i]]["sd"] > 0 else 0.0
+                    for i in range(start, end)
+                ]
+                if max(z) - min(z) > CLASH_Z_THRESHOLD:
+                    expected.append(name)
+            self.assertEqual(self.tables.clashes(subtype_raw), expected)
+
+    def test_profile_uses_active_tables(self):
+        norms_provider.set_tables(self.tables)
+        profile = score_answers(self.population[3])
+        for bar in profile.instinct_bars.values():
+            self.assertIsInstance(bar["percentile"], int)
+        norms_provider.set_tables(None)
+        profile = score_answers(self.population[3])
+        self.assertTrue(all(bar["percentile"] is None for bar in profile.instinct_bars.values()))
+        self.assertEqual(profile.clashes, [])
+
+    def test_provider_hot_swaps_new_versions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "norms.json"
+            provider = NormsProvider(path, min_count=100, reload_interval=0)
+            provider.reload()
+            self.assertIsNone(provider.current())
+
+            path.write_text(json.dumps(dict(self.norms, version=1)))
+            provider.reload()
+            self.assertEqual(provider.current().version, 1)
+
+            path.write_text(json.dumps(dict(self.norms, version=2, count=50)))
+            os.utime(path, ns=(1, 1))
+            provider.reload()
+            self.assertIsNone(provider.current(), "norms below min_count are not used")
+
+            path.write_text("{ not json")
+            os.utime(path, ns=(2, 2))
+            provider.reload()
+            self.assertIsNone(provider.current())
+
+    def test_norms_stay_with_the_item_bank_version_they_describe(self):
+        self.assertEqual((self.norms["item_bank_version"], self.norms["layout"]), (self.bank.tag, self.bank.version))
+        norms_provider.set_tables(self.tables)
+        recompiled = CompiledItemBank(ALL_ITEM_METADATA, INSTINCT_TO_SUBTYPES_MAP, FLOWPRINT_LABEL_DATA, self.bank.tag)
+        self.assertIs(current_norms(recompiled), self.tables) # same version and layout, another instance
+        other = CompiledItemBank(ALL_ITEM_METADATA, INSTINCT_TO_SUBTYPES_MAP, FLOWPRINT_LABEL_DATA, "v2")
+        self.assertIsNone(current_norms(other))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "norms.json"
+            provider = NormsProvider(path, min_count=100, reload_interval=0)
+            for broken in (dict(self.norms, item_bank_version="no-such-version"), dict(self.norms, layout="000000000000")):
+                path.write_text(json.dumps(broken))
+                provider.reload()
+                self.assertIsNone(provider.current())
+
+
+if __name__ == '__main__':
+    unittest.main()
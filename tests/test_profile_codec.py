@@ -0,0 +1,85 @@
+import pickle
+import unittest
+from unittest.mock import patch
+
+from data_loader import ALL_ITEM_METADATA, INSTINCT_TO_SUBTYPES_MAP, FLOWPRINT_LABEL_DATA
+from item_bank import CompiledItemBank, LIVE_RULES, UnknownItemBankVersion, get_compiled_item_bank, item_bank_registry
+from models import UserAnswer
+from profile_codec import ProfileAssembler, decode_record, is_record, stored_form
+from profile_store import InMemoryProfileStore
+from metrics import flowprint_fallbacks_total
+from scoring_engine import score_answers_compiled
+from tests.test_api import _answers
+
+
+def _profile(likert: str = "Agree", scenario: str = "A"):
+    return score_answers_compiled([UserAnswer(**a) for a in _answers(likert, scenario)], get_compiled_item_bank())
+
+
+class TestProfileCodec(unittest.TestCase):
+
+    def test_record_round_trips_to_the_same_json(self):
+        for likert, scenario in (("Agree", "A"), ("Strongly Disagree", "B"), ("Neutral", "C")):
+            profile = _profile(likert, scenario)
+            stored = stored_form(profile)
+            self.assertTrue(is_record(stored))
+            self.assertLess(len(stored), len(profile.model_dump_json()) // 10)
+            record = decode_record(stored)
+            self.assertEqual((record.tag, record.timestamp.isoformat()), (get_compiled_item_bank().tag, profile.timestamp))
+            self.assertEqual(ProfileAssembler().profile_json(stored), profile.model_dump_json().encode("utf-8"))
+
+    def test_store_serves_assembled_profiles(self):
+        store = InMemoryProfileStore(sweep_interval=0)
+        profile = _profile()
+        store.save_profile("u1", profile)
+        self.assertEqual(store.get_profile("u1"), profile)
+        self.assertEqual(store.get_profile_json("u1"), profile.model_dump_json().encode("utf-8"))
+        self.assertEqual(pickle.loads(pickle.dumps(profile))._record, profile._record)
+
+    def test_profiles_without_a_record_are_stored_as_json(self):
+        profile = _profile().model_copy()
+        profile._record = None
+        self.assertEqual(stored_form(profile), profile.model_dump_json().encode("utf-8"))
+        self.assertEqual(ProfileAssembler().profile(profile.model_dump_json()), profile)
+        candidate_bank = CompiledItemBank(ALL_ITEM_METADATA, INSTINCT_TO_SUBTYPES_MAP, FLOWPRINT_LABEL_DATA,
+                                          rules=LIVE_RULES.with_overrides({"driver_instincts": ["Energy Rhythm"]}))
+        self.assertIsNone(score_answers_compiled([UserAnswer(**a) for a in _answers()], candidate_bank)._record)
+
+    def test_memoized_until_the_bank_changes(self):
+        assembler = ProfileAssembler()
+        profile = _profile()
+        stored = stored_form(profile)
+        assembler.profile_json(stored)
+        assembler.profile_json(stored)
+        self.assertEqual((assembler.stats()["assembled"], assembler.stats()["hits"]), (1, 1))
+
+        # Corrected Flowprint copy: every stored profile shows it on the next read, nothing is rescored
+        labels = {creation: {driver: {"headline": f"Fixed {creation} x {driver}", "signature": info.get("signature", "")}
+                             for driver, info in by_driver.items()}
+                  for creation, by_driver in FLOWPRINT_LABEL_DATA.items()}
+        fixed_bank = CompiledItemBank(ALL_ITEM_METADATA, INSTINCT_TO_SUBTYPES_MAP, labels)
+        with patch.object(item_bank_registry, "get", return_value=fixed_bank):
+            reread = assembler.profile(stored)
+        self.assertEqual(reread.headline, f"Fixed {profile.creation} x {profile.driver}")
+        self.assertEqual(reread.model_dump(exclude={"headline"}), profile.model_dump(exclude={"headline"}))
+        self.assertEqual(assembler.stats()["assembled"], 2)
+
+    def test_reassembly_does_not_count_flowprint_fallbacks_again(self):
+        unlabelled_bank = CompiledItemBank(ALL_ITEM_METADATA, INSTINCT_TO_SUBTYPES_MAP, {})
+        with patch.object(flowprint_fallbacks_total, "inc") as fallbacks, patch("builtins.print"):
+            profile = score_answers_compiled([UserAnswer(**a) for a in _answers()], unlabelled_bank)
+            self.assertEqual(fallbacks.call_count, 1)
+            with patch.object(item_bank_registry, "get", return_value=unlabelled_bank):
+                reread = ProfileAssembler().profile(stored_form(profile))
+            self.assertEqual(reread, profile)
+            self.assertEqual(fallbacks.call_count, 1)
+
+    def test_unknown_item_bank_version_reads_as_missing(self):
+        assembler = ProfileAssembler()
+        with patch.object(item_bank_registry, "get", side_effect=UnknownItemBankVersion("gone")):
+            self.assertIsNone(assembler.profile_json(stored_form(_profile())))
+        self.assertEqual(assembler.stats()["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+import multiprocessing
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from data_loader import ALL_ITEM_METADATA
+from models import UserAnswer
+from item_bank import get_compiled_item_bank
+from scoring_engine import score_answers, score_answers_compiled
+from tests.test_api import _answers
+from profile_codec import stored_form
+from profile_store import InMemoryProfileStore, SQLiteProfileStore, WriteBehindProfileStore, create_profile_store
+
+
+def _profile(likert: str = "Agree"):
+    return score_answers([
+        UserAnswer(slot=m.slot, answer="A" if m.answer_type == "Scenario" else likert)
+        for m in ALL_ITEM_METADATA
+    ])
+
+
+def _write_from_child(path: str, user_id: str) -> None:
+    SQLiteProfileStore(Path(path)).save_profile(user_id, _profile("Disagree"))
+
+
+class TestSQLiteProfileStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "profiles.sqlite3"
+        self.store = SQLiteProfileStore(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        profile = _profile()
+        self.store.save_profile("u1", profile)
+        self.assertEqual(self.store.get_profile("u1"), profile)
+        self.assertIsNone(self.store.get_profile("missing"))
+
+    def test_bulk_save_and_overwrite(self):
+        first, second = _profile("Agree"), _profile("Disagree")
+        self.store.save_profiles([("a", first), ("b", first)])
+        self.store.save_profiles([("b", second)])
+        self.assertEqual(self.store.get_profile("a"), first)
+        self.assertEqual(self.store.get_profile("b"), second)
+
+    def test_expired_rows_are_hidden_and_swept_in_batches(self):
+        store = SQLiteProfileStore(self.path, ttl=-1, expiry_batch_size=2)
+        store.save_profiles([(f"u{i}", _profile()) for i in range(5)])
+        self.assertIsNone(store.get_profile("u0"))
+        self.assertEqual(store.delete_expired(), 5)
+        self.assertEqual(store.delete_expired(), 0)
+
+    def test_stored_forms_are_kept_in_a_blob_column(self):
+        self.store.save_profile("u1", _profile())
+        columns = {row[1]: row[2] for row in self.store._connection().execute("PRAGMA table_info(profiles)")}
+        self.assertEqual(columns["stored_form"], "BLOB")
+        row = self.store._connection().execute("SELECT typeof(stored_form) FROM profiles").fetchone()
+        self.assertEqual(row[0], "blob")
+
+    def test_entry_count_is_cached_between_recounts(self):
+        store = SQLiteProfileStore(self.path, count_interval=3600)
+        store.save_profile("a", _profile())
+        self.assertEqual(store.stats()["entries"], 1)
+        store.save_profile("b", _profile())
+        self.assertEqual(store.stats()["entries"], 1)
+        self.assertEqual(SQLiteProfileStore(self.path, count_interval=0).stats()["entries"], 2)
+
+    def test_visible_across_processes(self):
+        context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        child = context.Process(target=_write_from_child, args=(str(self.path), "from-child"))
+        child.start()
+        child.join(30)
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(self.store.get_profile("from-child").driver, _profile("Disagree").driver)
+
+
+class TestInMemoryProfileStore(unittest.TestCase):
+
+    def test_round_trip_and_counters(self):
+        store = InMemoryProfileStore(sweep_interval=0)
+        profile = _profile()
+        store.save_profile("u1", profile)
+        self.assertEqual(store.get_profile("u1"), profile)
+        self.assertIsNone(store.get_profile("u2"))
+        stats = store.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+
+    def test_lru_eviction_by_entry_count(self):
+        store = InMemoryProfileStore(max_entries=2, sweep_interval=0)
+        profile = _profile()
+        store.save_profile("a", profile)
+        store.save_profile("b", profile)
+        store.get_profile("a") # "b" is now least recently used
+        store.save_profile("c", profile)
+        self.assertIsNone(store.get_profile("b"))
+        self.assertIsNotNone(store.get_profile("a"))
+        self.assertIsNotNone(store.get_profile("c"))
+        self.assertEqual(store.stats()["evictions"], 1)
+
+    def test_byte_budget(self):
+        profile = _profile()
+        one_entry = len(stored_form(profile)) + InMemoryProfileStore._ENTRY_OVERHEAD_BYTES + 5
+        store = InMemoryProfileStore(max_bytes=one_entry * 3, sweep_interval=0)
+        store.save_profiles([(f"u{i}", profile) for i in range(10)])
+        stats = store.stats()
+        self.assertEqual(stats["entries"], 3)
+        self.assertLessEqual(stats["bytes"], one_entry * 3)
+        self.assertIsNotNone(store.get_profile("u9"))
+
+    def test_overwrite_does_not_leak_bytes(self):
+        store = InMemoryProfileStore(sweep_interval=0)
+        profile = _profile()
+        store.save_profile("u", profile)
+        size = store.stats()["bytes"]
+        store.save_profile("u", profile)
+        self.assertEqual(store.stats()["bytes"], size)
+
+    def test_background_sweep_drops_expired_entries(self):
+        store = InMemoryProfileStore(ttl=0, sweep_interval=0.05)
+        try:
+            store.save_profiles([(f"u{i}", _profile()) for i in range(3)])
+            deadline = time.time() + 5
+            while store.stats()["entries"] and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(store.stats()["entries"], 0)
+            self.assertEqual(store.stats()["expirations"], 3)
+        finally:
+            store.close()
+
+
+class _FlakyStore(InMemoryProfileStore):
+    """Backing store whose writes can be switched to fail, counting batch writes."""
+
+    def __init__(self):
+        super().__init__(sweep_interval=0)
+        self.failing = False
+        self.batches = 0
+
+    def save_stored_forms(self, entries):
+        if self.failing:
+            raise OSError("disk unavailable")
+        self.batches += 1
+        super().save_stored_forms(entries)
+
+
+class TestWriteBehindProfileStore(unittest.TestCase):
+
+    def setUp(self):
+        self.backing = _FlakyStore()
+        # A long flush interval keeps the background flusher out of the way; tests flush explicitly
+        self.store = WriteBehindProfileStore(self.backing, flush_interval=3600, batch_size=2, max_pending=3)
+
+    def tearDown(self):
+        self.backing.failing = False
+        self.store.close()
+
+    def test_reads_see_pending_writes_and_flush_coalesces(self):
+        first, second = _profile("Agree"), _profile("Disagree")
+        self.store.save_profile("u1", first)
+        self.store.save_profile("u1", second)
+        self.store.save_profile("u2", first)
+        self.assertIsNone(self.backing.get_profile("u1"))
+        self.assertEqual(self.store.get_profile("u1"), second)
+        self.assertEqual(self.store.get_profile_json("u1"), second.model_dump_json().encode("utf-8"))
+
+        self.assertEqual(self.store.flush(), 2)
+        self.assertEqual(self.backing.batches, 1)
+        self.assertEqual(self.backing.get_profile("u1"), second)
+        stats = self.store.stats()
+        self.assertEqual((stats["pending"], stats["coalesced"], stats["flushed"]), (0, 1, 2))
+
+    def test_buffers_stored_forms(self):
+        profile = score_answers_compiled([UserAnswer(**a) for a in _answers()], get_compiled_item_bank())
+        self.store.save_profile("u1", profile)
+        self.assertEqual(self.store._pending["u1"][0], stored_form(profile))
+        self.assertEqual(self.store.get_profile("u1"), profile)
+        self.assertEqual(self.store.get_profile_json("u1"), profile.model_dump_json().encode("utf-8"))
+        self.store.flush()
+        self.assertEqual(self.backing.get_profile_json("u1"), profile.model_dump_json().encode("utf-8"))
+
+    def test_failed_flush_keeps_writes_and_overflow_drops_oldest(self):
+        self.backing.failing = True
+        for i in range(4):
+            self.store.save_profile(f"u{i}", _profile())
+        stats = self.store.stats()
+        self.assertEqual((stats["pending"], stats["dropped"]), (3, 1))
+        self.assertGreater(stats["flush_errors"], 0)
+        self.assertIsNone(self.store.get_profile("u0"))
+        self.assertIsNotNone(self.store.get_profile("u3"))
+
+        self.backing.failing = False
+        self.assertEqual(self.store.flush(), 3)
+        self.assertIsNotNone(self.backing.get_profile("u3"))
+
+    def test_close_flushes_pending_writes(self):
+        self.store.save_profile("u1", _profile())
+        self.store.close()
+        self.assertIsNotNone(self.backing.get_profile("u1"))
+        self.assertEqual(self.store.stats()["dropped"], 0)
+
+    def test_background_flush(self):
+        store = WriteBehindProfileStore(self.backing, flush_interval=0.01)
+        try:
+            store.save_profile("u1", _profile())
+            for _ in range(100):
+                if self.backing.get_profile("u1") is not None:
+                    break
+                time.sleep(0.01)
+            self.assertIsNotNone(self.backing.get_profile("u1"))
+        finally:
+            store.close()
+
+
+class TestCreateProfileStore(unittest.TestCase):
+
+    def test_backends(self):
+        self.assertIsInstance(create_profile_store("memory"), InMemoryProfileStore)
+        self.assertIsInstance(create_profile_store("memory", write_behind=True), WriteBehindProfileStore)
+        with self.assertRaises(ValueError):
+            create_profile_store("redis")
+
+
+if __name__ == '__main__':
+    unittest.main()
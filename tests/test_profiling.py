@@ -0,0 +1,34 @@
+import random
+import unittest
+
+from profiling import RequestProfiler, profile_call, score_and_serialize
+from scoring_engine import score_answers
+from tests.test_scoring_engine import _random_answers
+
+
+class TestRequestProfiler(unittest.TestCase):
+
+    def test_sampling_and_single_flight(self):
+        self.assertFalse(RequestProfiler(token=None, sample_rate=0).wanted("anything"))
+        self.assertTrue(RequestProfiler(token=None, sample_rate=1).wanted(None))
+        profiler = RequestProfiler(token="t", sample_rate=0)
+        self.assertTrue(profiler.wanted("t"))
+        self.assertTrue(profiler.begin())
+        self.assertFalse(profiler.begin())
+        profiler.end()
+        self.assertEqual(profiler.skipped_busy, 1)
+
+    def test_ring_buffer_keeps_newest_trimmed_profiles(self):
+        profiler = RequestProfiler(token=None, sample_rate=0, capacity=2, max_functions=10)
+        ids = []
+        for i in range(3):
+            (profile, profile_json), stats = profile_call(score_and_serialize, score_answers, _random_answers(random.Random(i)))
+            self.assertEqual(profile_json, profile.model_dump_json().encode("utf-8"))
+            ids.append(profiler.record("/v1/instinct-map/submit", f"u{i}", 0.001, stats))
+        self.assertEqual([s["id"] for s in profiler.summaries()], ids[:0:-1])
+        self.assertIsNone(profiler.get(ids[0]))
+        self.assertLessEqual(len(profiler.get(ids[2])["stats"]), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import reliability
+from item_bank import get_compiled_item_bank
+from response_archive import ResponseArchive
+from models import UserAnswer
+from reliability import CovarianceAccumulator, ReliabilityAccumulator, build_report_accumulator, cronbach_alpha
+from scoring_engine import tally_codes
+from tests.test_api import _answers
+
+
+def _respondents(n: int, seed: int = 3) -> np.ndarray:
+    """Code matrix where each instinct's Likert answers follow one latent trait; Scenarios are random."""
+    bank = get_compiled_item_bank()
+    rng = np.random.default_rng(seed)
+    trait = rng.normal(size=(n, len(bank.instincts)))
+    codes = np.zeros((n, len(bank.slots)), dtype=np.uint8)
+    for slot_idx, options in enumerate(bank.slot_options):
+        if "Agree" in options:
+            keyed = np.clip(np.rint(3 + trait[:, bank.slot_instincts[slot_idx]] + rng.normal(scale=0.8, size=n)), 1, 5)
+            codes[:, slot_idx] = 6 - keyed if bank.slot_reversed[slot_idx] else keyed
+        else:
+            codes[:, slot_idx] = rng.integers(1, len(options) + 1, size=n)
+    return codes
+
+
+def _reference_alpha(scores: np.ndarray) -> float:
+    k = scores.shape[1]
+    return k / (k - 1) * (1 - scores.var(axis=0, ddof=1).sum() / scores.sum(axis=1).var(ddof=1))
+
+
+class TestCovarianceAccumulator(unittest.TestCase):
+
+    def test_chunked_and_merged_covariance_matches_numpy(self):
+        rows = np.random.default_rng(1).normal(size=(1000, 4))
+        whole, a, b = CovarianceAccumulator(4), CovarianceAccumulator(4), CovarianceAccumulator(4)
+        whole.add_rows(rows)
+        for start in range(0, 600, 70):
+            a.add_rows(rows[start:min(start + 70, 600)])
+        b.add_rows(rows[600:])
+        a.merge(CovarianceAccumulator.from_dict(json.loads(json.dumps(b.to_dict()))))
+        for acc in (whole, a):
+            np.testing.assert_allclose(acc.covariance, np.cov(rows, rowvar=False))
+        self.assertIsNone(cronbach_alpha(np.zeros((3, 3))))
+
+
+class TestReliabilityReport(unittest.TestCase):
+
+    def test_alpha_and_item_statistics_match_a_direct_computation(self):
+        bank = get_compiled_item_bank()
+        codes = _respondents(3000)
+        codes[0, 0] = 0 # one skipped item: that respondent is left out of its instinct
+        acc = ReliabilityAccumulator(bank)
+        for start in range(0, len(codes), 700):
+            acc.add_codes(codes[start:start + 700])
+        report = acc.report()
+
+        instinct = bank.instincts[bank.slot_instincts[0]]
+        slots = [i for i in range(len(bank.slots)) if bank.slot_instincts[i] == bank.slot_instincts[0] and "Agree" in bank.slot_options[i]]
+        keyed = codes[1:, slots].astype(float)
+        keyed[:, [bank.slot_reversed[s] for s in slots]] = 6 - keyed[:, [bank.slot_reversed[s] for s in slots]]
+        summary = report["instincts"][instinct]
+        self.assertEqual(summary["n"], len(codes) - 1)
+        self.assertAlmostEqual(summary["alpha"], _reference_alpha(keyed), places=4)
+        rest = keyed[:, 1:].sum(axis=1)
+        self.assertAlmostEqual(summary["items"][bank.slots[slots[0]]]["item_total_r"], np.corrcoef(keyed[:, 0], rest)[0, 1], places=4)
+        self.assertAlmostEqual(summary["items"][bank.slots[slots[0]]]["alpha_if_deleted"], _reference_alpha(keyed[:, 1:]), places=4)
+        self.assertEqual(report["flagged"], [])
+
+    def test_unrelated_answers_are_flagged(self):
+        bank = get_compiled_item_bank()
+        rng = np.random.default_rng(5)
+        codes = np.stack([rng.integers(1, len(options) + 1, size=2000) for options in bank.slot_options], axis=1).astype(np.uint8)
+        acc = ReliabilityAccumulator(bank)
+        acc.add_codes(codes)
+        self.assertEqual(set(acc.report()["flagged"]), {name for name, i in acc.report()["instincts"].items() if i["alpha"] is not None})
+
+    def test_scenario_agreement(self):
+        bank = get_compiled_item_bank()
+        slot_idx = next(i for i, options in enumerate(bank.slot_options) if "A" in options)
+        likert_only = bytearray(bank.encode_answers(_answers_models()))
+        likert_only[slot_idx] = 0
+        subtype_raw, _ = tally_codes(bytes(likert_only), bank)
+        start, end = bank.instinct_subtype_slices[bank.slot_instincts[slot_idx]]
+        top = max(subtype_raw[start:end])
+        # One respondent per Scenario option, then the same choices without any Likert answers
+        codes = np.frombuffer(bytes(likert_only), dtype=np.uint8)[np.newaxis, :].repeat(len(bank.slot_options[slot_idx]), axis=0).copy()
+        codes[:, slot_idx] = np.arange(1, len(codes) + 1)
+        agreeing = sum(subtype_raw[bank.code_endorsements[slot_idx][code][0]] == top for code in codes[:, slot_idx])
+        acc = ReliabilityAccumulator(bank)
+        acc.add_codes(codes)
+        codes[:, :] = np.where(np.arange(len(bank.slots)) == slot_idx, codes, 0)
+        acc.add_codes(codes)
+        stats = acc.report()["instincts"][bank.instincts[bank.slot_instincts[slot_idx]]]["scenario"][bank.slots[slot_idx]]
+        self.assertEqual(stats["n"], 2 * len(codes))
+        self.assertEqual(stats["agreement"], round(agreeing / len(codes), 4))
+        self.assertGreater(agreeing, 0)
+
+
+def _answers_models():
+    return [UserAnswer(**a) for a in _answers()]
+
+
+class TestReliabilityJob(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_archive_and_jsonl_sources_merge_into_one_report(self):
+        bank = get_compiled_item_bank()
+        codes = _respondents(500)
+        archive = ResponseArchive(self.tmp / "archive", segment_records=200)
+        archive.append_many(bank, [(f"u{i}", bytes(row)) for i, row in enumerate(codes[:400])])
+        archive.close()
+        submissions = self.tmp / "submissions.jsonl"
+        with open(submissions, "w", encoding="utf-8") as f:
+            for row in codes[400:]:
+                f.write(json.dumps({"user_id": "x", "answers": [a.model_dump() for a in bank.decode_answers(bytes(row))]}) + "\n")
+            f.write("not json\n")
+
+        acc = build_report_accumulator(bank.tag, self.tmp / "archive", [submissions], workers=2)
+        direct = ReliabilityAccumulator(bank)
+        direct.add_codes(codes)
+        self.assertEqual((acc.respondents, acc.skipped, len(acc.sources)), (500, 1, 3))
+        for name, summary in direct.report()["instincts"].items():
+            self.assertEqual(acc.report()["instincts"][name]["alpha"], summary["alpha"])
+
+        output = self.tmp / "reliability.json"
+        reliability.main(["build", "--archive", str(self.tmp / "archive"), "--workers", "1", "-o", str(output)])
+        reliability.main(["merge", str(output), str(output), "-o", str(self.tmp / "twice.json")])
+        twice = json.loads((self.tmp / "twice.json").read_text())
+        self.assertEqual(twice["respondents"], 800)
+
+
+if __name__ == "__main__":
+    unittest.main()
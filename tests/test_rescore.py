@@ -0,0 +1,83 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from data_loader import ALL_ITEM_METADATA
+from models import UserAnswer
+from scoring_engine import score_answers
+from rescore import rescore_file
+
+
+def _submission(user_id: str, likert: str):
+    answers = [
+        {"slot": m.slot, "answer": "B" if m.answer_type == "Scenario" else likert}
+        for m in ALL_ITEM_METADATA
+    ]
+    return {"user_id": user_id, "answers": answers}
+
+
+class TestRescore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        likerts = ["Strongly Agree", "Agree", "Neutral", "Disagree", "Strongly Disagree"]
+        self.submissions = [_submission(f"user-{i}", likerts[i % len(likerts)]) for i in range(23)]
+        lines = [json.dumps(s) for s in self.submissions]
+        lines.insert(5, "not json")
+        lines.insert(9, "")
+        self.input = self.dir / "submissions.jsonl"
+        self.input.write_text("\n".join(lines) + "\n")
+        self.output = self.dir / "profiles.jsonl"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read_output(self):
+        return [json.loads(line) for line in self.output.read_text().splitlines()]
+
+    def test_rescores_in_input_order(self):
+        checkpoint = rescore_file(self.input, self.output, workers=2, chunk_size=4, progress_every=0)
+        self.assertEqual(checkpoint["records"], 24)
+        self.assertEqual(checkpoint["errors"], 1)
+        results = self._read_output()
+        self.assertEqual(results[5]["line"], 6)
+        self.assertIn("error", results[5])
+        profiles = [r for r in results if "profile" in r]
+        self.assertEqual([r["user_id"] for r in profiles], [s["user_id"] for s in self.submissions])
+        expected = score_answers([UserAnswer(**a) for a in self.submissions[7]["answers"]]).model_dump(mode="json")
+        expected.pop("timestamp")
+        got = profiles[7]["profile"]
+        got.pop("timestamp")
+        self.assertEqual(got, expected)
+
+    def test_resume_continues_from_checkpoint(self):
+        full = rescore_file(self.input, self.output, workers=1, chunk_size=4, progress_every=0)
+        expected_ids = [r["user_id"] for r in self._read_output()]
+
+        # Simulate a crash after the second chunk: rewind the checkpoint and leave a torn line behind
+        partial_output = self.dir / "partial.jsonl"
+        rescore_file(self.input, partial_output, workers=1, chunk_size=4, progress_every=0)
+        checkpoint_path = self.dir / "partial.jsonl.offset"
+        lines = partial_output.read_bytes().splitlines(keepends=True)
+        kept = b"".join(lines[:8])
+        partial_output.write_bytes(kept + b'{"user_id": "torn')
+        with open(self.input, "rb") as f:
+            input_lines = f.readlines()
+        checkpoint = {
+            "input_offset": sum(len(l) for l in input_lines[:8]), # the first two chunks of 4
+            "output_offset": len(kept),
+            "lines": 8,
+            "records": 8,
+            "errors": 1,
+        }
+        checkpoint_path.write_text(json.dumps(checkpoint))
+
+        resumed = rescore_file(self.input, partial_output, workers=2, chunk_size=4, resume=True, progress_every=0)
+        self.assertEqual(resumed["records"], full["records"])
+        self.assertEqual([json.loads(l)["user_id"] for l in partial_output.read_text().splitlines()], expected_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+import main
+from item_bank import get_compiled_item_bank
+from models import UserAnswer
+from response_archive import ResponseArchive, Segment, iter_segments, user_hash
+from tests.test_api import ApiTestCase, _answers
+from tests.test_item_bank import RegistryTestCase
+
+
+class ArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.archive = ResponseArchive(self.directory, segment_records=3, flush_interval=60)
+        self.addCleanup(self.archive.close)
+
+
+class TestResponseArchive(ArchiveTestCase):
+
+    def test_records_round_trip_through_segments(self):
+        bank = get_compiled_item_bank()
+        answers = [UserAnswer(**a) for a in _answers()]
+        self.archive.append("u0", bank, answers)
+        self.archive.append_many(bank, [(f"u{i}", bank.encode_answers(answers)) for i in range(1, 5)])
+        self.assertEqual(self.archive.flush(), 5)
+
+        segments = list(iter_segments(self.directory, bank.tag))
+        self.assertEqual([len(segment) for segment in segments], [3, 2]) # rolled over at capacity
+        records = np.concatenate([segment.records for segment in segments])
+        self.assertEqual(records["codes"].shape, (5, len(bank.slots)))
+        self.assertTrue((records["codes"] == np.frombuffer(bytes(bank.encode_answers(answers)), dtype=np.uint8)).all())
+        self.assertEqual(records["user_hash"][0], user_hash("u0"))
+        self.assertEqual((segments[0].item_bank_version, segments[0].layout), (bank.tag, bank.version))
+        self.assertIsInstance(segments[0].records, np.memmap)
+        self.assertEqual(self.archive.stats()["written"], 5)
+
+    def test_readers_see_only_committed_records(self):
+        bank = get_compiled_item_bank()
+        self.archive.append("u1", bank, bytes(len(bank.slots)))
+        self.archive.flush()
+        path = next(iter_segments(self.directory)).path
+        self.assertEqual(path.stat().st_size, 4096 + 3 * (16 + len(bank.slots))) # preallocated
+        self.assertEqual(len(Segment(path)), 1)
+
+    def test_bad_records_are_dropped_without_wedging_the_queue(self):
+        bank = get_compiled_item_bank()
+        self.archive.append("short", bank, b"\x01")
+        with self.assertLogs("response_archive", "ERROR"):
+            self.assertEqual(self.archive.flush(), 0)
+        self.archive.append("u1", bank, bytes(len(bank.slots)))
+        self.assertEqual(self.archive.flush(), 1)
+        self.assertEqual(self.archive.stats()["dropped"], 1)
+
+    def test_disabled_archive_writes_nothing(self):
+        archive = ResponseArchive(None)
+        archive.append("u1", get_compiled_item_bank(), b"")
+        self.assertEqual((archive.flush(), archive.stats()["queued"]), (0, 0))
+
+
+class TestArchivedSubmissions(ApiTestCase, RegistryTestCase, ArchiveTestCase):
+
+    def setUp(self):
+        ApiTestCase.setUp(self)
+        RegistryTestCase.setUp(self)
+        ArchiveTestCase.setUp(self)
+        for target, value in (("item_bank_registry", self.registry), ("response_archive", self.archive)):
+            patcher = patch.object(main, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_every_scored_submission_is_archived_under_its_version(self):
+        bank = get_compiled_item_bank()
+        codes = bank.encode_answers([UserAnswer(**a) for a in _answers()])
+        self.client.post("/v1/instinct-map/submit", json={"user_id": "u1", "answers": _answers()}, headers=self.headers)
+        self.client.post("/v2/instinct-map/submit", headers=self.headers,
+                         json={"user_id": "u2", "item_bank_version": bank.tag, "answers": "".join(map(str, codes))})
+        self.client.post("/v1/instinct-map/submit-batch", headers=self.headers, json={"records": [
+            {"user_id": "u3", "answers": _answers()}, {"user_id": "u4", "answers": _answers(), "item_bank_version": "v2"},
+        ]})
+        # A replayed retry was scored once, so it is archived once
+        self.client.post("/v1/instinct-map/submit", json={"user_id": "u1", "answers": _answers()}, headers=self.headers)
+        self.archive.flush()
+
+        base = np.concatenate([segment.records for segment in iter_segments(self.directory, bank.tag)])
+        self.assertEqual(list(base["user_hash"]), [user_hash(u) for u in ("u1", "u2", "u3")])
+        self.assertTrue((base["codes"] == np.frombuffer(bytes(codes), dtype=np.uint8)).all())
+        (v2,) = iter_segments(self.directory, "v2")
+        self.assertEqual((len(v2), v2.records["codes"].shape[1]), (1, len(bank.slots) - 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,18 @@
+import random
 import unittest
 from typing import List, Dict
 
 from models import UserAnswer, Profile
-from scoring_engine import score_answers # Main function to test
+from scoring_engine import (
+    score_answers, # Main function to test
+    calculate_full_profile_data,
+    assemble_final_profile,
+    tally_endorsements,
+    compute_compiled_scores,
+    compiled_scores_to_result
+)
+from item_bank import get_compiled_item_bank
+from percentiles import norms_provider
 from data_loader import ALL_ITEM_METADATA # To get all possible slots for generating test answers
 from config import LIKERT_SCORE_MAP, REVERSE_ITEM_MAPPING, ALL_INSTINCTS, CREATION_INSTINCT_NAME
 from data_loader import INSTINCT_TO_SUBTYPES_MAP
@@ -113,5 +123,80 @@ class TestScoringEngine(unittest.TestCase):
     # - Edge cases: empty answers list (though API layer should catch this)
     # - Test dominant subtype selection logic
 
+def _random_answers(rng: random.Random) -> List[UserAnswer]:
+    """Random answers per slot, occasionally with junk, missing or repeated slots."""
+    likert_options = list(LIKERT_SCORE_MAP.keys())
+    answers: List[UserAnswer] = []
+    for item_meta in ALL_ITEM_METADATA:
+        roll = rng.random()
+        if roll < 0.02:
+            continue # skipped item
+        if roll < 0.04:
+            answers.append(UserAnswer(slot=item_meta.slot, answer="Maybe")) # not a valid option
+            continue
+        if item_meta.answer_type == "Scenario" and item_meta.scenario_map:
+            options = list(item_meta.scenario_map.keys())
+        else:
+            # Skewed toward the agree end, like real responses
+            options = likert_options + ["Agree", "Strongly Agree"]
+        answers.append(UserAnswer(slot=item_meta.slot, answer=rng.choice(options)))
+        if roll > 0.99:
+            answers.append(answers[-1]) # duplicate submission of the same slot
+    if rng.random() < 0.05:
+        answers.append(UserAnswer(slot="XX-1", answer="Agree")) # unknown slot
+    return answers
+
+
+class TestCompiledScoringParity(unittest.TestCase):
+    """Differential test: the compiled request path must match the reference implementation exactly."""
+
+    def setUp(self):
+        norms_provider.set_tables(None) # the reference path is v1 (no percentiles / clashes)
+
+    def _assert_parity(self, answers: List[UserAnswer]):
+        reference_result = calculate_full_profile_data(answers)
+        bank = get_compiled_item_bank()
+        subtype_raw, creation_item_counts = tally_endorsements(answers, bank)
+        compiled_result = compiled_scores_to_result(
+            compute_compiled_scores(subtype_raw, creation_item_counts, bank), bank
+        )
+        self.assertEqual(compiled_result.model_dump(), reference_result.model_dump())
+
+        reference_profile = assemble_final_profile(reference_result).model_dump()
+        compiled_profile = score_answers(answers).model_dump()
+        reference_profile.pop("timestamp")
+        compiled_profile.pop("timestamp")
+        self.assertEqual(compiled_profile, reference_profile)
+        # Key order matters for the serialized JSON contract
+        self.assertEqual(list(compiled_profile["all_subtype_scores"]), list(reference_profile["all_subtype_scores"]))
+
+    def test_random_answer_sets(self):
+        rng = random.Random(20250602)
+        for _ in range(500):
+            self._assert_parity(_random_answers(rng))
+
+    def test_uniform_answer_sets(self):
+        for likert in LIKERT_SCORE_MAP:
+            for scenario_key in "ABCD":
+                self._assert_parity([
+                    UserAnswer(slot=m.slot, answer=scenario_key if m.answer_type == "Scenario" else likert)
+                    for m in ALL_ITEM_METADATA
+                ])
+
+    def test_empty_answers(self):
+        self._assert_parity([])
+
+    def test_creation_ties(self):
+        """Every subset of Creation items endorsed, covering the endorsed-item and order tie-breaks."""
+        creation_slots = [m.slot for m in ALL_ITEM_METADATA if m.instinct == CREATION_INSTINCT_NAME]
+        rng = random.Random(7)
+        for _ in range(200):
+            endorsed = set(rng.sample(creation_slots, rng.randint(0, len(creation_slots))))
+            self._assert_parity([
+                UserAnswer(slot=m.slot, answer="Agree" if m.slot in endorsed else "Neutral")
+                for m in ALL_ITEM_METADATA
+            ])
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,73 @@
+import asyncio
+import pickle
+import threading
+import unittest
+
+from data_loader import ALL_ITEM_METADATA
+from models import UserAnswer
+from item_bank import get_compiled_item_bank
+from scoring_engine import score_answers, score_codes
+from scoring_executor import ScoringExecutor, ScoringQueueFull
+
+
+def _answers():
+    return [UserAnswer(slot=m.slot, answer="A" if m.answer_type == "Scenario" else "Agree") for m in ALL_ITEM_METADATA]
+
+
+class TestScoringExecutor(unittest.TestCase):
+
+    def test_runs_scoring_off_the_event_loop_thread(self):
+        executor = ScoringExecutor("thread", max_workers=1, max_queue=1)
+        loop_thread = threading.get_ident()
+
+        async def go():
+            return await executor.run(threading.get_ident)
+
+        self.assertNotEqual(asyncio.run(go()), loop_thread)
+        stats = executor.stats()
+        self.assertEqual((stats["submitted"], stats["in_flight"], stats["rejected"]), (1, 0, 0))
+        executor.shutdown()
+
+    def test_rejects_once_workers_and_queue_are_full(self):
+        executor = ScoringExecutor("thread", max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def go():
+            running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            self.assertEqual(executor.queue_depth, 1)
+            with self.assertRaises(ScoringQueueFull):
+                await executor.run(release.wait)
+            release.set()
+            await asyncio.gather(*running)
+
+        asyncio.run(go())
+        stats = executor.stats()
+        self.assertEqual((stats["submitted"], stats["rejected"], stats["queue_depth"]), (2, 1, 0))
+        self.assertGreater(stats["queue_wait_ms_max"], 0)
+        executor.shutdown()
+
+    def test_process_pool_scores_identically(self):
+        bank = get_compiled_item_bank()
+        # The bank pickles as a reference to the receiving process's compiled copy
+        self.assertIs(pickle.loads(pickle.dumps(bank)), bank)
+        executor = ScoringExecutor("process", max_workers=1, max_queue=4)
+        answers = _answers()
+
+        async def go():
+            return await asyncio.gather(
+                executor.run(score_answers, answers),
+                executor.run(score_codes, bytes(bank.encode_answers(answers)), bank),
+            )
+
+        try:
+            by_answers, by_codes = asyncio.run(go())
+        finally:
+            executor.shutdown()
+        expected = score_answers(answers).model_dump(exclude={"timestamp"})
+        self.assertEqual(by_answers.model_dump(exclude={"timestamp"}), expected)
+        self.assertEqual(by_codes.model_dump(exclude={"timestamp"}), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
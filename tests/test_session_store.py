@@ -0,0 +1,197 @@
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import main
+from item_bank import get_compiled_item_bank
+from models import UserAnswer
+from scoring_engine import score_answers_compiled, tally_codes
+from session_store import AssessmentSession, InMemorySessionStore, SQLiteSessionStore
+from tests.test_api import ApiTestCase, _answers
+
+
+def _random_changes(bank, count, rng):
+    changes = []
+    for _ in range(count):
+        slot_idx = rng.randrange(len(bank.slots))
+        changes.append((slot_idx, rng.randrange(len(bank.slot_options[slot_idx]) + 1)))
+    return changes
+
+
+class TestAssessmentSession(unittest.TestCase):
+
+    def test_running_counters_match_a_full_tally_after_changed_answers(self):
+        bank = get_compiled_item_bank()
+        rng = random.Random(7)
+        session = AssessmentSession.start("s", "u", bank)
+        for _ in range(20):
+            session.apply(_random_changes(bank, 15, rng), bank)
+            subtype_raw, creation_item_counts = tally_codes(bytes(session.codes), bank)
+            self.assertEqual(list(session.subtype_raw), subtype_raw)
+            self.assertEqual(list(session.creation_item_counts), creation_item_counts)
+            self.assertEqual(session.answered, sum(1 for code in session.codes if code))
+
+    def test_resaving_the_same_answer_changes_nothing(self):
+        bank = get_compiled_item_bank()
+        session = AssessmentSession.start("s", "u", bank)
+        self.assertEqual(session.apply([(0, 1)], bank), 1)
+        self.assertEqual(session.apply([(0, 1)], bank), 0)
+        self.assertEqual(session.answered, 1)
+
+
+class SessionStoreContract:
+    """Behaviour every session store shares; subclasses build `self.store` with a 60s TTL."""
+
+    def _start(self, session_id="s1"):
+        session = AssessmentSession.start(session_id, "u1", get_compiled_item_bank())
+        self.store.create(session)
+        return session
+
+    def test_update_saves_the_change(self):
+        bank = get_compiled_item_bank()
+        self._start()
+        session, changed = self.store.update("s1", lambda s: s.apply([(0, 1), (1, 2)], bank))
+        self.assertEqual((changed, session.answered), (2, 2))
+        stored = self.store.get("s1")
+        self.assertEqual((bytes(stored.codes[:2]), list(stored.subtype_raw)), (b"\x01\x02", list(session.subtype_raw)))
+
+    def test_failed_update_leaves_the_session_untouched(self):
+        bank = get_compiled_item_bank()
+        self._start()
+
+        def fail(session):
+            session.apply([(0, 1)], bank)
+            raise ValueError("rejected")
+
+        with self.assertRaises(ValueError):
+            self.store.update("s1", fail)
+        self.assertEqual(self.store.get("s1").answered, 0)
+
+    def test_missing_and_expired_sessions(self):
+        self.assertIsNone(self.store.get("nope"))
+        self.assertEqual(self.store.update("nope", lambda s: None), (None, None))
+        self.store._ttl = -1
+        self._start("old")
+        self.assertIsNone(self.store.get("old"))
+
+
+class TestInMemorySessionStore(SessionStoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.store = InMemorySessionStore(ttl=60, max_entries=2)
+
+    def test_least_recently_changed_sessions_are_evicted(self):
+        for session_id in ("a", "b"):
+            self._start(session_id)
+        self.store.update("a", lambda s: None)
+        self._start("c")
+        self.assertIsNone(self.store.get("b"))
+        self.assertIsNotNone(self.store.get("a"))
+        self.assertEqual(self.store.stats()["evictions"], 1)
+
+
+class TestSQLiteSessionStore(SessionStoreContract, unittest.TestCase):
+
+    def setUp(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        self.store = SQLiteSessionStore(tmp / "sessions.sqlite3", ttl=60, sweep_interval=0)
+
+    def test_expired_sessions_are_swept(self):
+        self.store._ttl = -1
+        self._start("old")
+        self.store._ttl = 60
+        time.sleep(0.001)
+        self._start("new")
+        self.assertEqual(self.store._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0], 1)
+
+
+class TestSessionApi(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sessions = InMemorySessionStore()
+        main.app.dependency_overrides[main.get_session_store] = lambda: self.sessions
+
+    def _start(self):
+        response = self.client.post("/v1/instinct-map/sessions", json={"user_id": "u1"}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        return response.json()["session_id"]
+
+    def _save(self, session_id, answers, **params):
+        return self.client.post(
+            f"/v1/instinct-map/sessions/{session_id}/answers", json={"answers": answers}, params=params, headers=self.headers
+        )
+
+    def test_finalized_session_scores_like_a_full_submit(self):
+        session_id = self._start()
+        answers = _answers()
+        # Answer everything "Disagree"/"B" first, then change every answer in packs of five
+        self._save(session_id, _answers("Disagree", "B"))
+        for start in range(0, len(answers), 5):
+            progress = self._save(session_id, answers[start:start + 5], provisional="true").json()
+        self.assertEqual((progress["answered"], progress["complete"]), (len(answers), True))
+
+        finalized = self.client.post(f"/v1/instinct-map/sessions/{session_id}/finalize", headers=self.headers)
+        expected = score_answers_compiled([UserAnswer(**a) for a in answers], get_compiled_item_bank()).model_dump(mode="json")
+        self.assertEqual(finalized.status_code, 200)
+        profile = finalized.json()
+        self.assertEqual(self.client.get("/v1/instinct-map/u1", headers=self.headers).json(), profile)
+        for scored in (expected, progress["provisional_profile"], profile):
+            scored.pop("timestamp")
+        self.assertEqual(profile, expected)
+        self.assertEqual(progress["provisional_profile"], profile)
+
+        self.assertEqual(self._save(session_id, answers[:1]).status_code, 409)
+        again = self.client.post(f"/v1/instinct-map/sessions/{session_id}/finalize", headers=self.headers).json()
+        again.pop("timestamp")
+        self.assertEqual(again, profile)
+
+    def test_retried_finalize_archives_once(self):
+        session_id = self._start()
+        self._save(session_id, _answers())
+        with patch.object(main.response_archive, "append") as append:
+            for _ in range(3):
+                self.assertEqual(self.client.post(f"/v1/instinct-map/sessions/{session_id}/finalize", headers=self.headers).status_code, 200)
+        self.assertEqual(append.call_count, 1)
+
+    def test_finalize_goes_through_the_bounded_scoring_queue(self):
+        session_id = self._start()
+        self._save(session_id, _answers())
+        with patch.object(main.response_archive, "append") as append:
+            with patch.object(main.scoring_executor, "max_queue", -main.scoring_executor.max_workers):
+                response = self.client.post(f"/v1/instinct-map/sessions/{session_id}/finalize", headers=self.headers)
+            self.assertEqual(response.status_code, 503)
+            self.assertIn("Retry-After", response.headers)
+            self.assertIsNone(self.store.get_profile("u1"))
+            retry = self.client.post(f"/v1/instinct-map/sessions/{session_id}/finalize", headers=self.headers)
+        self.assertEqual(retry.status_code, 200)
+        self.assertIsNotNone(self.store.get_profile("u1"))
+        self.assertEqual(append.call_count, 1)
+
+    def test_resume_returns_the_saved_answers(self):
+        session_id = self._start()
+        self._save(session_id, _answers()[:3])
+        view = self.client.get(f"/v1/instinct-map/sessions/{session_id}", headers=self.headers).json()
+        self.assertEqual((view["answered"], view["finalized"]), (3, False))
+        self.assertEqual(view["answers"], _answers()[:3])
+
+    def test_invalid_answers_are_rejected_without_saving(self):
+        session_id = self._start()
+        response = self._save(session_id, [_answers()[0], {"slot": "XX-1", "answer": "Agree"}])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["detail"][0]["position"], 1)
+        self.assertEqual(self.client.get(f"/v1/instinct-map/sessions/{session_id}", headers=self.headers).json()["answered"], 0)
+
+    def test_unknown_session_and_empty_finalize(self):
+        self.assertEqual(self._save("nope", _answers()[:1]).status_code, 404)
+        session_id = self._start()
+        self.assertEqual(self.client.post(f"/v1/instinct-map/sessions/{session_id}/finalize", headers=self.headers).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import main
+from config import CREATION_SUBTYPE_TIEBREAK_ORDER
+from item_bank import LIVE_RULES, get_compiled_item_bank
+from scoring_engine import score_codes
+from shadow_scoring import ShadowScorer
+from tests.test_api import ApiTestCase, _answers
+
+
+def _random_codes(count: int, seed: int = 11):
+    bank = get_compiled_item_bank()
+    rng = random.Random(seed)
+    return [bytes(rng.randint(1, len(options)) for options in bank.slot_options) for _ in range(count)]
+
+
+def _live(codes: bytes):
+    profile = score_codes(codes, get_compiled_item_bank())
+    return profile.driver, profile.creation, profile.growth_edge, profile.headline
+
+
+class ShadowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def _scorer(self, rules, **kwargs) -> ShadowScorer:
+        path = self.tmp / "candidate.json"
+        path.write_text(json.dumps({"name": "candidate", "rules": rules}))
+        return ShadowScorer(path, **kwargs)
+
+
+class TestShadowScorer(ShadowTestCase):
+
+    def test_rules_overrides(self):
+        rules = LIVE_RULES.with_overrides({"reverse_item_mapping": {"SR-5": "Fight"}, "driver_instincts": ["Input Style"]})
+        self.assertEqual(dict(rules.reverse_item_mapping)["SR-5"], "Fight")
+        self.assertEqual(dict(rules.reverse_item_mapping)["ER-5"], "Steady")
+        self.assertEqual(rules.driver_instincts, ("Input Style",))
+        with self.assertRaises(ValueError):
+            LIVE_RULES.with_overrides({"headline_font": "serif"})
+
+    def test_unchanged_rules_never_diverge(self):
+        scorer = self._scorer({})
+        for codes in _random_codes(200):
+            self.assertEqual(scorer.compare("u", get_compiled_item_bank(), codes, _live(codes)), {})
+        self.assertEqual((scorer.stats()["compared"], scorer.stats()["divergence_rate"]["any"]), (200, 0.0))
+
+    def test_changed_tiebreak_order_is_reported_with_samples(self):
+        scorer = self._scorer({"creation_tiebreak_order": list(reversed(CREATION_SUBTYPE_TIEBREAK_ORDER))}, max_samples=5)
+        for codes in _random_codes(300):
+            scorer.compare("u", get_compiled_item_bank(), codes, _live(codes))
+        stats = scorer.stats()
+        self.assertGreater(stats["divergence_rate"]["creation"], 0)
+        self.assertEqual(stats["divergence_rate"]["driver"], 0)
+        self.assertEqual(len(stats["samples"]), 5)
+        self.assertIn("creation", stats["samples"][-1]["changes"])
+        self.assertGreater(stats["divergence_rate"]["headline"], 0) # the Flowprint follows Creation
+        self.assertLessEqual(len(stats["transitions"]["creation"]), 10)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        scorer = self._scorer({}, queue_max=1)
+        scorer._worker_pid = os.getpid() # no worker thread: the queue never drains
+        profile = score_codes(_random_codes(1)[0], get_compiled_item_bank())
+        for _ in range(3):
+            scorer.offer("u", get_compiled_item_bank(), _random_codes(1)[0], profile)
+        self.assertEqual((scorer.stats()["queued"], scorer.stats()["dropped"]), (1, 2))
+
+    def test_bad_candidate_file_disables_shadowing(self):
+        (self.tmp / "bad.json").write_text("{\"rules\": {\"tiebreak\": []}}")
+        with self.assertLogs("shadow_scoring", "ERROR"):
+            scorer = ShadowScorer(self.tmp / "bad.json")
+        self.assertFalse(scorer.enabled)
+        self.assertFalse(ShadowScorer(None).enabled)
+
+
+class TestShadowedSubmit(ApiTestCase, ShadowTestCase):
+
+    def setUp(self):
+        ApiTestCase.setUp(self)
+        ShadowTestCase.setUp(self)
+        self.scorer = self._scorer({"growth_edge_instincts": ["Social Instinct"]}, cpu_budget=1.0)
+        patcher = patch.object(main, "shadow_scorer", self.scorer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_submissions_are_compared_in_the_background(self):
+        response = self.client.post("/v1/instinct-map/submit", json={"user_id": "u1", "answers": _answers()}, headers=self.headers)
+        deadline = time.monotonic() + 5
+        while self.scorer.stats()["compared"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = self.client.get("/v1/ops/shadow", headers=self.headers).json()
+        self.assertEqual((stats["compared"], stats["candidate"]["name"]), (1, "candidate"))
+        growth_edge = response.json()["growth_edge"]
+        self.assertEqual(stats["divergence_rate"]["growth_edge"], 0.0 if growth_edge == "Social Instinct" else 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from item_bank import get_compiled_item_bank
+from models import UserAnswer
+from profile_codec import profile_assembler
+from profile_store import SQLiteProfileStore
+from scoring_engine import score_answers_compiled
+from tests.test_api import _answers
+from warehouse_export import column_name, export_profiles, read_part, user_ids
+
+
+def _profile(likert: str = "Agree", scenario: str = "A"):
+    return score_answers_compiled([UserAnswer(**a) for a in _answers(likert, scenario)], get_compiled_item_bank())
+
+
+def _read_all(output: Path):
+    """Every exported row as (user_id, driver, Bursty score), in part order."""
+    rows = []
+    for part in sorted(output.glob("date=*/part-*"), key=lambda p: p.name):
+        columns, meta = read_part(part)
+        drivers = meta["dictionaries"]["driver"]
+        ids = user_ids(columns)
+        for i in range(meta["rows"]):
+            rows.append((ids[i], drivers[columns["driver"][i]], int(columns[column_name("subtype", "Bursty")][i])))
+    return rows
+
+
+class TestWarehouseExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.store = SQLiteProfileStore(self.tmp / "profiles.sqlite3")
+        self.output = self.tmp / "warehouse"
+
+    def test_exports_typed_columns_incrementally(self):
+        profile = _profile()
+        self.store.save_profiles((f"u{i}", profile) for i in range(5))
+        cursor = export_profiles(self.output, self.store, batch_size=2, lag_seconds=0)
+        self.assertEqual((cursor["exported"], cursor["next_part"]), (5, 3))
+        self.assertEqual(_read_all(self.output), [(f"u{i}", profile.driver, profile.all_subtype_scores["Bursty"]) for i in range(5)])
+
+        columns, meta = read_part(next(self.output.glob("date=*/part-00000000")))
+        self.assertEqual((columns["driver"].dtype, columns[column_name("strength", "Energy Rhythm")].dtype), (np.uint8, np.float32))
+        self.assertEqual(meta["labels"][column_name("strength", "Energy Rhythm")], "Energy Rhythm")
+        self.assertIsInstance(columns["user_id_data"], np.memmap)
+        self.assertEqual((columns["user_id_data"].dtype, len(columns["user_id_data"])), (np.uint8, len("u0u1")))
+
+        # Nothing new: nothing written. Then only the re-saved and the new profile go out.
+        self.assertEqual(export_profiles(self.output, self.store, lag_seconds=0), cursor)
+        changed = _profile("Strongly Disagree", "B")
+        self.store.save_profiles([("u1", changed), ("u9", changed)])
+        cursor = export_profiles(self.output, self.store, lag_seconds=0)
+        self.assertEqual(cursor["exported"], 7)
+        self.assertEqual(_read_all(self.output)[5:], [(u, changed.driver, changed.all_subtype_scores["Bursty"]) for u in ("u1", "u9")])
+
+    def test_rerun_after_an_interrupted_run_writes_no_duplicates(self):
+        self.store.save_profiles((f"u{i}", _profile()) for i in range(4))
+        export_profiles(self.output, self.store, batch_size=2, lag_seconds=0)
+        # A run that wrote a part but died before moving the cursor, and one that died mid-part
+        day = next(self.output.glob("date=*"))
+        shutil.copytree(day / "part-00000001", day / "part-00000002")
+        (day / "part-00000003.tmp").mkdir()
+        self.store.save_profiles([("u7", _profile())])
+        export_profiles(self.output, self.store, batch_size=2, lag_seconds=0)
+        self.assertEqual([row[0] for row in _read_all(self.output)], ["u0", "u1", "u2", "u3", "u7"])
+        self.assertFalse((day / "part-00000003.tmp").exists())
+
+    def test_unassemblable_profiles_are_counted_as_skipped(self):
+        long_id = "ü" * 300
+        self.store.save_profiles([("u1", _profile()), (long_id, _profile()), ("gone", _profile("Disagree", "C"))])
+        assemble = profile_assembler.profile_json
+        with patch.object(profile_assembler, "profile_json",
+                          side_effect=lambda stored, memoize=True: None if stored == self._stored("gone") else assemble(stored, memoize)):
+            cursor = export_profiles(self.output, self.store, lag_seconds=0)
+        self.assertEqual((cursor["exported"], cursor["skipped"]), (2, 1))
+        self.assertEqual(sorted(row[0] for row in _read_all(self.output)), sorted(["u1", long_id]))
+
+    def _stored(self, user_id):
+        return self.store._connection().execute("SELECT stored_form FROM profiles WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def test_recent_saves_wait_for_the_lag(self):
+        self.store.save_profiles([("u1", _profile())])
+        self.assertEqual(export_profiles(self.output, self.store, lag_seconds=3600)["exported"], 0)
+
+    def test_stores_from_before_saved_at_are_migrated(self):
+        path = self.tmp / "old.sqlite3"
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE profiles (user_id TEXT PRIMARY KEY, profile_json TEXT NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("INSERT INTO profiles VALUES (?, ?, ?)", ("old", _profile().model_dump_json(), 2_000_000_000.0))
+        store = SQLiteProfileStore(path, ttl=100)
+        (row,) = store.changed_since((0.0, ""), 3_000_000_000.0, 10)
+        self.assertEqual((row[0], row[1]), ("old", 2_000_000_000.0 - 100))
+        self.assertEqual(json.loads(row[2])["driver"], _profile().driver)
+        self.assertIn("stored_form", SQLiteProfileStore._columns(store._connection()))
+        self.assertEqual(store.get_profile("old").driver, _profile().driver)
+
+    def test_parts_without_a_cursor_are_refused_not_deleted(self):
+        self.store.save_profiles([("u1", _profile())])
+        export_profiles(self.output, self.store, lag_seconds=0)
+        (self.output / "_cursor.json").unlink()
+        with self.assertRaises(FileExistsError):
+            export_profiles(self.output, self.store, lag_seconds=0)
+        self.assertEqual([row[0] for row in _read_all(self.output)], ["u1"])
+
+    def test_concurrent_migration_adds_saved_at_once(self):
+        path = self.tmp / "old.sqlite3"
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE TABLE profiles (user_id TEXT PRIMARY KEY, profile_json TEXT NOT NULL, expires_at REAL NOT NULL)")
+        SQLiteProfileStore(path)
+        # Another worker checked before the first one migrated: it must re-check under the lock, not ALTER again
+        columns = SQLiteProfileStore._columns
+        stale = [{"user_id", "profile_json", "expires_at"}]
+        with patch.object(SQLiteProfileStore, "_columns", side_effect=lambda conn: stale.pop() if stale else columns(conn)):
+            SQLiteProfileStore(path)
+        self.assertEqual(stale, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import random
+import unittest
+
+from data_loader import ALL_ITEM_METADATA
+from config import LIKERT_SCORE_MAP
+from models import UserAnswer
+from item_bank import get_compiled_item_bank
+from percentiles import norms_provider
+from scoring_engine import score_answers, score_codes
+from wire_format import CompactDecoder, CompactAnswersError
+
+
+class TestCompactDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.bank = get_compiled_item_bank()
+        self.decoder = CompactDecoder(self.bank)
+        norms_provider.set_tables(None)
+
+    def test_string_and_array_forms_decode_alike(self):
+        codes = [len(options) for options in self.bank.slot_options]
+        self.assertEqual(self.decoder.decode("".join(map(str, codes))), bytes(codes))
+        self.assertEqual(self.decoder.decode(codes), bytes(codes))
+
+    def test_reports_every_invalid_position(self):
+        codes = ["1"] * len(self.bank.slots)
+        scenario_positions = [i for i, m in enumerate(ALL_ITEM_METADATA) if m.answer_type == "Scenario"]
+        codes[scenario_positions[0]] = "5" # scenario items only have 4 options
+        codes[0] = "x"
+        with self.assertRaises(CompactAnswersError) as ctx:
+            self.decoder.decode("".join(codes))
+        self.assertEqual([e["position"] for e in ctx.exception.errors], [0, scenario_positions[0]])
+
+    def test_rejects_wrong_length_and_all_unanswered(self):
+        with self.assertRaises(CompactAnswersError):
+            self.decoder.decode("123")
+        with self.assertRaises(CompactAnswersError):
+            self.decoder.decode("0" * len(self.bank.slots))
+        with self.assertRaises(CompactAnswersError):
+            self.decoder.decode("é" * len(self.bank.slots))
+
+    def test_scoring_codes_matches_verbose_answers(self):
+        rng = random.Random(9)
+        for _ in range(100):
+            answers = []
+            for m in ALL_ITEM_METADATA:
+                options = list(m.scenario_map) if m.answer_type == "Scenario" and m.scenario_map else list(LIKERT_SCORE_MAP)
+                answers.append(UserAnswer(slot=m.slot, answer=rng.choice(options)))
+            codes = self.decoder.decode(list(self.bank.encode_answers(answers)))
+            compact = score_codes(codes, self.bank).model_dump()
+            verbose = score_answers(answers).model_dump()
+            compact.pop("timestamp")
+            verbose.pop("timestamp")
+            self.assertEqual(compact, verbose)
+
+
+if __name__ == '__main__':
+    unittest.main()
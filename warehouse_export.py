@@ -0,0 +1,223 @@
+"""Incremental columnar export of profiles for the warehouse (engineer_onboarding.md, milestone 7).
+
+Each run pages through the profiles saved since the persisted cursor (by saved_at, from the
+SQLite profile store every worker shares) in batches, and writes each batch as typed NumPy
+columns, partitioned by the day the profile was saved:
+
+    <output>/date=2026-10-17/part-00000042/user_id_data.npy, user_id_offsets.npy, saved_at.npy, ..., _meta.json
+
+Columns: user_id as its UTF-8 bytes back to back (user_id_data, uint8) with row i at
+user_id_offsets[i]:user_id_offsets[i + 1] (int64), so one long id doesn't widen every row
+(`user_ids` decodes them); saved_at (datetime64[ms], UTC); driver, creation, growth_edge (uint8) and
+headline (uint16) as codes into the part's `_meta.json` dictionaries; one int8 column per subtype
+score (`subtype__<name>`, -1 when the profile has no such subtype) and one float32 column per
+instinct strength (`strength__<name>`, NaN when missing). `_meta.json` maps file names back to
+labels. Any part loads zero-copy with `read_part` (np.load with mmap_mode), so analytics read
+compact typed columns instead of profile JSON.
+
+A re-saved profile is exported again by a later run; the latest saved_at per user_id wins. Profiles
+are assembled from their stored form as a read would (profile_codec.py); one that no longer can be
+(its item-bank version is gone) is logged and skipped, and counted in the cursor's `skipped`.
+
+Safe to rerun: `<output>/_cursor.json` (last exported (saved_at, user_id) and the next part
+number) is replaced atomically after every part, and a run first removes parts numbered at or
+past the cursor, i.e. the leftovers of an interrupted run, before exporting them again. A
+directory that holds parts but no cursor is refused rather than cleared. Profiles
+saved in the last --lag seconds wait for the next run, so a save still committing isn't skipped.
+
+    python warehouse_export.py export /var/numi/warehouse --batch-size 50000
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from profile_store import SQLiteProfileStore
+from profile_codec import profile_assembler
+from config import PROFILE_STORE_SQLITE_PATH
+
+EXPORT_FORMAT = 1
+DEFAULT_BATCH_SIZE = 50000
+DEFAULT_LAG_SECONDS = 60.0
+CATEGORY_COLUMNS = {"driver": np.uint8, "creation": np.uint8, "growth_edge": np.uint8, "headline": np.uint16}
+
+
+def column_name(prefix: str, label: str) -> str:
+    """File-safe column name for a subtype or instinct label, e.g. strength__energy_rhythm."""
+    return f"{prefix}__{re.sub(r'[^0-9a-z]+', '_', label.lower()).strip('_')}"
+
+
+def _load_cursor(output: Path) -> Dict[str, Any]:
+    path = output / "_cursor.json"
+    if not path.exists():
+        return {"saved_at": 0.0, "user_id": "", "next_part": 0, "exported": 0, "skipped": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_cursor(output: Path, cursor: Dict[str, Any]) -> None:
+    path = output / "_cursor.json"
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cursor, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+_PART_NAME = re.compile(r"part-(\d+)(\.tmp)?")
+
+
+def _committed_parts(output: Path) -> List[Path]:
+    return [part for part in output.glob("date=*/part-*") if (match := _PART_NAME.fullmatch(part.name)) and not match.group(2)]
+
+
+def _remove_uncommitted_parts(output: Path, next_part: int) -> int:
+    """Removes .tmp parts and parts numbered at or past the cursor's next part (never committed ones)."""
+    removed = 0
+    for part in output.glob("date=*/part-*"):
+        match = _PART_NAME.fullmatch(part.name)
+        if match and (match.group(2) or int(match.group(1)) >= next_part):
+            shutil.rmtree(part)
+            removed += 1
+    return removed
+
+
+def build_columns(rows: List[Tuple[str, float, Dict[str, Any]]]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Typed columns for (user_id, saved_at, profile dict) rows, plus their dictionaries and labels."""
+    n = len(rows)
+    encoded = [user_id.encode("utf-8") for user_id, _, _ in rows]
+    offsets = np.zeros(n + 1, dtype="<i8")
+    np.cumsum([len(user_id) for user_id in encoded], out=offsets[1:])
+    columns: Dict[str, np.ndarray] = {
+        "user_id_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "user_id_offsets": offsets,
+        "saved_at": np.array([int(saved_at * 1000) for _, saved_at, _ in rows], dtype="<i8").astype("<M8[ms]"),
+    }
+    dictionaries: Dict[str, List[str]] = {}
+    for name, dtype in CATEGORY_COLUMNS.items():
+        codes: Dict[str, int] = {}
+        columns[name] = np.fromiter((codes.setdefault(profile[name], len(codes)) for _, _, profile in rows), dtype=dtype, count=n)
+        dictionaries[name] = list(codes)
+
+    labels: Dict[str, str] = {}
+    subtypes = list(dict.fromkeys(name for _, _, profile in rows for name in profile["all_subtype_scores"]))
+    instincts = list(dict.fromkeys(name for _, _, profile in rows for name in profile["instinct_strengths"]))
+    for label in subtypes:
+        column = column_name("subtype", label)
+        labels[column] = label
+        columns[column] = np.fromiter((profile["all_subtype_scores"].get(label, -1) for _, _, profile in rows), dtype=np.int8, count=n)
+    for label in instincts:
+        column = column_name("strength", label)
+        labels[column] = label
+        columns[column] = np.fromiter((profile["instinct_strengths"].get(label, np.nan) for _, _, profile in rows), dtype=np.float32, count=n)
+    return columns, {"dictionaries": dictionaries, "labels": labels}
+
+
+def _write_part(part_dir: Path, columns: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+    tmp_dir = part_dir.with_name(part_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    for name, values in columns.items():
+        np.save(tmp_dir / f"{name}.npy", values)
+    with open(tmp_dir / "_meta.json", "w", encoding="utf-8") as f:
+        json.dump(dict(meta, format=EXPORT_FORMAT, rows=len(columns["saved_at"]), columns=list(columns)), f, ensure_ascii=False)
+    if part_dir.exists():
+        shutil.rmtree(part_dir)
+    os.replace(tmp_dir, part_dir) # a part appears complete or not at all
+
+
+def export_profiles(
+    output: Path,
+    store: SQLiteProfileStore,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    lag_seconds: float = DEFAULT_LAG_SECONDS,
+    progress: bool = False,
+) -> Dict[str, Any]:
+    """Exports every profile saved since the cursor; returns the final cursor."""
+    output.mkdir(parents=True, exist_ok=True)
+    if not (output / "_cursor.json").exists() and _committed_parts(output):
+        # Without the cursor every part would look uncommitted, and profiles past their TTL can't be re-exported
+        raise FileExistsError(f"{output} holds exported parts but no _cursor.json; restore the cursor or use an empty directory")
+    cursor = _load_cursor(output)
+    removed = _remove_uncommitted_parts(output, cursor["next_part"])
+    if removed and progress:
+        print(f"removed {removed} part(s) of an interrupted run", file=sys.stderr)
+    until = time.time() - lag_seconds
+    started = time.monotonic()
+    exported = 0
+    while True:
+        rows = store.changed_since((cursor["saved_at"], cursor["user_id"]), until, batch_size)
+        if not rows:
+            break
+        parsed = []
+        for user_id, saved_at, stored in rows:
+            # Assembled like a read, so the export carries the current Flowprint copy; not memoized
+            profile_json = profile_assembler.profile_json(stored, memoize=False)
+            if profile_json is not None:
+                parsed.append((user_id, saved_at, json.loads(profile_json)))
+        # One part per day in the batch, all numbered with the batch's part number
+        by_day: Dict[str, List[Tuple[str, float, Dict[str, Any]]]] = {}
+        for row in parsed:
+            by_day.setdefault(datetime.fromtimestamp(row[1], timezone.utc).strftime("%Y-%m-%d"), []).append(row)
+        for day, day_rows in by_day.items():
+            columns, meta = build_columns(day_rows)
+            _write_part(output / f"date={day}" / f"part-{cursor['next_part']:08d}", columns, meta)
+        cursor = {
+            "saved_at": rows[-1][1],
+            "user_id": rows[-1][0],
+            "next_part": cursor["next_part"] + 1,
+            "exported": cursor["exported"] + len(parsed),
+            "skipped": cursor.get("skipped", 0) + len(rows) - len(parsed),
+        }
+        _save_cursor(output, cursor)
+        exported += len(parsed)
+        if progress:
+            print(f"exported {exported} profiles ({exported / (time.monotonic() - started):,.0f}/s)", file=sys.stderr)
+    return cursor
+
+
+def read_part(part_dir: Path) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """(columns memory-mapped from a part, its _meta.json)."""
+    with open(Path(part_dir) / "_meta.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return {name: np.load(Path(part_dir) / f"{name}.npy", mmap_mode="r") for name in meta["columns"]}, meta
+
+
+def user_ids(columns: Dict[str, np.ndarray]) -> List[str]:
+    """A part's user_ids, decoded from its user_id_data and user_id_offsets columns."""
+    data = columns["user_id_data"].tobytes()
+    offsets = columns["user_id_offsets"].tolist()
+    return [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export new and changed profiles as partitioned columnar files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="export profiles saved since the last run")
+    export.add_argument("output", type=Path, help="warehouse export directory")
+    export.add_argument("--db", type=Path, default=PROFILE_STORE_SQLITE_PATH, help="SQLite profile store (default: NUMI_PROFILE_STORE_SQLITE_PATH)")
+    export.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="profiles per part")
+    export.add_argument("--lag", type=float, default=DEFAULT_LAG_SECONDS, help="skip profiles saved in the last N seconds")
+    args = parser.parse_args(argv)
+    if not args.db.exists():
+        parser.error(f"no profile store at {args.db}")
+    try:
+        cursor = export_profiles(args.output, SQLiteProfileStore(args.db), args.batch_size, args.lag, progress=True)
+    except FileExistsError as e:
+        parser.error(str(e))
+    print(f"cursor at {datetime.fromtimestamp(cursor['saved_at'], timezone.utc).isoformat()} "
+          f"({cursor['exported']} profiles exported in total, {cursor.get('skipped', 0)} skipped, next part {cursor['next_part']})")
+
+
+if __name__ == "__main__":
+    main()
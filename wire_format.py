@@ -0,0 +1,66 @@
+"""Compact (v2) answer payloads.
+
+A v2 submission carries one code per slot, in the slot order of a published item-bank version
+(GET /v2/instinct-map/item-bank), instead of 100 `{"slot", "answer"}` objects:
+
+    {"user_id": "...", "item_bank_version": "3f9c0a1d2b4e", "answers": "4521305..."}
+
+`answers` is either a string with one digit per slot or an array of integers. Code 0 means
+unanswered; Likert slots use 1-5 (Strongly Disagree ... Strongly Agree) and Scenario slots
+1..n for options A, B, C, ...
+"""
+from functools import lru_cache
+from typing import Dict, List, Union, Tuple
+
+from item_bank import CompiledItemBank
+
+
+class CompactAnswersError(ValueError):
+    """Every problem found in a compact payload, reported together."""
+
+    def __init__(self, errors: List[Dict]):
+        super().__init__(f"{len(errors)} invalid answer code(s)")
+        self.errors = errors
+
+
+class CompactDecoder:
+    """Validates compact payloads against one item bank's precomputed valid-code tables."""
+
+    def __init__(self, bank: CompiledItemBank):
+        self.bank = bank
+        self.num_slots = len(bank.slots)
+        # Per slot: the highest valid code (codes 0..max are valid)
+        self.max_codes: Tuple[int, ...] = tuple(len(options) for options in bank.slot_options)
+        # Byte translation table for str payloads: "0".."9" -> 0..9, anything else -> 0xFF (never valid)
+        self._digit_codes = bytes(b - 48 if 48 <= b <= 57 else 0xFF for b in range(256))
+
+    def decode(self, answers: Union[str, List[int]]) -> bytes:
+        """Returns the validated code string, or raises CompactAnswersError listing every bad position."""
+        if isinstance(answers, str):
+            if answers.isascii():
+                codes = answers.encode("ascii").translate(self._digit_codes)
+            else:
+                codes = bytes(0xFF for _ in answers)
+        else:
+            codes = bytes(c if isinstance(c, int) and 0 <= c <= 9 else 0xFF for c in answers)
+
+        errors: List[Dict] = []
+        if len(codes) != self.num_slots:
+            errors.append({"error": f"expected {self.num_slots} answer codes, got {len(codes)}"})
+        for position, (code, max_code) in enumerate(zip(codes, self.max_codes)):
+            if code > max_code:
+                errors.append({
+                    "position": position,
+                    "slot": self.bank.slots[position],
+                    "error": f"invalid code; expected 0-{max_code}",
+                })
+        if not errors and not any(codes):
+            errors.append({"error": "at least one slot must be answered"})
+        if errors:
+            raise CompactAnswersError(errors)
+        return codes
+
+
+@lru_cache(maxsize=8)
+def compact_decoder_for(bank: CompiledItemBank) -> CompactDecoder:
+    return CompactDecoder(bank)